@@ -0,0 +1,299 @@
+# coding: utf-8
+
+"""Headless benchmark of the image-correlation tools of crappy.
+
+Synthetic deformed images are generated from :class:`crappy.resources`, and
+each tool is run on them for several image sizes, patch sizes and methods.
+The frame rate, the per-frame latency percentiles and the error on the
+measured strain are reported, and can be written as JSON to track performance
+regressions.
+
+Can be used from the command line, see ``python -m crappy.bench -h``.
+"""
+
+import json
+import platform
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from os import cpu_count
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+from . import resources
+from .__version__ import __version__
+from ._global import OptionalModule
+from .tool import DISCorrel, DISVE, CPUCorrel, GPUCorrel
+from .tool.gpucorrel import cuda_available
+from .tool.videoextenso import Video_extenso
+
+try:
+  import cv2
+except (ModuleNotFoundError, ImportError):
+  cv2 = OptionalModule("opencv-python")
+
+DISVE_METHODS = ('Disflow', 'Parabola', 'Pixel precision', 'Lucas Kanade')
+# The region of the ve_markers image containing the markers
+VE_BOX = (60, 150, 350, 400)
+
+
+def deform(img: np.ndarray,
+           exx: float,
+           eyy: float,
+           tx: float = 0,
+           ty: float = 0) -> np.ndarray:
+  """Returns the image stretched by ``exx`` and ``eyy`` around its center and
+  translated by ``tx`` and ``ty`` pixels."""
+
+  h, w = img.shape
+  m = np.array([[1 + exx, 0, tx - exx * (w - 1) / 2],
+                [0, 1 + eyy, ty - eyy * (h - 1) / 2]], dtype=np.float32)
+  return cv2.warpAffine(img, m, (w, h), flags=cv2.INTER_CUBIC,
+                        borderMode=cv2.BORDER_REFLECT)
+
+
+def make_sequence(img: np.ndarray,
+                  frames: int,
+                  max_strain: float) -> List[Tuple[float, float, np.ndarray]]:
+  """Returns a sequence of ``(exx, eyy, image)``, with a strain growing
+  linearly up to ``max_strain`` along x and half of it in compression along y.
+  """
+
+  sequence = []
+  for i in range(1, frames + 1):
+    exx = max_strain * i / frames
+    eyy = -exx / 2
+    sequence.append((exx, eyy, deform(img, exx, eyy, tx=.1 * i, ty=-.05 * i)))
+  return sequence
+
+
+def speckle(size: Tuple[int, int]) -> np.ndarray:
+  """Returns the speckle image of the resources, resized to ``(h, w)``."""
+
+  h, w = size
+  return cv2.resize(resources.speckle, (w, h), interpolation=cv2.INTER_CUBIC)
+
+
+def _run(step: Callable,
+         sequence: List[Tuple[float, float, np.ndarray]]) -> dict:
+  """Times ``step`` on each image, and compares the returned strains (in %)
+  with the imposed ones."""
+
+  latencies = []
+  errors = []
+  for exx, eyy, img in sequence:
+    t0 = perf_counter()
+    meas_exx, meas_eyy = step(img)
+    latencies.append(perf_counter() - t0)
+    errors.append((meas_exx - 100 * exx, meas_eyy - 100 * eyy))
+  latencies = 1000 * np.array(latencies)
+  errors = np.abs(np.array(errors))
+  return {'fps': float(1000 / np.mean(latencies)),
+          'latency_ms': {'mean': float(np.mean(latencies)),
+                         'p50': float(np.percentile(latencies, 50)),
+                         'p90': float(np.percentile(latencies, 90)),
+                         'p99': float(np.percentile(latencies, 99)),
+                         'max': float(np.max(latencies))},
+          'strain_error_pct': {'exx_max': float(errors[:, 0].max()),
+                               'eyy_max': float(errors[:, 1].max()),
+                               'exx_mean': float(errors[:, 0].mean()),
+                               'eyy_mean': float(errors[:, 1].mean())}}
+
+
+def bench_discorrel(size: Tuple[int, int],
+                    frames: int,
+                    max_strain: float) -> dict:
+  img0 = speckle(size)
+  h, w = size
+  bbox = (h // 10, w // 10, h - h // 10, w - w // 10)
+  correl = DISCorrel(img0, bbox=bbox, fields=['x', 'y', 'exx', 'eyy'])
+  correl.calc(img0)
+  ret = _run(lambda img: correl.calc(img)[2:4],
+             make_sequence(img0, frames, max_strain))
+  correl.close()
+  return ret
+
+
+def bench_disve(size: Tuple[int, int],
+                frames: int,
+                max_strain: float,
+                method: str,
+                patch_size: int) -> dict:
+  img0 = speckle(size)
+  h, w = size
+  # Four patches, on each side of the center along x and y
+  dy, dx = h // 4, w // 4
+  centers = [(h // 2, w // 2 - dx), (h // 2, w // 2 + dx),
+             (h // 2 - dy, w // 2), (h // 2 + dy, w // 2)]
+  patches = [(y - patch_size // 2, x - patch_size // 2, patch_size,
+              patch_size) for y, x in centers]
+  ve = DISVE(img0, patches, method=method, follow=False)
+  ve.calculate_displacement(img0)
+
+  def step(img: np.ndarray) -> Tuple[float, float]:
+    d = ve.calculate_displacement(img)
+    exx = (d[2] - d[0]) / (2 * dx)
+    eyy = (d[7] - d[5]) / (2 * dy)
+    return 100 * exx, 100 * eyy
+
+  ret = _run(step, make_sequence(img0, frames, max_strain))
+  ve.close()
+  return ret
+
+
+def bench_video_extenso(size: Tuple[int, int],
+                        frames: int,
+                        max_strain: float) -> dict:
+  h, w = size
+  src_h, src_w = resources.ve_markers.shape
+  img0 = cv2.resize(resources.ve_markers, (w, h),
+                    interpolation=cv2.INTER_CUBIC)
+  ymin, xmin, ymax, xmax = (int(VE_BOX[0] * h / src_h),
+                            int(VE_BOX[1] * w / src_w),
+                            int(VE_BOX[2] * h / src_h),
+                            int(VE_BOX[3] * w / src_w))
+  ve = Video_extenso(min_area=150 * h * w / src_h / src_w)
+  with redirect_stdout(StringIO()):
+    ve.detect_spots(img0[ymin:ymax, xmin:xmax], ymin, xmin)
+    if not ve.spot_list:
+      raise RuntimeError("Could not detect the spots on the image")
+    ve.save_length()
+  try:
+    ret = _run(lambda img: ve.get_def(img)[::-1],
+               make_sequence(img0, frames, max_strain))
+  finally:
+    ve.stop_tracking()
+  return ret
+
+
+def bench_correl(size: Tuple[int, int],
+                 frames: int,
+                 max_strain: float,
+                 backend: str) -> dict:
+  img0 = speckle(size).astype(np.float32)
+  tool = GPUCorrel if backend == 'cuda' else CPUCorrel
+  correl = tool(size, fields=['x', 'y', 'exx', 'eyy'], levels=4,
+                iterations=8)
+  correl.set_orig(img0)
+  correl.prepare()
+  correl.get_disp(img0)
+  # The strain fields of GPUCorrel are in %
+  ret = _run(lambda img: correl.get_disp(img.astype(np.float32))[2:4],
+             make_sequence(img0, frames, max_strain))
+  correl.clean()
+  return ret
+
+
+def run(sizes: List[Tuple[int, int]] = ((480, 640), (960, 1280)),
+        patch_sizes: List[int] = (32, 64, 128),
+        methods: List[str] = DISVE_METHODS,
+        tools: List[str] = ('discorrel', 'disve', 'videoextenso', 'correl'),
+        frames: int = 20,
+        max_strain: float = .01,
+        verbose: bool = True) -> Dict:
+  """Runs the benchmark and returns the results.
+
+  Args:
+    sizes: The image sizes to test, as ``(height, width)``.
+    patch_sizes: The patch sizes to test with :class:`DISVE`.
+    methods: The methods of :class:`DISVE` to test.
+    tools: The tools to test, among `'discorrel'`, `'disve'`,
+      `'videoextenso'` and `'correl'`. The latter is :class:`GPUCorrel` if
+      CUDA is available, else :class:`CPUCorrel`.
+    frames: The number of deformed frames per test.
+    max_strain: The strain reached along x on the last frame.
+    verbose: If :obj:`True`, prints the results as they come.
+
+  Returns:
+    A :obj:`dict` containing information on the system and the results, one
+    :obj:`dict` per test.
+  """
+
+  cases = []
+  for size in sizes:
+    if 'discorrel' in tools:
+      cases.append(({'tool': 'DISCorrel'}, size,
+                    lambda s: bench_discorrel(s, frames, max_strain)))
+    if 'disve' in tools:
+      for method in methods:
+        for patch_size in patch_sizes:
+          cases.append(({'tool': 'DISVE', 'method': method,
+                         'patch_size': patch_size}, size,
+                        lambda s, m=method, p=patch_size:
+                        bench_disve(s, frames, max_strain, m, p)))
+    if 'videoextenso' in tools:
+      cases.append(({'tool': 'Video_extenso'}, size,
+                    lambda s: bench_video_extenso(s, frames, max_strain)))
+    if 'correl' in tools:
+      backend = 'cuda' if cuda_available() else 'cpu'
+      cases.append(({'tool': 'GPUCorrel' if backend == 'cuda'
+                     else 'CPUCorrel'}, size,
+                    lambda s, b=backend: bench_correl(s, frames, max_strain,
+                                                      b)))
+
+  results = []
+  for case, size, bench in cases:
+    result = dict(case, size=list(size), frames=frames)
+    try:
+      result.update(bench(size))
+    except Exception as exc:
+      result['error'] = f"{type(exc).__name__}: {exc}"
+    results.append(result)
+    if verbose:
+      name = ' '.join(str(v) for k, v in case.items())
+      if 'error' in result:
+        print(f"{name} {size[0]}x{size[1]}: {result['error']}")
+      else:
+        print(f"{name} {size[0]}x{size[1]}: {result['fps']:.1f} fps, "
+              f"p90 {result['latency_ms']['p90']:.2f} ms, max strain error "
+              f"{result['strain_error_pct']['exx_max']:.4f} / "
+              f"{result['strain_error_pct']['eyy_max']:.4f} %")
+
+  return {'crappy_version': __version__,
+          'date': datetime.now().isoformat(timespec='seconds'),
+          'platform': platform.platform(),
+          'python': platform.python_version(),
+          'cpu_count': cpu_count(),
+          'opencv': getattr(cv2, '__version__', None),
+          'numpy': np.__version__,
+          'results': results}
+
+
+def main(args: Optional[List[str]] = None) -> None:
+  """Command-line interface of the benchmark."""
+
+  parser = ArgumentParser(description="Benchmarks the image-correlation tools "
+                                      "of crappy on synthetic images")
+  parser.add_argument('-o', '--output', help="JSON file to write the results "
+                                             "to")
+  parser.add_argument('-s', '--sizes', nargs='+', default=['480x640',
+                                                           '960x1280'],
+                      help="Image sizes, as HEIGHTxWIDTH")
+  parser.add_argument('-p', '--patch-sizes', nargs='+', type=int,
+                      default=[32, 64, 128], help="Patch sizes for DISVE")
+  parser.add_argument('-m', '--methods', nargs='+', default=DISVE_METHODS,
+                      choices=DISVE_METHODS, help="Methods for DISVE")
+  parser.add_argument('-t', '--tools', nargs='+',
+                      default=['discorrel', 'disve', 'videoextenso', 'correl'],
+                      choices=['discorrel', 'disve', 'videoextenso', 'correl'])
+  parser.add_argument('-n', '--frames', type=int, default=20,
+                      help="Number of frames per test")
+  parser.add_argument('--max-strain', type=float, default=.01,
+                      help="Strain along x on the last frame")
+  args = parser.parse_args(args)
+
+  sizes = [tuple(int(i) for i in size.lower().split('x'))
+           for size in args.sizes]
+  results = run(sizes=sizes, patch_sizes=args.patch_sizes,
+                methods=args.methods, tools=args.tools, frames=args.frames,
+                max_strain=args.max_strain)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2)
+    print("Results written to", args.output)
+
+
+if __name__ == '__main__':
+  main()
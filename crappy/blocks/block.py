@@ -2,15 +2,31 @@
 
 from sys import platform
 from multiprocessing import Process, Pipe
+from multiprocessing.reduction import ForkingPickler
 from time import sleep, time, localtime, strftime
 from weakref import WeakSet
-from pickle import UnpicklingError
-from typing import Union, Optional, NoReturn, List, Dict
+from pickle import UnpicklingError, HIGHEST_PROTOCOL
+from typing import Union, Optional, NoReturn, List, Dict, Any
 
-from ..links import Link
-from .._global import CrappyStop
+from ..links import Link, Batch
+from .._global import CrappyStop, OptionalModule
 
 import subprocess
+import os
+
+try:
+  import cv2
+except (ModuleNotFoundError, ImportError):
+  cv2 = OptionalModule("opencv-python")
+
+try:
+  from threadpoolctl import threadpool_limits
+except (ModuleNotFoundError, ImportError):
+  threadpool_limits = OptionalModule("threadpoolctl")
+
+# The variables read by the BLAS and OpenMP libraries when they are loaded
+THREADS_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+               'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
 
 # Todo:
 #   Add a clean way to stop the blocks, using the keyboard or a button
@@ -51,6 +67,10 @@ class Block(Process):
     self._status = "idle"
     self.in_process = False  # To know if we are in the process or not
     self.niceness = 0
+    # Number of threads for OpenCV and BLAS in the process, None for default
+    self.threads = None
+    # Cores to pin the process to, or True to get dedicated ones in start_all
+    self.affinity = None
     self.labels = []
 
   def __new__(cls, *args, **kwargs) -> Process:
@@ -66,7 +86,9 @@ class Block(Process):
     self.in_process = True  # we are in the process
     self.status = "initializing"
     try:
+      self.limit_threads()
       self.prepare()
+      self.check_output_labels()
       self.status = "ready"
       # Wait for parent to tell me to start the main
       self.t0 = self.pipe2.recv()
@@ -93,6 +115,8 @@ class Block(Process):
       print("[%r] Exception caught:" % self, e)
       try:
         self.finish()
+        for o in self.outputs:
+          o.flush()
       except (Exception,):
         pass
       self.status = "error"
@@ -100,6 +124,12 @@ class Block(Process):
       self.stop_all()
       raise
     self.finish()
+    # Sending the values still queued in the links before exiting
+    for o in self.outputs:
+      o.flush()
+    for o in self.outputs:
+      if o.dropped:
+        print(f"[{self!r}] {o.dropped} values dropped on {o.name}")
     self.status = "done"
 
   @classmethod
@@ -135,9 +165,99 @@ class Block(Process):
         renice(b.pid, b.niceness)
 
   @classmethod
-  def prepare_all(cls, verbose: bool = True) -> None:
+  def allot_threads(cls,
+                    threads: Optional[int] = None,
+                    verbose: bool = True) -> None:
+    """Shares a budget of threads between the blocks, and chooses the cores of
+    the blocks to pin.
+
+    The blocks whose ``threads`` attribute is set keep their value, and the
+    rest of the budget is evenly shared between the other blocks, with at least
+    one thread per block.
+
+    The blocks whose ``affinity`` attribute is :obj:`True` are pinned to
+    ``threads`` dedicated cores each, taken in order among the available ones.
+    The blocks with no affinity are then pinned to the remaining cores, if any.
+
+    Args:
+      threads: The total number of threads for all the blocks. If :obj:`None`,
+        only the blocks whose ``threads`` attribute is set are limited.
+      verbose: If :obj:`True`, prints the number of threads and the cores given
+        to each block.
+    """
+
+    blocks = list(cls.instances)
+    if threads is not None:
+      fixed = sum(b.threads for b in blocks if b.threads is not None)
+      free = [b for b in blocks if b.threads is None]
+      if fixed > threads:
+        print(f"[threads] The blocks require {fixed} threads, more than the "
+              f"budget of {threads}")
+      for b in free:
+        b.threads = max(1, (threads - fixed) // len(free))
+
+    pinned = any(b.affinity is True for b in blocks)
+    if pinned and not hasattr(os, 'sched_setaffinity'):
+      print("[threads] CPU affinity is not supported on this platform")
+      for b in blocks:
+        if b.affinity is True:
+          b.affinity = None
+    elif pinned:
+      cores = sorted(os.sched_getaffinity(0))
+      for b in blocks:
+        if b.affinity is True:
+          n = b.threads or 1
+          if len(cores) <= n:
+            print(f"[threads] Not enough free cores to pin {b}")
+            b.affinity = None
+          else:
+            b.affinity, cores = cores[:n], cores[n:]
+      for b in blocks:
+        if b.affinity is None:
+          b.affinity = list(cores)
+
+    if verbose:
+      for b in blocks:
+        if b.threads is not None or b.affinity is not None:
+          print(f"[threads] {b}: {b.threads or 'default'} threads, cores "
+                f"{b.affinity if b.affinity is not None else 'all'}")
+
+  def limit_threads(self) -> None:
+    """Limits the threads of OpenCV and of the BLAS libraries according to
+    ``self.threads``, and pins the process according to ``self.affinity``.
+
+    Called in the process before :meth:`prepare`. The BLAS libraries already
+    loaded can only be limited if :mod:`threadpoolctl` is installed, otherwise
+    only the ones loaded afterwards are.
+    """
+
+    if self.affinity is not None and self.affinity is not True:
+      if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, self.affinity)
+      else:
+        print(f"[{self!r}] CPU affinity is not supported on this platform")
+
+    if self.threads is None:
+      return
+    for var in THREADS_ENV:
+      os.environ[var] = str(self.threads)
+    if not isinstance(threadpool_limits, OptionalModule):
+      self._threadpool_limits = threadpool_limits(limits=self.threads)
+    if not isinstance(cv2, OptionalModule):
+      cv2.setNumThreads(self.threads)
+
+  @classmethod
+  def prepare_all(cls,
+                  verbose: bool = True,
+                  threads: Optional[int] = None) -> None:
     """Starts all the blocks processes (``block.prepare``), but not the main
-    loop."""
+    loop.
+
+    Args:
+      verbose: If :obj:`True`, prints information about the blocks.
+      threads: A budget of threads shared between the blocks, see
+        :meth:`allot_threads`.
+    """
 
     if verbose:
       def vprint(*args):
@@ -145,6 +265,7 @@ class Block(Process):
     else:
       def vprint(*_):
         return
+    cls.allot_threads(threads, verbose)
     vprint("Starting the blocks...")
     for instance in cls.instances:
       vprint("Starting", instance)
@@ -213,8 +334,23 @@ class Block(Process):
                 t0: float = None,
                 verbose: bool = True,
                 bg: bool = False,
-                high_prio: bool = False) -> NoReturn:
-    cls.prepare_all(verbose)
+                high_prio: bool = False,
+                threads: Optional[int] = None) -> NoReturn:
+    """Prepares, renices and launches all the blocks.
+
+    Args:
+      t0: The starting time, defaults to now.
+      verbose: If :obj:`True`, prints information about the blocks.
+      bg: If :obj:`True`, returns once the blocks are launched instead of
+        waiting for them to finish.
+      high_prio: If :obj:`True`, the blocks with a negative niceness are also
+        reniced.
+      threads: A total number of threads for OpenCV and BLAS shared between all
+        the blocks, see :meth:`allot_threads`. ``cpu_count()`` is a sensible
+        value when several blocks do heavy computation.
+    """
+
+    cls.prepare_all(verbose, threads)
     if high_prio and any([b.niceness < 0 for b in cls.instances]):
       print("[start] High prio: root permission needed to renice")
     cls.renice_all(high_prio, verbose=verbose)
@@ -360,6 +496,9 @@ class Block(Process):
 
     Note:
       ONLY :obj:`dict` can go through links.
+
+      The data is pickled only once for all the links sending it as is, i.e.
+      the ones whose modifiers are not run by the sender.
     """
 
     if isinstance(data, dict):
@@ -373,8 +512,68 @@ class Block(Process):
       pass
     else:
       raise IOError("Trying to send a " + str(type(data)) + " in a link!")
+    self._send_all(data)
+
+  def check_output_labels(self) -> None:
+    """Checks that the labels selected by the output links are sent by the
+    block, if its labels are known.
+
+    Called in the process right after :meth:`prepare`.
+    """
+
+    if not self.labels or not isinstance(self.labels, (list, tuple)) or \
+        not all(isinstance(label, str) for label in self.labels):
+      return
+    for o in self.outputs:
+      o.check_labels(self.labels)
+
+  def _send_all(self, data: Union[Dict[str, Any], str]) -> None:
+    """Sends data to all the outputs, pickling it only once for the links that
+    send it unmodified and select the same labels."""
+
+    raw = [o for o in self.outputs if o.sends_raw]
+    if len(raw) < 2 or isinstance(data, str):
+      for o in self.outputs:
+        o.send(data)
+      return
+
+    buffers = {}
     for o in self.outputs:
-      o.send(data)
+      if not o.sends_raw:
+        o.send(data)
+        continue
+      if o.skip(data):
+        continue
+      key = None if o.labels is None else tuple(o.labels)
+      if key not in buffers:
+        value = o.project(data)
+        buffers[key] = None if value is None else \
+            ForkingPickler.dumps(value, HIGHEST_PROTOCOL)
+      if buffers[key] is not None:
+        o.send_bytes(buffers[key])
+
+  def send_batch(self, data: Union[Dict[str, list], List[list]]) -> None:
+    """Sends several values per label at once to all blocks downstream.
+
+    The modifiers of the links are called only once on the whole batch, which
+    is much faster than sending the values one by one when the data rate is
+    high. The downstream blocks receive the values as if they had been sent
+    one by one.
+
+    Args:
+      data: Either a :obj:`dict` whose values are sequences of the same length,
+        or a :obj:`list` of such sequences mapped to ``self.labels``.
+    """
+
+    if isinstance(data, list):
+      if not self.labels:
+        raise IOError("trying to send data as a list but no labels are "
+                      "specified ! Please add a self.labels attribute.")
+      data = dict(zip(self.labels, data))
+    batch = Batch(data)
+    if not batch.rows:
+      return
+    self._send_all(batch)
 
   def recv_all(self) -> Dict[str, list]:
     """Receives new data from all the inputs (not as chunks).
@@ -2,13 +2,15 @@
 
 from sys import platform
 import os
-from typing import Callable, Union
+from time import time
+from threading import Thread
+from typing import Callable, Union, Optional
 
 import numpy as np
 
 from .block import Block
 from ..camera import camera_list
-from ..tool import Camera_config
+from ..tool import Camera_config, Frame_ring
 from .._global import OptionalModule
 
 try:
@@ -38,6 +40,11 @@ class Camera(Block):
 
   It can be triggered by an other block, internally, or try to run at a given
   framerate.
+
+  Instead of saving every frame, it can also keep the latest frames in a
+  preallocated in-memory ring buffer, and save them only when a condition on
+  the data received from its input link is met. This is useful for getting the
+  frames right before an event (e.g. the failure of a sample) at full rate.
   """
 
   def __init__(self,
@@ -54,6 +61,11 @@ class Camera(Block):
                input_label: str = None,
                config: bool = True,
                no_loop: bool = False,
+               pre_trigger: Optional[float] = None,
+               post_trigger: float = 0,
+               trigger: Union[str, Callable] = None,
+               max_buffer_memory: float = 512,
+               conflate: bool = False,
                **kwargs) -> None:
     """Sets the args and initializes parent class.
 
@@ -83,6 +95,25 @@ class Camera(Block):
       input_label (:obj:`str`, optional): If specified, the image will not be
         read from a camera object but from this label.
       config (:obj:`bool`, optional): Show the popup for config ?
+      pre_trigger (:obj:`float`, optional): If given, the frames are not saved
+        continuously anymore. Instead, the frames of the last ``pre_trigger``
+        seconds are kept in memory, and only saved to ``save_folder`` when the
+        ``trigger`` condition is met.
+      post_trigger (:obj:`float`, optional): When the ``trigger`` condition is
+        met, the frames are still buffered for this number of seconds before
+        being saved.
+      trigger (optional): The condition on the data received from the input
+        link triggering the saving of the buffered frames. Either a string
+        like ``'F(N)<5'`` or ``'F(N)>5'``, or a callable taking the received
+        data as a :obj:`dict` of :obj:`list` and returning a :obj:`bool`.
+      max_buffer_memory (:obj:`float`, optional): The maximum memory the frame
+        buffer can use, in MB. If it is too low to hold ``pre_trigger`` plus
+        ``post_trigger`` seconds of frames, the oldest frames are lost.
+      conflate (:obj:`bool`, optional): Only used with ``input_label``. If
+        :obj:`True`, only the newest frame waiting in the link is processed
+        and the older ones are dropped, so that a slow block doesn't fall
+        further and further behind. The number of skipped frames and the lag
+        are printed if ``verbose`` is set, and at the end of the test.
       **kwargs: Any additional specific argument to pass to the camera.
     """
 
@@ -100,6 +131,15 @@ class Camera(Block):
     self.input_label = input_label
     self.config = config
     self.no_loop = no_loop
+    self.pre_trigger = pre_trigger
+    self.post_trigger = post_trigger
+    self.trigger = trigger
+    self.max_buffer_memory = max_buffer_memory
+    self.conflate = conflate
+    self.skipped_frames = 0
+    self.lag = 0
+    self.max_lag = 0
+    self._last_conflate_print = time()
 
     self.camera_name = camera.capitalize()
     self.cam_kw = kwargs
@@ -113,6 +153,13 @@ class Camera(Block):
     assert self.save_backend in ["cv2", "sitk", "pil"],\
         "Unknown saving backend: " + self.save_backend
     self.save = getattr(self, "save_" + self.save_backend)
+    if self.pre_trigger is not None:
+      assert self.save_folder, "A save_folder is needed to save the frames " \
+                               "of the buffer!"
+      assert self.trigger is not None, "A trigger condition is needed to " \
+                                       "save the frames of the buffer!"
+      assert not (self.fps_label or self.input_label), "Cannot use the " \
+          "frame buffer with fps_label or input_label!"
     self.loops = 0
     self.t0 = 0
 
@@ -127,7 +174,16 @@ class Camera(Block):
         assert os.path.exists(self.save_folder),\
             "Error creating " + self.save_folder
     self.ext_trigger = bool(
-        self.inputs and not (self.fps_label or self.input_label))
+        self.inputs and not (self.fps_label or self.input_label or
+                             self.pre_trigger is not None))
+    if self.pre_trigger is not None:
+      assert self.inputs, "The frame buffer needs an input link to " \
+                          "evaluate the trigger condition!"
+      self.ring = Frame_ring(self.max_buffer_memory)
+      self.trigger_condition = self.parse_trigger(self.trigger)
+      self.t_trigger = None
+      self.bursts = 0
+      self.dump_thread = None
     if self.input_label is not None:
       # Exception to the usual inner working of Crappy:
       # We receive data from the link BEFORE the program is started
@@ -167,6 +223,8 @@ class Camera(Block):
 
     if self.input_label:
       data = self.inputs[0].recv()
+      if self.conflate:
+        data = self.get_newest(data)
       return data['t(s)'] + self.t0, data[self.input_label]
     if not self.ext_trigger:
       if self.fps_label:
@@ -179,17 +237,159 @@ class Camera(Block):
         return
       t, img = self.camera.get_image()  # self limiting to max_fps
     self.loops += 1
-    if self.save_folder and self.loops % self.save_period == 0:
+    if self.pre_trigger is not None:
+      self.buffer_frame(t, img)
+    elif self.save_folder and self.loops % self.save_period == 0:
       self.save(img, self.save_folder +
                 eval('f"{}"'.format(self.img_name)) + f".{self.ext}")
     if self.transform:
       img = self.transform(img)
     return t, img
 
+  def get_newest(self, data: dict) -> dict:
+    """Drops all the frames waiting in the input link except the newest one,
+    and keeps track of the number of skipped frames and of the lag."""
+
+    while True:
+      new = self.inputs[0].recv(blocking=False)
+      if new is None:
+        break
+      data = new
+      self.skipped_frames += 1
+
+    t = time()
+    self.lag = t - self.t0 - data['t(s)']
+    self.max_lag = max(self.max_lag, self.lag)
+    if self.verbose and t - self._last_conflate_print > 2:
+      print(f"[{type(self).__name__}] {self.skipped_frames} frames skipped, "
+            f"lag: {1000 * self.lag:.1f} ms")
+      self._last_conflate_print = t
+    return data
+
+  @staticmethod
+  def parse_trigger(trigger: Union[str, Callable]) -> Callable:
+    """Turns the trigger given by the user into a function taking the received
+    data and returning a :obj:`bool`.
+
+    The supported syntax is ``mylabel<myvalue`` and ``mylabel>myvalue``.
+    """
+
+    if not isinstance(trigger, str):
+      return trigger
+    if '<' in trigger:
+      label, val = trigger.split('<')
+      return lambda data: label in data and \
+          any(i < float(val) for i in data[label])
+    elif '>' in trigger:
+      label, val = trigger.split('>')
+      return lambda data: label in data and \
+          any(i > float(val) for i in data[label])
+    raise ValueError("Wrong syntax for the trigger, please refer to the "
+                     "documentation")
+
+  def buffer_frame(self, t: float, img: np.ndarray) -> None:
+    """Stores a frame in the ring buffer, checks the trigger condition and
+    starts saving the buffered frames when needed.
+
+    The frames are saved in a separate thread, and the buffer is not fed
+    during that time. It is re-armed once all the frames are saved.
+    """
+
+    data = self.inputs[0].recv_chunk(blocking=False)
+
+    if self.dump_thread is not None:
+      if self.dump_thread.is_alive():
+        return
+      self.dump_thread.join()
+      self.dump_thread = None
+      self.ring.clear()
+      self.t_trigger = None
+      print("[Camera] Frame buffer re-armed")
+      # Ignoring the data received while saving
+      return
+
+    if not self.ring.allocated:
+      self.ring.allocate(img)
+      print(f"[Camera] Frame buffer allocated, can hold {self.ring.capacity} "
+            f"frames ({self.ring.memory / 2 ** 20:.1f} MB)")
+    self.ring.put(t, img)
+
+    if self.t_trigger is None:
+      if data is not None and self.trigger_condition(data):
+        self.t_trigger = t
+        print(f"[Camera] Trigger condition met at t={t - self.t0:.6f}s")
+    elif t - self.t_trigger >= self.post_trigger:
+      self.dump_buffer()
+
+  def dump_buffer(self, blocking: bool = False) -> None:
+    """Saves the buffered frames around the trigger time to a new subfolder of
+    ``save_folder``."""
+
+    pre_trigger = self.t_trigger - self.ring.oldest()
+    if pre_trigger < self.pre_trigger:
+      print(f"[Camera] WARNING : Only {pre_trigger:.3f}s of frames could be "
+            f"kept before the trigger, increase max_buffer_memory to keep "
+            f"{self.pre_trigger}s")
+    frames = self.ring.get_window(self.t_trigger - self.pre_trigger,
+                                  self.t_trigger + self.post_trigger)
+    folder = self.save_folder + f"burst_{self.bursts:03d}" + \
+        ('\\' if 'win' in platform else '/')
+    self.bursts += 1
+    self.dump_thread = Thread(target=self.save_frames, args=(frames, folder))
+    self.dump_thread.start()
+    if blocking:
+      self.dump_thread.join()
+
+  def save_frames(self, frames: list, folder: str) -> None:
+    """Saves the given frames to the disk, named after their index and
+    timestamp."""
+
+    os.makedirs(folder, exist_ok=True)
+    for i, (t, img) in enumerate(frames):
+      self.save(img, folder + f"{i:06d}_{t - self.t0:.6f}.{self.ext}")
+    print(f"[Camera] Saved {len(frames)} frames to {folder}")
+
   def loop(self) -> None:
     t, img = self.get_img()
     self.send([t - self.t0, img])
 
+  @staticmethod
+  def get_preview(img: np.ndarray,
+                  decimation: int,
+                  boxes: list = (),
+                  points: list = ()) -> list:
+    """Returns a decimated view of the frame and a lightweight description of
+    what should be drawn on it.
+
+    This allows the image-processing blocks to leave the drawing and the
+    display to a :ref:`Displayer` block, running at its own rate in another
+    process.
+
+    Args:
+      img: The full frame.
+      decimation: Only one pixel out of ``decimation`` is kept along each axis.
+      boxes: The boxes to draw, as ``(y min, x min, y max, x max)`` tuples in
+        full-frame coordinates.
+      points: The points to draw, as ``(y, x)`` tuples in full-frame
+        coordinates.
+
+    Returns:
+      The values to send along the `'frame'` and `'overlay'` labels.
+    """
+
+    return [img[::decimation, ::decimation],
+            {'boxes': [tuple(int(i) for i in box) for box in boxes],
+             'points': [(float(y), float(x)) for y, x in points],
+             'decimation': decimation}]
+
   def finish(self) -> None:
+    if self.input_label and self.conflate:
+      print(f"[{type(self).__name__}] {self.skipped_frames} frames skipped in "
+            f"total, maximum lag: {1000 * self.max_lag:.1f} ms")
+    if self.pre_trigger is not None and hasattr(self, 'ring'):
+      if self.dump_thread is not None:
+        self.dump_thread.join()
+      elif self.t_trigger is not None:
+        self.dump_buffer(blocking=True)
     if self.input_label is None:
       self.camera.close()
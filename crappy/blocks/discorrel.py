@@ -43,6 +43,12 @@ class DISCorrel(Camera):
                show_image: bool = False,
                residual: bool = False,
                residual_full: bool = False,
+               preview: bool = False,
+               preview_decimation: int = 4,
+               tiles: tuple = (1, 1),
+               tile_overlap: int = 32,
+               workers: int = None,
+               lstsq: bool = False,
                **kwargs) -> None:
     self.niceness = -5
     self.cam_kwargs = kwargs
@@ -54,6 +60,8 @@ class DISCorrel(Camera):
     self.show_image = show_image
     self.residual = residual
     self.residual_full = residual_full
+    self.preview = preview
+    self.preview_decimation = preview_decimation
     self.dis_kw = {"alpha": alpha,
                    "delta": delta,
                    "gamma": gamma,
@@ -62,11 +70,17 @@ class DISCorrel(Camera):
                    "iterations": iterations,
                    "gditerations": gditerations,
                    "patch_size": patch_size,
-                   "patch_stride": patch_stride}
+                   "patch_stride": patch_stride,
+                   "tiles": tiles,
+                   "tile_overlap": tile_overlap,
+                   "workers": workers,
+                   "lstsq": lstsq}
     if self.residual:
       self.labels.append('res')
     if self.residual_full:
       self.labels.append('res_full')
+    if self.preview:
+      self.labels.extend(['frame', 'overlay'])
 
   def prepare(self, *_, **__) -> None:
     Camera.prepare(self, send_img=False)
@@ -78,6 +92,9 @@ class DISCorrel(Camera):
                            "Was the region selected on the configuration "
                            "Window ?")
     t, img0 = self.camera.get_image()
+    if self.dis_kw['workers'] is None and self.threads is not None:
+      # Do not exceed the threads allotted to the block
+      self.dis_kw['workers'] = self.threads
     self.correl = Dis(img0, bbox=self.bbox, fields=self.fields, **self.dis_kw)
     if self.show_image:
       try:
@@ -112,11 +129,20 @@ class DISCorrel(Camera):
       draw_box(self.bbox, img)
       cv2.imshow("DISCorrel", img)
       cv2.waitKey(5)
-    if self.residual:
-      d.append(self.correl.dis_res_scal())
+    if self.residual or self.residual_full:
+      res = self.correl.dis_res()
+      if self.residual:
+        d.append(np.average(np.abs(res)))
+      if self.residual_full:
+        d.append(res)
+    if self.preview:
+      d += self.get_preview(img, self.preview_decimation, boxes=[self.bbox])
     self.send([t - self.t0] + d)
 
   def finish(self) -> None:
+    # The correlation may not exist if prepare failed
+    if getattr(self, 'correl', None) is not None:
+      self.correl.close()
     if self.show_image:
       cv2.destroyAllWindows()
     Camera.finish(self)
@@ -32,12 +32,20 @@ class Displayer(Block):
 
   Important:
     One displayer can only display images from one camera.
+
+  Note:
+    When ``overlay_label`` is set, the boxes and points described by this label
+    are drawn on the frame before displaying it. This is meant to be used with
+    the `preview` option of the :ref:`DISCorrel`, :ref:`DISVE` and
+    :ref:`Video extenso` blocks, so that the drawing and the display never slow
+    down the measurement loop.
   """
 
   def __init__(self,
                framerate: float = 5,
                backend: str = 'cv',
-               title: str = 'Displayer') -> None:
+               title: str = 'Displayer',
+               overlay_label: str = None) -> None:
     Block.__init__(self)
     self.niceness = 10
     if framerate is None:
@@ -45,6 +53,7 @@ class Displayer(Block):
     else:
       self.delay = 1. / framerate  # Framerate (fps)
     self.title = title
+    self.overlay_label = overlay_label
     if backend.lower() in ['cv', 'opencv']:
       self.prepare = self.prepare_cv
       self.loop = self.loop_cv
@@ -63,6 +72,37 @@ class Displayer(Block):
     else:
       raise AttributeError("Unknown backend: " + str(backend))
 
+  def get_frame(self, data: dict) -> np.ndarray:
+    """Returns the latest frame received, with the overlay drawn on it if
+    required."""
+
+    frame = data['frame'][-1]
+    if self.overlay_label is None:
+      return frame
+    return self.draw_overlay(frame, data[self.overlay_label][-1])
+
+  @staticmethod
+  def draw_overlay(frame: np.ndarray, overlay: dict) -> np.ndarray:
+    """Draws the boxes and points of an overlay description on a decimated
+    frame.
+
+    The coordinates in the overlay are given in the full-frame reference, they
+    are scaled according to the decimation of the frame.
+    """
+
+    dec = overlay.get('decimation', 1)
+    # Using white or black depending on the overall brightness of the frame
+    top = 255 if frame.dtype == np.uint8 else int(frame.max())
+    color = top if np.mean(frame) < top / 2 else 0
+    frame = np.ascontiguousarray(frame)
+    for miny, minx, maxy, maxx in overlay.get('boxes', []):
+      cv2.rectangle(frame, (minx // dec, miny // dec),
+                    (maxx // dec, maxy // dec), color, 1)
+    for y, x in overlay.get('points', []):
+      cv2.drawMarker(frame, (int(x / dec), int(y / dec)), color,
+                     cv2.MARKER_CROSS, 5, 1)
+    return frame
+
   # Matplotlib
   @staticmethod
   def prepare_mpl() -> None:
@@ -82,7 +122,7 @@ class Displayer(Block):
     return (f / (2 ** i)).astype(np.uint8)
 
   def loop_mpl(self) -> None:
-    data = self.inputs[0].recv_delay(self.delay)['frame'][-1]
+    data = self.get_frame(self.inputs[0].recv_delay(self.delay))
     plt.clf()
     plt.imshow(data, cmap='gray')
     plt.pause(0.001)
@@ -105,7 +145,7 @@ class Displayer(Block):
     self.inputs[0].clear()
 
   def loop_cv(self) -> None:
-    data = self.inputs[0].recv_delay(self.delay)['frame'][-1]
+    data = self.get_frame(self.inputs[0].recv_delay(self.delay))
     if data.dtype != np.uint8:
       if data.max() >= 256:
         data = self.cast_8bits(data)
@@ -152,7 +192,7 @@ class Displayer(Block):
   def loop_tk(self) -> None:
     if not self.go:
       raise CrappyStop
-    data = self.inputs[0].recv_delay(self.delay)['frame'][-1]
+    data = self.get_frame(self.inputs[0].recv_delay(self.delay))
     self.img_shape = data.shape
     self.check_resized()
     if data.dtype != np.uint8:
@@ -44,6 +44,9 @@ class DISVE(Camera):
                border: float = 0.2,
                safe: bool = True,
                follow: bool = True,
+               preview: bool = False,
+               preview_decimation: int = 4,
+               threads: int = 1,
                **kwargs) -> None:
     """Sets a few attributes.
 
@@ -82,6 +85,14 @@ class DISVE(Camera):
         error if that's the case.
       follow: It :obj:`True`, the patches will move to follow the displacement
         of the image.
+      preview: If :obj:`True`, a decimated frame and the position of the
+        patches are sent along the `'frame'` and `'overlay'` labels, so that a
+        :ref:`Displayer` block can display them at its own rate. Unlike
+        ``show_image``, it doesn't slow down the measurement loop.
+      preview_decimation: Only one pixel out of ``preview_decimation`` is kept
+        along each axis on the preview frame.
+      threads: The number of threads processing the patches in parallel. Only
+        worth increasing if there are several patches and several CPU cores.
       **kwargs: Any additional kwarg to pass to the camera.
     """
 
@@ -96,6 +107,11 @@ class DISVE(Camera):
     else:
       self.labels = labels
 
+    self._preview = preview
+    self._preview_decimation = preview_decimation
+    if self._preview:
+      self.labels = self.labels + ['frame', 'overlay']
+
     self._ve_kwargs = {"method": method,
                        "alpha": alpha,
                        "delta": delta,
@@ -108,7 +124,8 @@ class DISVE(Camera):
                        "border": border,
                        "show_image": show_image,
                        "safe": safe,
-                       "follow": follow}
+                       "follow": follow,
+                       "threads": threads}
 
   def prepare(self, *_, **__) -> NoReturn:
     """Opens the camera for acquiring images and displays the corresponding
@@ -137,10 +154,14 @@ class DISVE(Camera):
 
     if self.inputs and not self.input_label and self.inputs[0].poll():
       self.inputs[0].clear()
+      self._ve.close()
       self._ve = VE(img, self._patches, **self._ve_kwargs)
       print("[DISVE block] : Resetting L0")
 
     ret = self._ve.calculate_displacement(img)
+    if self._preview:
+      ret += self.get_preview(img, self._preview_decimation,
+                              boxes=self._ve.get_boxes())
     self.send([t - self.t0] + ret)
 
   def finish(self) -> NoReturn:
@@ -5,6 +5,8 @@ import numpy as np
 from typing import Callable, Union
 
 from ..tool import GPUCorrel as GPUCorrel_tool
+from ..tool import CPUCorrel as CPUCorrel_tool
+from ..tool.gpucorrel import cuda_available
 from .camera import Camera
 
 
@@ -21,6 +23,10 @@ class GPUCorrel(Camera):
 
   The reference image is only taken once, when the :meth:`start` method is
   called (after dropping the first image).
+
+  If CUDA is not available, the same algorithm is run on the CPU using
+  :class:`CPUCorrel`. The ``backend`` argument allows choosing explicitly
+  between `'cuda'` and `'cpu'`.
   """
 
   def __init__(self,
@@ -41,7 +47,12 @@ class GPUCorrel(Camera):
                discard_lim: int = 3,
                discard_ref: int = 5,
                imgref=None,
+               backend: str = 'auto',
+               conflate: bool = False,
                **kwargs) -> None:
+    assert backend in ('auto', 'cuda', 'cpu'), \
+        "backend should be 'auto', 'cuda' or 'cpu'"
+    self.backend = backend
     self.ready = False
     cam_kw = {}
     self.fields = fields
@@ -58,6 +69,7 @@ class GPUCorrel(Camera):
     cam_kw['transform'] = transform
     cam_kw['input_label'] = input_label
     cam_kw['config'] = config
+    cam_kw['conflate'] = conflate
 
     self.verbose = cam_kw['verbose']  # Also, we keep the verbose flag
     if cam_kwargs is not None:
@@ -98,7 +110,14 @@ class GPUCorrel(Camera):
     t, img = self.camera.read_image()
     if self.transform is not None:
       img = self.transform(img)
-    self.correl = GPUCorrel_tool(img.shape, **self.gpu_correl_kwargs)
+    on_cpu = self.backend == 'cpu'
+    if self.backend == 'auto' and not cuda_available():
+      print("[Correl block] CUDA not available, running on the CPU")
+      on_cpu = True
+    if on_cpu:
+      self.correl = CPUCorrel_tool(img.shape, **self.gpu_correl_kwargs)
+    else:
+      self.correl = GPUCorrel_tool(img.shape, **self.gpu_correl_kwargs)
     self.loops = 0
     self.nloops = 50
     self.res_hist = [np.inf]
@@ -13,6 +13,8 @@ except (ModuleNotFoundError, ImportError):
     raise ModuleNotFoundError("pycuda")
 
 from ..tool import GPUCorrel as GPUCorrel_tool
+from ..tool import CPUCorrel as CPUCorrel_tool
+from ..tool.gpucorrel import cuda_available
 from .camera import Camera
 
 
@@ -28,6 +30,10 @@ class GPUVE(Camera):
     ``patches`` must be a :obj:`list` of :obj:`tuple` of length `4`. Each tuple
     contains the origin and the size of each patch along `Y` and `X`
     respectively (i.e. `Oy, Ox, Ly, Lx`).
+
+  If CUDA is not available, the same algorithm is run on the CPU using
+  :class:`CPUCorrel`. The ``backend`` argument allows choosing explicitly
+  between `'cuda'` and `'cpu'`.
   """
 
   def __init__(self,
@@ -45,7 +51,12 @@ class GPUVE(Camera):
                input_label: str = None,
                config: bool = True,
                cam_kwargs: dict = None,
+               backend: str = 'auto',
+               conflate: bool = False,
                **kwargs) -> None:
+    assert backend in ('auto', 'cuda', 'cpu'), \
+        "backend should be 'auto', 'cuda' or 'cpu'"
+    self.backend = backend
     self.ready = False
     cam_kw = {}
     self.patches = patches
@@ -62,6 +73,7 @@ class GPUVE(Camera):
     cam_kw['transform'] = transform
     cam_kw['input_label'] = input_label
     cam_kw['config'] = config
+    cam_kw['conflate'] = conflate
 
     self.verbose = cam_kw['verbose']  # Also, we keep the verbose flag
     if cam_kwargs is not None:
@@ -90,18 +102,27 @@ class GPUVE(Camera):
     self.kwargs = kwargs
 
   def prepare(self, *_, **__) -> None:
-    cuda_init()
-    self.context = make_default_context()
+    on_cpu = self.backend == 'cpu'
+    if self.backend == 'auto' and not cuda_available():
+      print("[VE block] CUDA not available, running on the CPU")
+      on_cpu = True
+    if on_cpu:
+      correl_tool = CPUCorrel_tool
+      self.context = None
+    else:
+      cuda_init()
+      self.context = make_default_context()
+      correl_tool = GPUCorrel_tool
     Camera.prepare(self, send_img=False)
     t, img = self.camera.read_image()
     if self.transform is not None:
       img = self.transform(img)
     self.correl = []
     for oy, ox, h, w in self.patches:
-      self.correl.append(GPUCorrel_tool((h, w),
-                                        fields=['x', 'y'],
-                                        context=self.context,
-                                        levels=1, **self.kwargs))
+      self.correl.append(correl_tool((h, w),
+                                     fields=['x', 'y'],
+                                     context=self.context,
+                                     levels=1, **self.kwargs))
     self.loops = 0
     self.nloops = 50
     for c, (oy, ox, h, w) in zip(self.correl, self.patches):
@@ -1,19 +1,72 @@
 # coding: utf-8
 
 import numpy as np
+from collections import defaultdict
+from math import sqrt
+from typing import Any, List, Union
 
 from .block import Block
 
+STATS = ('mean', 'std', 'min', 'max', 'rms')
+
+
+class _Stats:
+  """Running statistics of a label since the last time they were sent.
+
+  Only a few numbers are kept whatever the number of received values. The sums
+  are made on the differences to the first received value, so that the
+  standard deviation of large values with small variations stays accurate.
+  """
+
+  def __init__(self, first: float) -> None:
+    self.count = 0
+    self.ref = first
+    self.sum = 0.
+    self.sumsq = 0.
+    self.min = np.inf
+    self.max = -np.inf
+
+  def update(self, values: np.ndarray) -> None:
+    """Adds all the given values to the statistics at once."""
+
+    diff = values.ravel() - self.ref
+    self.count += diff.size
+    self.sum += float(diff.sum())
+    self.sumsq += float(diff @ diff)
+    self.min = min(self.min, float(values.min()))
+    self.max = max(self.max, float(values.max()))
+
+  def get(self, stat: str) -> float:
+    """Returns the value of one of the statistics."""
+
+    if stat == 'min':
+      return self.min
+    if stat == 'max':
+      return self.max
+    mean = self.sum / self.count
+    if stat == 'mean':
+      return self.ref + mean
+    var = max(self.sumsq / self.count - mean ** 2, 0.)
+    if stat == 'std':
+      return sqrt(var)
+    return sqrt(var + (self.ref + mean) ** 2)
+
 
 class Mean_block(Block):
   """Can take multiple inputs, makes an average and sends the result every
-  ``delay`` `s`."""
+  ``delay`` `s`.
+
+  Instead of the average, other statistics of the received values can be sent.
+  Only a few running sums are kept for each label between two outputs, and
+  they are updated at once for all the values of a label waiting in a link.
+  """
 
   def __init__(self,
                delay: float,
                tlabel: str = 't(s)',
                out_labels: list = None,
-               freq: float = 50) -> None:
+               freq: float = 50,
+               stats: Union[str, List[str]] = 'mean') -> None:
     """Sets the args and initializes the parent class.
 
     Args:
@@ -23,6 +76,11 @@ class Mean_block(Block):
       out_labels (:obj:`list`, optional): If given, only the listed labels and
         the time will be returned. Otherwise all of them are returned.
       freq: The block will loop at this frequency.
+      stats: The statistic to send for each label, among `'mean'`, `'std'`,
+        `'min'`, `'max'` and `'rms'`. If a :obj:`list` of statistics is given,
+        they are all sent and the name of the statistic is appended to the
+        labels, e.g. ``'F(N)_std'``. For non-numeric labels, the last received
+        value is sent instead.
     """
 
     Block.__init__(self)
@@ -31,34 +89,63 @@ class Mean_block(Block):
     self.out_labels = out_labels
     self.freq = freq
 
+    for stat in [stats] if isinstance(stats, str) else stats:
+      if stat not in STATS:
+        raise ValueError(f"Invalid statistic {stat}, should be one of "
+                         f"{STATS}")
+    self.stats = stats
+
   def prepare(self) -> None:
-    self.temp = [dict() for _ in self.inputs]  # Will hold all the data
+    self._stats = [dict() for _ in self.inputs]  # Will hold the statistics
     self.last_t = -self.delay
     self.t = 0
 
   def loop(self) -> None:
-    # loop over all the inputs, receive if needed, and store only
-    # what we want to keep
-    for i, l in enumerate(self.inputs):
-      while l.poll():
-        r = l.recv()
-        for k in r:
-          if k == self.tlabel:
-            self.t = max(self.t, r[k])
-          elif self.out_labels is None or k in self.out_labels:
-            if k in self.temp[i]:
-              self.temp[i][k].append(r[k])
-            else:
-              self.temp[i][k] = [r[k]]
-    # If we passed delay seconds, make ;he average and send
-    if self.t-self.last_t > self.delay:
+    # loop over all the inputs, receive all the waiting data, and update the
+    # statistics of what we want to keep
+    for link, stats in zip(self.inputs, self._stats):
+      # The messages may not all carry the same labels
+      data = defaultdict(list)
+      while True:
+        r = link.recv(blocking=False)
+        if r is None:
+          break
+        for label, value in r.items():
+          data[label].append(value)
+      for label, values in data.items():
+        if label == self.tlabel:
+          self.t = max(self.t, max(values))
+        elif self.out_labels is None or label in self.out_labels:
+          self._update(stats, label, values)
+
+    # If we passed delay seconds, compute the statistics and send them
+    if self.t - self.last_t > self.delay:
       ret = {self.tlabel: (self.t + self.last_t) / 2}
-      for d in self.temp:
-        for k, v in d.items():
-          try:
-            ret[k] = np.mean(v)
-          except TypeError:
-            ret[k] = v[-1]
-        d.clear()
+      for stats in self._stats:
+        for label, stat in stats.items():
+          ret.update(self._output(label, stat))
+        stats.clear()
       self.last_t = self.t
       self.send(ret)
+
+  @staticmethod
+  def _update(stats: dict, label: str, values: list) -> None:
+    """Updates the statistics of a label with the received values, or keeps
+    the last one if they are not numeric."""
+
+    array = np.asarray(values)
+    if array.dtype.kind not in 'biuf':
+      stats[label] = values[-1]
+      return
+    if not isinstance(stats.get(label), _Stats):
+      stats[label] = _Stats(float(array.flat[0]))
+    stats[label].update(array.astype(float, copy=False))
+
+  def _output(self, label: str, stat: Any) -> dict:
+    """Returns the labels and values to send for a label."""
+
+    if isinstance(self.stats, str):
+      return {label: stat.get(self.stats) if isinstance(stat, _Stats)
+              else stat}
+    return {f'{label}_{name}': stat.get(name) if isinstance(stat, _Stats)
+            else stat for name in self.stats}
@@ -1,20 +1,197 @@
 # coding: utf-8
 
-from numpy import interp, array, searchsorted, concatenate
-from typing import NoReturn
+import numpy as np
+from typing import NoReturn, Literal, Dict, List, Optional
 from itertools import chain
 
 from .block import Block
 
 
+class _Buffer:
+  """Preallocated buffer holding the timestamps and values received from a
+  link.
+
+  New data is written after the last stored point, and old data is discarded
+  by moving the start index, so that the stored points are always available as
+  contiguous views for interpolating. The stored points are only moved back to
+  the beginning of the buffer when its end is reached, and the buffer only
+  grows if it is still too small.
+
+  The values of a label may be arrays, e.g. the rows of a stream.
+  """
+
+  def __init__(self,
+               labels: List[str],
+               half_window: float = 0,
+               size: int = 1024) -> None:
+    self.labels = labels
+    # If not 0, the points within this delay of a timestamp are averaged
+    self.half_window = half_window
+    self._size = size
+    self._start = 0
+    self._end = 0
+    self._t = np.empty(size)
+    # The arrays are only created on the first data, to get their type
+    self._values = None
+
+  def __len__(self) -> int:
+    return self._end - self._start
+
+  @property
+  def t(self) -> np.ndarray:
+    return self._t[self._start:self._end]
+
+  @property
+  def last(self) -> float:
+    """The last timestamp for which a value can be computed."""
+
+    return self._t[self._end - 1] - self.half_window
+
+  def values(self, label: str) -> np.ndarray:
+    return self._values[label][self._start:self._end]
+
+  @staticmethod
+  def _dtype(values: np.ndarray) -> type:
+    """Returns the type of the array storing a label, so that integers can
+    later be followed by floats."""
+
+    if values.dtype.kind in 'biuf':
+      return float
+    if values.dtype.kind == 'c':
+      return complex
+    return object
+
+  def append(self, t: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+    """Adds new points at the end of the buffer."""
+
+    n = len(t)
+    if self._values is None:
+      self._values = {label: np.empty((self._size,) + value.shape[1:],
+                                      dtype=self._dtype(value))
+                      for label, value in values.items()
+                      if label in self.labels}
+    if self._end + n > self._size:
+      self._make_room(n)
+
+    self._t[self._end:self._end + n] = t
+    for label in self.labels:
+      self._values[label][self._end:self._end + n] = values[label]
+    self._end += n
+
+  def _make_room(self, n: int) -> None:
+    """Moves the stored points to the beginning of the buffer, and grows it if
+    ``n`` more points still don't fit in."""
+
+    count = len(self)
+    size = self._size
+    while count + n > size:
+      size *= 2
+
+    def move(old: np.ndarray) -> np.ndarray:
+      new = old if size == self._size else \
+          np.empty((size,) + old.shape[1:], dtype=old.dtype)
+      new[:count] = old[self._start:self._end]
+      return new
+
+    self._t = move(self._t)
+    self._values = {label: move(values)
+                    for label, values in self._values.items()}
+    self._size = size
+    self._start = 0
+    self._end = count
+
+  def trim(self, next_t: float) -> None:
+    """Discards the stored points that are no longer needed for computing the
+    values from the given timestamp on."""
+
+    self._start += max(np.searchsorted(self.t, next_t - self.half_window) - 1,
+                       0)
+
+  def resample(self,
+               new_t: np.ndarray,
+               next_t: float,
+               mode: str) -> Dict[str, np.ndarray]:
+    """Returns the values of the labels at the given timestamps.
+
+    Before the first point and after the last one, the values of these points
+    are returned. ``next_t`` is the first timestamp of the next call, that
+    closes the averaging window of the last timestamp.
+    """
+
+    t = self.t
+    if mode == 'linear':
+      ret = {label: self._interp(new_t, t, self.values(label))
+             for label in self.labels}
+    else:
+      # The index of the last point before each timestamp, shared by all
+      # labels
+      idx = np.maximum(np.searchsorted(t, new_t, side='right') - 1, 0)
+      if mode == 'nearest':
+        nxt = np.minimum(idx + 1, len(t) - 1)
+        idx = np.where(t[nxt] - new_t < new_t - t[idx], nxt, idx)
+      ret = {label: self.values(label)[idx] for label in self.labels}
+
+    if self.half_window:
+      self._average(np.append(new_t, next_t) - self.half_window, ret)
+    return ret
+
+  @staticmethod
+  def _interp(new_t: np.ndarray,
+              t: np.ndarray,
+              values: np.ndarray) -> np.ndarray:
+    """Linear interpolation of a label, column by column for arrays."""
+
+    if values.ndim == 1:
+      return np.interp(new_t, t, values)
+    flat = values.reshape(len(values), -1)
+    return np.stack([np.interp(new_t, t, column) for column in flat.T],
+                    axis=-1).reshape((len(new_t),) + values.shape[1:])
+
+  def _average(self, edges: np.ndarray, ret: Dict[str, np.ndarray]) -> None:
+    """Replaces the resampled values by the mean of the points between the
+    given edges, where there is at least one.
+
+    The sums are obtained from the cumulative sum of the points, so that all
+    the points are used without looping over the timestamps.
+    """
+
+    edges = np.searchsorted(self.t, edges)
+    first, last = edges[0], edges[-1]
+    begins, ends = edges[:-1] - first, edges[1:] - first
+    counts = ends - begins
+    filled = counts > 0
+    if not filled.any():
+      return
+
+    for label in self.labels:
+      values = self.values(label)[first:last]
+      if values.dtype == object:
+        continue
+      sums = np.concatenate((np.zeros((1,) + values.shape[1:],
+                                      dtype=values.dtype),
+                             np.cumsum(values, axis=0)))
+      shape = (-1,) + (1,) * (values.ndim - 1)
+      means = (sums[ends[filled]] - sums[begins[filled]]) / \
+          counts[filled].reshape(shape)
+      ret[label] = ret[label].astype(means.dtype)
+      ret[label][filled] = means
+
+
 class Multiplex(Block):
   """This block takes data from upstream blocks as input and interpolates it to
   output all labels in a common time basis.
 
   It is useful for synchronizing data acquired from different sensors, e.g. to
-  plot a real-time stress-strain curve. This block is however quite
-  resource-consuming, so it is preferable to perform interpolation in
-  post-processing if real-time is not needed.
+  plot a real-time stress-strain curve. The data of each link is kept in a
+  preallocated buffer, and all the points of an interpolation window are
+  computed at once and sent as a single batch. The downstream blocks still
+  receive the points one by one.
+
+  The streams sent by a streaming :ref:`IOBlock` are also accepted, i.e. data
+  whose time label is an array with the timestamps of the rows of the other
+  labels. All their points are used, so a high-rate stream can be synchronized
+  with low-rate sensors without having to :ref:`Demux` it first. Each column of
+  a stream is output as a separate label.
 
   Note:
     This block doesn't truly output data in real-time as it needs to wait for
@@ -27,6 +204,10 @@ class Multiplex(Block):
   def __init__(self,
                time_label: str = 't(s)',
                freq: float = 200,
+               mode: Literal['linear', 'hold', 'nearest'] = 'linear',
+               decimate: bool = True,
+               stream_labels: Optional[Dict[str, List[str]]] = None,
+               transpose: bool = False,
                verbose: bool = False) -> None:
     """Sets the args and initializes the parent class.
 
@@ -35,31 +216,57 @@ class Multiplex(Block):
       freq : The sample rate for the interpolation, and the target looping
         frequency for the block. If this value is set too high and your machine
         cannot keep up, the block will most likely lag.
+      mode: How the values are computed between two received points. With
+        `'linear'` they are linearly interpolated, with `'hold'` the last
+        received value is kept (zero-order hold), and with `'nearest'` the
+        value of the closest point in time is taken. The last two modes are
+        cheaper, do not create values that were never received, and also work
+        with non-numeric labels. They are well suited for command signals.
+      decimate: If :obj:`True`, the output values of the streams are the mean
+        of all the points within half a period of each timestamp, which avoids
+        aliasing when the stream is faster than ``freq``. The values are
+        computed according to ``mode`` only where there is no such point.
+        Otherwise, the streams are also resampled according to ``mode``.
+      stream_labels: The names of the output labels for each column of the
+        streams, as a :obj:`dict` whose keys are the labels of the streams. By
+        default, the columns of a stream ``'stream'`` are output as
+        ``'stream_0'``, ``'stream_1'``, etc.
+      transpose: Set to :obj:`True` if each channel of the streams is a row
+        rather than a column.
       verbose: If :obj:`True`, prints information about the looping frequency
         of the block.
     """
 
     Block.__init__(self)
 
+    if mode not in ('linear', 'hold', 'nearest'):
+      raise ValueError(f"Invalid mode {mode}, should be 'linear', 'hold' or "
+                       f"'nearest' !")
+
     # Initializing the attributes
     self._time_label = time_label
     self.freq = freq
     self.verbose = verbose
+    self._mode = mode
+    self._decimate = decimate
+    self._stream_labels = dict() if stream_labels is None else stream_labels
+    self._transpose = transpose
     self._t = 0
     self._dt = 1 / self.freq
+    # The number of points sent so far, to avoid accumulating rounding errors
+    self._n = 0
 
     # Creating the different dicts holding information
-    self._values = dict()
-    self._timestamps = dict()
+    self._buffers = dict()
     self._labels_to_get = dict()
-    self._label_to_link = dict()
+    self._streams = dict()
 
   def begin(self) -> NoReturn:
     """Receiving the first data from the upstream blocks, and checking that it
     is valid.
 
     If part of the data is not valid, warning the user. For the valid data,
-    initializing the different dicts with it.
+    initializing the buffers with it.
     """
 
     for link in self.inputs:
@@ -72,28 +279,32 @@ class Multiplex(Block):
               f'as it does not contain the time label ({self._time_label})')
         continue
 
-      # Extracting the timestamps from the received data
-      timestamp = data.pop(self._time_label)
-
       # Determining which labels to use for multiplexing and warning the user
       # if two similar labels found
-      self._labels_to_get[link] = [label for label in data if label not in
+      labels = [label for label in data if label != self._time_label]
+      self._labels_to_get[link] = [label for label in labels if label not in
                                    chain(*self._labels_to_get.values())]
-      if len(self._labels_to_get[link]) != len(data):
-        print(f"WARNING : Got identical label(s)" 
-              f"""{tuple(label for label in data if label 
-                         not in self._labels_to_get[link])}""" 
+      if len(self._labels_to_get[link]) != len(labels):
+        print(f"WARNING : Got identical label(s)"
+              f"""{tuple(label for label in labels
+                         if label not in self._labels_to_get[link])}"""
               f"from at least two different links, on of them won't be used "
               f"for multiplexing.")
 
-      self._label_to_link.update({label: link for label in
-                                  self._labels_to_get[link]})
-
-      # Storing the timestamps for the link
-      self._timestamps[link] = array(timestamp)
-      # Storing the values for the labels that were kept
-      self._values.update({label: array(values) for label, values in
-                           data.items() if label in self._labels_to_get[link]})
+      # The data is a stream if each message carries an array of timestamps
+      self._streams[link] = np.ndim(data[self._time_label][0]) > 0
+      if not self._streams[link] and any(
+          np.ndim(data[label][0]) > 1 for label in self._labels_to_get[link]):
+        raise ValueError(f"Cannot multiplex the arrays coming from link "
+                         f"{link.name} as they do not come with an array of "
+                         f"timestamps")
+
+      # Storing the timestamps and the values for the labels that were kept
+      self._buffers[link] = _Buffer(
+        self._labels_to_get[link],
+        half_window=self._dt / 2
+        if self._streams[link] and self._decimate else 0)
+      self._store(link, data)
 
   def loop(self) -> NoReturn:
     """Receives data, interpolates it, and sends it to the downstream
@@ -107,6 +318,33 @@ class Multiplex(Block):
 
     self._send_data()
 
+  def _store(self, link, data: Dict[str, list]) -> None:
+    """Adds the data received from a link to its buffer.
+
+    The chunks of the streams are concatenated, and their timestamps are
+    checked.
+    """
+
+    if not self._streams[link]:
+      self._buffers[link].append(
+        np.asarray(data[self._time_label], dtype=float),
+        {label: np.asarray(data[label])
+         for label in self._labels_to_get[link]})
+      return
+
+    t = np.concatenate([np.ravel(times) for times
+                        in data[self._time_label]]).astype(float)
+    values = dict()
+    for label in self._labels_to_get[link]:
+      chunks = [np.asarray(chunk) for chunk in data[label]]
+      if self._transpose:
+        chunks = [chunk.T for chunk in chunks]
+      values[label] = np.concatenate(chunks)
+      if len(values[label]) != len(t):
+        raise ValueError(f"Got {len(values[label])} points for label {label} "
+                         f"but {len(t)} timestamps from link {link.name}")
+    self._buffers[link].append(t, values)
+
   def _get_data(self) -> NoReturn:
     """Receives data from the upstream links."""
 
@@ -114,55 +352,53 @@ class Multiplex(Block):
       # Receiving data from each link, non-blocking to prevent accumulation
       data = link.recv_chunk(blocking=False)
       # Processing only the valid labels
-      if data is not None and link in self._labels_to_get:
-        # Saving the timestamps
-        self._timestamps[link] = concatenate((self._timestamps[link],
-                                              array(data[self._time_label])))
-        # Saving the other values
-        for label in self._labels_to_get[link]:
-          self._values[label] = concatenate((self._values[label],
-                                             array(data[label])))
+      if data is not None and link in self._buffers:
+        self._store(link, data)
 
   def _send_data(self) -> NoReturn:
     """Interpolates the previously received data, and sends the result to the
     downstream blocks."""
 
     # Making sure all the necessary data has been received for interpolating
-    if all(timestamp[-1] > self._t for timestamp
-           in self._timestamps.values()) and any(
-      timestamp.size for timestamp in self._timestamps.values()):
-
-      # Getting the maximum timestamp common to all the labels
-      max_t = min(times[-1] for times in self._timestamps.values())
-      # Deducing the number of time intervals to interpolate on
-      n_samples = int((max_t - self._t) // self._dt) + 1
-      # Creating the array of timestamps for interpolation
-      new_times = [self._t + i * self._dt for i in range(n_samples)]
-
-      # For each link, getting the index for trimming data after interpolation
-      last_indexes = {link: searchsorted(self._timestamps[link], new_times[-1],
-                                         side='right')
-                      for link in self.inputs}
-
-      # This dict stores the values to send
-      to_send = {self._time_label: new_times}
-
-      # For each label, interpolating the data
-      for label in self._values:
-        link = self._label_to_link[label]
-        to_send[label] = list(interp(new_times, self._timestamps[link],
-                                     self._values[label]))
-
-        # Trimming the values to save some memory
-        self._values[label] = self._values[label][last_indexes[link]:]
-
-      # Also trimming the timestamps to save some memory
-      for link in self.inputs:
-        self._timestamps[link] = self._timestamps[link][last_indexes[link]:]
-
-      # Updating the current time value
-      self._t = new_times[-1] + self._dt
-
-      # Finally, sending the data to downstream blocks
-      while any(to_send.values()):
-        self.send({label: values.pop(0) for label, values in to_send.items()})
+    if not self._buffers or not all(
+        len(buffer) and buffer.last > self._t
+        for buffer in self._buffers.values()):
+      return
+
+    # Getting the maximum timestamp common to all the labels
+    max_t = min(buffer.last for buffer in self._buffers.values())
+    # Deducing the number of time intervals to interpolate on
+    n_samples = int((max_t - self._t) // self._dt) + 1
+    # Creating the array of timestamps for interpolation
+    new_times = (self._n + np.arange(n_samples)) * self._dt
+
+    # Updating the current time value
+    self._n += n_samples
+    self._t = self._n * self._dt
+
+    # For each link, interpolating the data of all its labels
+    to_send = {self._time_label: new_times}
+    for buffer in self._buffers.values():
+      for label, values in buffer.resample(new_times, self._t,
+                                            self._mode).items():
+        if values.ndim == 1:
+          to_send[label] = values
+        else:
+          to_send.update(zip(self._column_labels(label, values.shape[1]),
+                             values.T))
+
+      # Trimming the data that won't be needed anymore
+      buffer.trim(self._t)
+
+    # Finally, sending all the points to downstream blocks at once
+    self.send_batch(to_send)
+
+  def _column_labels(self, label: str, columns: int) -> List[str]:
+    """Returns the names of the output labels for the columns of a stream."""
+
+    if label not in self._stream_labels:
+      return [f'{label}_{i}' for i in range(columns)]
+    if len(self._stream_labels[label]) != columns:
+      raise ValueError(f"Got {len(self._stream_labels[label])} names for the "
+                       f"{columns} columns of label {label}")
+    return self._stream_labels[label]
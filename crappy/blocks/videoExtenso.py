@@ -48,6 +48,8 @@ class Video_extenso(Camera):
                border: int = 5,
                min_area: float = 150,
                blur: float = 5,
+               preview: bool = False,
+               preview_decimation: int = 4,
                **kwargs) -> None:
     """Sets the args and initializes the camera.
 
@@ -104,6 +106,12 @@ class Video_extenso(Camera):
         selected regions.
       blur: Median blur to be added to the image to smooth out irregularities
         and make detection more reliable.
+      preview: If :obj:`True`, a decimated frame, the boxes and the centers of
+        the spots are sent along the `'frame'` and `'overlay'` labels, so that
+        a :ref:`Displayer` block can display them at its own rate. Unlike
+        ``show_image``, it doesn't slow down the measurement loop.
+      preview_decimation: Only one pixel out of ``preview_decimation`` is kept
+        along each axis on the preview frame.
       **kwargs: Any additional specific argument to pass to the camera.
     """
 
@@ -129,6 +137,10 @@ class Video_extenso(Camera):
     self.labels = ['t(s)', 'Coord(px)', 'Eyy(%)', 'Exx(%)'] \
         if labels is None else labels
     self.show_image = show_image
+    self.preview = preview
+    self.preview_decimation = preview_decimation
+    if self.preview:
+      self.labels = self.labels + ['frame', 'overlay']
     self.wait_l0 = wait_l0
     self.end = end
 
@@ -197,10 +209,16 @@ class Video_extenso(Camera):
       cv2.waitKey(5)
 
     centers = [(r['y'], r['x']) for r in self.ve.spot_list]
+    if self.preview:
+      preview = self.get_preview(img, self.preview_decimation,
+                                 boxes=[r['bbox'] for r in self.ve.spot_list],
+                                 points=centers)
+    else:
+      preview = []
     if not self.wait_l0:
-      self.send([t - self.t0, centers] + d)
+      self.send([t - self.t0, centers] + d + preview)
     else:
-      self.send([t - self.t0, [(0, 0)] * 4, 0, 0])
+      self.send([t - self.t0, [(0, 0)] * 4, 0, 0] + preview)
 
   def lost_loop(self) -> None:
     t, img = self.get_img()
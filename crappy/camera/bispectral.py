@@ -3,6 +3,7 @@
 import numpy as np
 
 from .cameralink import Cl_camera
+from ..tool.pixel_correction import Pixel_correction
 
 table = (0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280, 0xC241,
          0xC601, 0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481, 0x0440,
@@ -77,6 +78,7 @@ class Bispectral(Cl_camera):
                      setter=self._set_it2, getter=self._get_it2)
     self.add_setting('fps', getter=self.get_trigg_freq,
                      setter=self.set_trigg_freq, limits=(1., 150.))
+    self._correction = None
 
   def _set_w(self, val: int) -> None:
     Cl_camera._set_w(self, val * 2)
@@ -244,12 +246,34 @@ class Bispectral(Cl_camera):
     img[::, 1:self.width:2] = frame[::, 1::4]
     img[::, self.width::2] = frame[::, 2::4]
     img[::, self.width + 1::2] = frame[::, 3::4]
+    if self._correction is not None:
+      img = self._correction.correct(img, out=img)
     return t, img
 
   def close(self) -> None:
     Cl_camera.close(self)
 
-  def open(self, **kwargs) -> None:
+  def open(self,
+           dead_pixels: list = None,
+           offset: np.ndarray = None,
+           gain: np.ndarray = None,
+           **kwargs) -> None:
+    """Opens the camera, and sets up the correction of the images if needed.
+
+    Args:
+      dead_pixels: The dead pixels to replace by the median of their
+        neighbours, as a boolean mask or a :obj:`list` of ``(y, x)``
+        coordinates on the output image.
+      offset: An array to subtract from every output image.
+      gain: An array every output image is multiplied with, for flat-field
+        correction.
+      **kwargs: The settings to pass to the camera.
+    """
+
     Cl_camera.open(self, **kwargs)
     self.send_cmd('@W1A084')  # Restore unwindowed Mode
     self.send_cmd('@W10012')  # Make sure the image is not inverted
+    if dead_pixels is not None or offset is not None or gain is not None:
+      self._correction = Pixel_correction((self.height, self.width * 2),
+                                          dead_pixels=dead_pixels,
+                                          offset=offset, gain=gain)
@@ -3,11 +3,13 @@
 from .camera import Camera
 from .._global import OptionalModule
 from time import time, sleep
-from numpy import uint8, ndarray, uint16
+from numpy import uint8, ndarray, uint16, array
 from typing import NoReturn, Tuple, Optional, Union
-from subprocess import Popen, PIPE, run
+from subprocess import Popen, PIPE
+from collections import deque
+from threading import Lock
 from platform import system
-from re import findall, split
+from ..tool.v4l2_query import V4L2_query
 
 try:
   import cv2
@@ -55,6 +57,10 @@ class Camera_gstreamer(Camera):
     self._last_frame_nr = 0
     self._frame_nr = 0
     self._img = None
+    self._frames = deque()
+    self._released = []
+    self._lock = Lock()
+    self._dropped = 0
 
     self._exposure_mode = None
 
@@ -63,6 +69,10 @@ class Camera_gstreamer(Camera):
            user_pipeline: Optional[str] = None,
            nb_channels: Optional[int] = None,
            img_depth: Optional[int] = None,
+           max_buffers: int = 1,
+           drop: bool = True,
+           frame_queue: Optional[int] = None,
+           zero_copy: bool = False,
            **kwargs) -> NoReturn:
     """Opens the pipeline, sets the settings and starts the acquisition of
     images.
@@ -113,6 +123,21 @@ videoconvert ! autovideosink
         acquired images, in case a custom pipeline is given. Otherwise, this
         argument is ignored. For now, Crappy only manages 8- and 16-bits deep
         images.
+      max_buffers (:obj:`int`, optional): The maximum number of buffers the
+        appsink can hold before dropping or blocking. `0` means unlimited.
+      drop (:obj:`bool`, optional): If :obj:`True`, the appsink drops the
+        oldest buffers when ``max_buffers`` is reached, otherwise it blocks the
+        pipeline.
+      frame_queue (:obj:`int`, optional): If given, the acquired frames are
+        kept in a queue of this size and returned in order by
+        :meth:`get_image`, the oldest ones being dropped when it is full.
+        Otherwise, only the latest frame is returned.
+      zero_copy (:obj:`bool`, optional): If :obj:`True`, the frames are
+        returned as NumPy views on the GStreamer buffers instead of being
+        copied. A frame is then only valid until the next call to
+        :meth:`get_image`, so this option should only be used when the frames
+        are not kept by the caller. Has no effect on frames converted to gray
+        level, as the conversion already creates a new array.
       **kwargs: Allows specifying values for the settings even before
         displaying the graphical interface.
     """
@@ -128,12 +153,20 @@ videoconvert ! autovideosink
     if img_depth is not None and img_depth not in [8, 16]:
       return ValueError('The img_depth must be either 8 or 16 (bits)')
 
+    if frame_queue is not None and frame_queue < 1:
+      raise ValueError('frame_queue must be at least 1 if given !')
+
     if user_pipeline is not None and nb_channels is None:
       raise ValueError('nb_channels must be given if user_pipeline is !')
     if user_pipeline is not None and img_depth is None:
       raise ValueError('img_depth must be given if user_pipeline is !')
 
     self._process = None
+    self._max_buffers = max_buffers
+    self._drop = drop
+    self._zero_copy = zero_copy
+    self._frames = deque(maxlen=frame_queue)
+    self._queued = frame_queue is not None
 
     # Parsing the user pipeline if given
     if user_pipeline is not None:
@@ -180,37 +213,29 @@ videoconvert ! autovideosink
       # First, determine if the exposure can be set (Linux only)
       if system() == "Linux":
 
-        # Trying to run v4l2-ctl to get the available settings
-        command = ['v4l2-ctl', '-l'] if device is None \
-          else ['v4l2-ctl', '-d', device, '-l']
-        try:
-          check = run(command, capture_output=True, text=True)
-        except FileNotFoundError:
+        # Running v4l2-ctl once to get all the information about the device
+        self._v4l2 = V4L2_query(device)
+        controls = self._v4l2.controls()
+        if not self._v4l2.available:
           print("\n#######\n"
                 "Warning ! The performance of the Camera_gstreamer "
                 "class could be improved if v4l-utils was installed !"
                 "\n#######\n")
-          check = None
-        check = check.stdout if check is not None else ''
 
-        # Trying to find the exposure parameters in the returned string
-        expo = findall(r'exposure\s0x[0-9A-Fa-f]+\s\(\w+\)\s+:'
-                       r'\smin=\d+\smax=\d+', check)
-        expo_auto = findall(r'exposure_auto\s0x[0-9A-Fa-f]+\s\(\w+\)\s+:'
-                            r'\smin=\d+\smax=\d+', check)
-        expo_abso = findall(r'exposure_absolute\s0x[0-9A-Fa-f]+\s\(\w+\)\s+:'
-                            r'\smin=\d+\smax=\d+', check)
+        # Trying to find the exposure parameters in the controls
+        expo = controls.get('exposure')
+        expo_auto = controls.get('exposure_auto')
+        expo_abso = controls.get('exposure_absolute')
 
         # If there's an exposure parameter, getting its upper and lower limits
-        if expo:
-          expo_min = findall(r'\d+', expo[0])[-2]
-          expo_max = findall(r'\d+', expo[0])[-1]
+        if expo is not None and 'min' in expo and 'max' in expo:
+          expo_min, expo_max = expo['min'], expo['max']
           self._exposure_mode = 'direct'
 
         # If there's an exposure parameter, getting its upper and lower limits
-        elif expo_auto and expo_abso:
-          expo_min = findall(r'\d+', expo_abso[0])[-2]
-          expo_max = findall(r'\d+', expo_abso[0])[-1]
+        elif expo_auto is not None and expo_abso is not None and \
+            'min' in expo_abso and 'max' in expo_abso:
+          expo_min, expo_max = expo_abso['min'], expo_abso['max']
           self._exposure_mode = 'auto'
 
         else:
@@ -228,35 +253,15 @@ videoconvert ! autovideosink
         self._format_to_index = {}
         self._index_to_format = {}
 
-        # Trying to run v4l2-ctl to get the available formats
-        command = ['v4l2-ctl', '--list-formats-ext'] if device is None \
-            else ['v4l2-ctl', '-d', device, '--list-formats-ext']
-        try:
-          check = run(command, capture_output=True, text=True)
-        except FileNotFoundError:
-          check = None
-        check = check.stdout if check is not None else ''
-
-        # Splitting the returned string to isolate each encoding
-        if findall(r'\[\d+]', check):
-          check = split(r'\[\d+]', check)[1:]
-        elif findall(r'Pixel\sFormat', check):
-          check = split(r'Pixel\sFormat', check)[1:]
-        else:
-          check = []
-
-        if check:
-          for img_format in check:
-            # For each encoding, finding its name
-            name = findall(r"'\w+'", img_format)[0].replace("'", '')
-            sizes = findall(r'\d+x\d+', img_format)
+        # The formats were already retrieved by the previous v4l2-ctl call
+        formats = self._v4l2.formats()
 
-            # For each name, finding the available sizes
-            for size in sizes:
-              self._format_to_index.update(
-                {name + ' ' + size: len(self._format_to_index)})
-              self._index_to_format.update(
-                {len(self._index_to_format): name + ' ' + size})
+        if formats:
+          for img_format in formats:
+            self._format_to_index.update(
+              {img_format: len(self._format_to_index)})
+            self._index_to_format.update(
+              {len(self._index_to_format): img_format})
 
         else:
           # If v4l-utils is not installed, proposing two encodings without
@@ -289,9 +294,7 @@ videoconvert ! autovideosink
 
     # Setting up GStreamer and the callback
     self._pipeline = Gst.parse_launch(self._get_pipeline())
-    self._app_sink = self._pipeline.get_by_name('sink')
-    self._app_sink.set_property("emit-signals", True)
-    self._app_sink.connect("new-sample", self._on_new_sample)
+    self._set_sink()
 
     # Starting image acquisition
     self._pipeline.set_state(Gst.State.PLAYING)
@@ -314,34 +317,79 @@ videoconvert ! autovideosink
     self.set_all(**kwargs)
 
   def get_image(self) -> Tuple[float, ndarray]:
-    """Reads the last image acquired from the camera.
+    """Reads the last image acquired from the camera, or the oldest one in the
+    queue if ``frame_queue`` was given.
 
     Returns:
-      The acquired image, along with a timestamp.
+      The acquired image, along with the timestamp of its reception.
     """
 
+    # The frames returned on the previous call are not used anymore
+    self._release()
+
     # Assuming an image rate greater than 0.5 FPS
     # Checking that we don't return the same image twice
     t0 = time()
-    while self._last_frame_nr == self._frame_nr:
+    while not self._frames:
       if time() - t0 > 2:
         raise TimeoutError("Waited too long for the next image !")
-      sleep(0.01)
+      sleep(0.001)
 
-    self._last_frame_nr = self._frame_nr
+    with self._lock:
+      t, img, mapping = self._frames.popleft()
+      if mapping is not None:
+        self._released.append(mapping)
+      self._last_frame_nr = self._frame_nr
 
-    return time(), self._img
+    return t, img
+
+  @property
+  def dropped(self) -> int:
+    """The number of frames dropped so far, either by the appsink or because
+    they were not read before being replaced by newer ones."""
+
+    dropped = self._dropped
+    try:
+      dropped += self._app_sink.get_property('stats').get_value('dropped')
+    except (AttributeError, TypeError):
+      # The stats property is only available since GStreamer 1.18
+      pass
+    return dropped
 
   def close(self) -> NoReturn:
     """Simply stops the image acquisition."""
 
     self._pipeline.set_state(Gst.State.NULL)
 
+    # Releasing all the buffers still mapped
+    with self._lock:
+      self._released.extend(mapping for *_, mapping in self._frames
+                            if mapping is not None)
+      self._frames.clear()
+    self._release()
+
     # Closes the subprocess started in case a user pipeline containing a pipe
     # was given
     if self._process is not None:
       self._process.terminate()
 
+  def _set_sink(self) -> NoReturn:
+    """Configures the appsink of the pipeline and connects the callback."""
+
+    self._app_sink = self._pipeline.get_by_name('sink')
+    self._app_sink.set_property("emit-signals", True)
+    self._app_sink.set_property("max-buffers", self._max_buffers)
+    self._app_sink.set_property("drop", self._drop)
+    self._app_sink.connect("new-sample", self._on_new_sample)
+
+  def _release(self) -> NoReturn:
+    """Unmaps the buffers of the frames that are not used anymore."""
+
+    with self._lock:
+      released, self._released = self._released, []
+    for buffer, map_info in released:
+      buffer.unmap(map_info)
+
   def _restart_pipeline(self,
                         pipeline: str,
                         exposure: Optional[int] = None) -> NoReturn:
@@ -355,11 +403,13 @@ videoconvert ! autovideosink
     # Stops the previous pipeline
     self._pipeline.set_state(Gst.State.NULL)
 
+    # The information about the device has to be queried again
+    if hasattr(self, '_v4l2'):
+      self._v4l2.invalidate()
+
     # Redefines the pipeline and the callbacks
     self._pipeline = Gst.parse_launch(pipeline)
-    self._app_sink = self._pipeline.get_by_name('sink')
-    self._app_sink.set_property("emit-signals", True)
-    self._app_sink.connect("new-sample", self._on_new_sample)
+    self._set_sink()
 
     # There's an extra step to set the exposure
     if system() == "Linux" and exposure is not None and \
@@ -459,6 +509,11 @@ videoconvert ! autovideosink
   def _on_new_sample(self, app_sink):
     """Callback that reads every new frame and puts it into a buffer.
 
+    The frame is a NumPy view on the mapped buffer data. It is either
+    converted to gray level or copied before unmapping the buffer, unless
+    ``zero_copy`` is set in which case the buffer stays mapped until the frame
+    is not used anymore.
+
     Args:
       app_sink: The AppSink object containing the new frames.
 
@@ -466,6 +521,7 @@ videoconvert ! autovideosink
       A GStreamer object indicating that the reading went fine.
     """
 
+    t = time()
     sample = app_sink.pull_sample()
     caps = sample.get_caps()
 
@@ -480,27 +536,45 @@ videoconvert ! autovideosink
     if not success:
       raise RuntimeError("Could not map buffer data!")
 
-    # Casting the data into a numpy array
+    # Casting the data into a numpy array, without copying it
     try:
       numpy_frame = ndarray(
         shape=(height, width, self._nb_channels),
         dtype=uint8 if self._img_depth == 8 else uint16,
         buffer=map_info.data)
     except TypeError:
+      buffer.unmap(map_info)
       raise TypeError("Unexpected number of channels in the received image !\n"
                       "You can try adding something like ' ! videoconvert ! "
                       "video/x-raw,format=BGR ! ' before your sink to specify "
                       "the format.\n(here BGR would be for 3 channels)")
 
-    # Converting to gray level if needed
+    # Converting to gray level if needed, this creates a new array
     if self._user_pipeline is None and self.channels == 1:
       numpy_frame = cv2.cvtColor(numpy_frame, cv2.COLOR_BGR2GRAY)
-
-    # Cleaning up the buffer mapping
-    buffer.unmap(map_info)
-
-    self._img = numpy_frame
-    self._frame_nr += 1
+      mapping = None
+    # Keeping the buffer mapped as long as the frame is used
+    elif self._zero_copy:
+      mapping = (buffer, map_info)
+    else:
+      numpy_frame = array(numpy_frame)
+      mapping = None
+
+    # Cleaning up the buffer mapping if it's not needed anymore
+    if mapping is None:
+      buffer.unmap(map_info)
+
+    with self._lock:
+      # Dropping the oldest frame if it was never read
+      if self._frames and (not self._queued or
+                           len(self._frames) == self._frames.maxlen):
+        *_, old_mapping = self._frames.popleft()
+        if old_mapping is not None:
+          self._released.append(old_mapping)
+        self._dropped += 1
+      self._frames.append((t, numpy_frame, mapping))
+      self._img = numpy_frame
+      self._frame_nr += 1
 
     return Gst.FlowReturn.OK
 
@@ -533,30 +607,16 @@ videoconvert ! autovideosink
     self._restart_pipeline(self._get_pipeline(), exposure=exposure)
 
   def _get_exposure(self) -> int:
-    """Returns the current exposure value.
+    """Returns the current exposure value, read from the cached v4l2-ctl
+    output.
 
     Only works when the platform is Linux.
     """
 
-    # trying to run v4l2-ctl to get the exposure value
-    if self._device is not None:
-      command = ['v4l2-ctl', '-d', self._device, '-C',
-                 'exposure_absolute' if self._exposure_mode == 'auto' else
-                 'exposure']
-    else:
-      command = ['v4l2-ctl', '-C',
-                 'exposure_absolute' if self._exposure_mode == 'auto' else
-                 'exposure']
-    try:
-      expo = run(command, capture_output=True, text=True)
-    except FileNotFoundError:
-      expo = None
-
-    # Extracting the exposure from the returned string
-    expo = expo.stdout if expo is not None else ''
-    expo = findall(r'\d+', expo)
-    if expo:
-      return expo[0]
+    expo = self._v4l2.control('exposure_absolute' if self._exposure_mode ==
+                              'auto' else 'exposure')
+    if expo is not None and 'value' in expo:
+      return expo['value']
     else:
       raise IOError("Couldn't read exposure value from v4l2 !")
 
@@ -566,27 +626,10 @@ videoconvert ! autovideosink
     self._restart_pipeline(self._get_pipeline(img_format=img_format))
 
   def _get_format(self) -> int:
-    """Parses the v4l2-ctl -V command to get the current image format as an
-    index."""
+    """Reads the current image format from the cached v4l2-ctl output, and
+    returns it as an index."""
 
-    # Sending the v4l2-ctl command
-    if self._device is not None:
-      command = ['v4l2-ctl', '-d', str(self._device), '-V']
-    else:
-      command = ['v4l2-ctl', '-V']
-    check = run(command, capture_output=True, text=True).stdout
-
-    # Parsing the answer
-    format_ = width = height = ''
-    if findall(r"'\w+'", check):
-      format_ = findall(r"'\w+'", check)[0].replace("'", "")
-    if findall(r"\d+/\d+", check):
-      width = findall(r"\d+/\d+", check)[0].split('/')[0]
-      height = findall(r"\d+/\d+", check)[0].split('/')[1]
-
-    # Returning the corresponding index
     try:
-      index = self._format_to_index[format_ + ' ' + width + 'x' + height]
-      return index
+      return self._format_to_index[self._v4l2.current_format()]
     except KeyError:
       raise KeyError("Couldn't retrieve the current image format.")
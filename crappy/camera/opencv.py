@@ -1,12 +1,14 @@
 # coding: utf-8
 
 from time import time
-from typing import NoReturn, Tuple
-from numpy import ndarray
+from typing import NoReturn, Tuple, Union
+from numpy import ndarray, uint8
 from platform import system
-from subprocess import run
-from re import findall, split
+from threading import Thread, Event, RLock
+from queue import Queue, Empty, Full
+from concurrent.futures import ThreadPoolExecutor
 from .camera import Camera
+from ..tool.v4l2_query import V4L2_query
 from .._global import OptionalModule
 
 try:
@@ -30,6 +32,12 @@ class Camera_opencv(Camera):
   Note:
     For a better performance of this class in Linux, it is recommended to have
     `v4l-utils` installed.
+
+  Note:
+    The frames can be grabbed in a separate thread and decoded by a pool of
+    workers, which is much faster for high-resolution MJPEG cameras. With the
+    V4L2 and FFmpeg backends, the MJPEG frames are then retrieved undecoded and
+    decoded in parallel directly to the required number of channels.
   """
 
   def __init__(self) -> None:
@@ -38,63 +46,71 @@ class Camera_opencv(Camera):
     Camera.__init__(self)
     self.name = "camera_opencv"
     self._cap = None
+    self._cap_lock = RLock()
+    self._threads = 0
+    self._acquisition = None
+    self._pool = None
+    self._frames = None
+    self._raw = False
+    self._stop_acq = Event()
 
     self.add_setting("channels", limits={1: 1, 3: 3}, default=1)
 
-  def open(self, device_num: int = 0, **kwargs) -> None:
+  def open(self,
+           device_num: Union[int, str] = 0,
+           threads: int = 0,
+           queue_size: int = 4,
+           **kwargs) -> None:
     """Opens the video stream and sets any user-specified settings.
 
     Args:
-      device_num (:obj:`int`, optional): The number of the device to open.
+      device_num (:obj:`int`, optional): The number of the device to open. It
+        can also be the path to a video file, mostly for benchmarking purposes.
+        No setting except the number of channels is then available.
+      threads (:obj:`int`, optional): If greater than `0`, the frames are
+        grabbed in a separate thread and decoded or converted by this number of
+        worker threads, the order of the frames being preserved. Otherwise,
+        the frames are read and converted in :meth:`get_image`.
+      queue_size (:obj:`int`, optional): When ``threads`` is greater than `0`,
+        the maximum number of frames grabbed in advance.
       **kwargs: Any additional setting to set before opening the graphical
         interface.
     """
 
-    if not isinstance(device_num, int) or device_num < 0:
-      raise ValueError("device_num should be an integer !")
+    if isinstance(device_num, bool) or not isinstance(device_num, (int, str))\
+            or (isinstance(device_num, int) and device_num < 0):
+      raise ValueError("device_num should be an integer or a path to a video "
+                       "file !")
 
     # Opening the videocapture device
     self._cap = cv2.VideoCapture(device_num)
     self._device_num = device_num
     fourcc = self._get_fourcc()
 
-    if system() == 'Linux':
+    if isinstance(device_num, str):
+      # No setting is available when reading from a file
+      self._format_to_index = {}
+
+    elif system() == 'Linux':
 
       self._format_to_index = {}
       self._index_to_format = {}
 
-      # Trying to run v4l2-ctl to get the available formats
-      command = ['v4l2-ctl', '-d', str(device_num), '--list-formats-ext']
-      try:
-        check = run(command, capture_output=True, text=True)
-      except FileNotFoundError:
+      # Running v4l2-ctl once to get all the information about the device
+      self._v4l2 = V4L2_query(device_num)
+      formats = self._v4l2.formats()
+      if not self._v4l2.available:
         print("\n#######\n"
               "Warning ! The performance of the Camera_opencv "
               "class could be improved if v4l-utils was installed !"
               "\n#######\n")
-        check = None
-      check = check.stdout if check is not None else ''
-
-      # Splitting the returned string to isolate each encoding
-      if findall(r'\[\d+]', check):
-        check = split(r'\[\d+]', check)[1:]
-      elif findall(r'Pixel\sFormat', check):
-        check = split(r'Pixel\sFormat', check)[1:]
-      else:
-        check = []
-
-      if check:
-        for img_format in check:
-          # For each encoding, finding its name
-          name = findall(r"'\w+'", img_format)[0].replace("'", '')
-          sizes = findall(r'\d+x\d+', img_format)
 
-          # For each name, finding the available sizes
-          for size in sizes:
-            self._format_to_index.update(
-              {name + ' ' + size: len(self._format_to_index)})
-            self._index_to_format.update(
-              {len(self._index_to_format): name + ' ' + size})
+      if formats:
+        for img_format in formats:
+          self._format_to_index.update(
+            {img_format: len(self._format_to_index)})
+          self._index_to_format.update(
+            {len(self._index_to_format): img_format})
 
       else:
         # If v4l-utils is not installed, proposing two encodings without
@@ -133,10 +149,30 @@ class Camera_opencv(Camera):
                          f"{type(self).__name__}.")
     self.set_all(**kwargs)
 
+    # Starting the acquisition thread and the decoding workers if required
+    self._threads = threads
+    if self._threads > 0:
+      self._frames = Queue(maxsize=queue_size)
+      self._pool = ThreadPoolExecutor(max_workers=self._threads)
+      self._set_raw_mode()
+      self._stop_acq.clear()
+      self._acquisition = Thread(target=self._grab_frames, daemon=True)
+      self._acquisition.start()
+
   def get_image(self) -> Tuple[float, ndarray]:
     """Grabs a frame from the videocapture object and returns it along with a
     timestamp."""
 
+    # Getting the next frame decoded by the workers, in order
+    if self._threads > 0:
+      try:
+        t, frame = self._frames.get(timeout=2)
+      except Empty:
+        raise TimeoutError("Waited too long for the next image !")
+      if isinstance(frame, Exception):
+        raise frame
+      return t, frame.result()
+
     # Grabbing the frame and the timestamp
     t = time()
     ret, frame = self._cap.read()
@@ -152,11 +188,81 @@ class Camera_opencv(Camera):
       return t, frame
 
   def close(self) -> NoReturn:
-    """Releases the videocapture object."""
+    """Stops the acquisition thread if any, and releases the videocapture
+    object."""
+
+    if self._acquisition is not None:
+      self._stop_acq.set()
+      # Making room in the queue in case the thread is blocked on it
+      while not self._frames.empty():
+        self._frames.get_nowait()
+      self._acquisition.join()
+      self._acquisition = None
+      self._pool.shutdown()
 
     if self._cap is not None:
       self._cap.release()
 
+  def _grab_frames(self) -> NoReturn:
+    """Grabs the frames in a loop and hands them to the workers for decoding.
+
+    Only the grabbing and the retrieving of the raw frame are done in this
+    thread, the futures of the decoded frames are put in the queue in the
+    order of acquisition.
+    """
+
+    while not self._stop_acq.is_set():
+      with self._cap_lock:
+        t = time()
+        ret = self._cap.grab()
+        if ret:
+          ret, frame = self._cap.retrieve()
+
+      if not ret:
+        frame = IOError("Error reading the camera")
+      else:
+        frame = self._pool.submit(self._decode, frame)
+
+      # Waiting for room in the queue, unless the camera is closing
+      while not self._stop_acq.is_set():
+        try:
+          self._frames.put((t, frame), timeout=0.1)
+          break
+        except Full:
+          continue
+
+      if not ret:
+        return
+
+  def _decode(self, frame: ndarray) -> ndarray:
+    """Decodes a raw MJPEG frame, or converts a decoded frame, to the required
+    number of channels."""
+
+    # Raw MJPEG frames are returned as a single row of bytes
+    if frame.dtype == uint8 and (frame.ndim == 1 or frame.shape[0] == 1):
+      img = cv2.imdecode(frame, cv2.IMREAD_GRAYSCALE if self.channels == 1
+                         else cv2.IMREAD_COLOR)
+      if img is None:
+        raise IOError("Could not decode the frame")
+      return img
+
+    if self.channels == 1 and frame.ndim == 3:
+      return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame
+
+  def _set_raw_mode(self) -> NoReturn:
+    """When reading MJPEG frames in a separate thread, tries to get them
+    undecoded so that they can be decoded in parallel by the workers."""
+
+    if self._threads <= 0:
+      return
+    with self._cap_lock:
+      raw = self._get_fourcc() == 'MJPG' and \
+          self._cap.getBackendName() in ('V4L2', 'FFMPEG')
+      if raw != self._raw:
+        self._cap.set(cv2.CAP_PROP_FORMAT, -1 if raw else cv2.CV_8UC3)
+        self._raw = raw
+
   def _get_fourcc(self) -> str:
     """Returns the current fourcc string of the video encoding."""
 
@@ -177,12 +283,14 @@ class Camera_opencv(Camera):
   def _set_width(self, width: int) -> NoReturn:
     """Tries to set the image width."""
 
-    self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    with self._cap_lock:
+      self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
 
   def _set_height(self, height: int) -> NoReturn:
     """Tries to set the image height."""
 
-    self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    with self._cap_lock:
+      self._cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
 
   def _set_format(self, img_format) -> NoReturn:
     """Sets the format of the image according to the user's choice."""
@@ -195,7 +303,12 @@ class Camera_opencv(Camera):
     img_size = raw_format[1] if len(raw_format) > 1 else None
 
     # Setting the format
-    self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*img_format))
+    with self._cap_lock:
+      self._cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*img_format))
+      self._set_raw_mode()
+    # The information about the device has to be queried again
+    if hasattr(self, '_v4l2'):
+      self._v4l2.invalidate()
 
     if img_size is not None:
       # Getting the width and height from the second half of the string
@@ -207,25 +320,11 @@ class Camera_opencv(Camera):
       self._set_height(height)
 
   def _get_format_size(self) -> int:
-    """Parses the v4l2-ctl -V command to get the current image format as an
-    index."""
-
-    # Sending the v4l2-ctl command
-    command = ['v4l2-ctl', '-d', str(self._device_num), '-V']
-    check = run(command, capture_output=True, text=True).stdout
-
-    # Parsing the answer
-    format_ = width = height = ''
-    if findall(r"'\w+'", check):
-      format_ = findall(r"'\w+'", check)[0].replace("'", "")
-    if findall(r"\d+/\d+", check):
-      width = findall(r"\d+/\d+", check)[0].split('/')[0]
-      height = findall(r"\d+/\d+", check)[0].split('/')[1]
-
-    # Returning the corresponding index
+    """Reads the current image format from the cached v4l2-ctl output, and
+    returns it as an index."""
+
     try:
-      index = self._format_to_index[format_ + ' ' + width + 'x' + height]
-      return index
+      return self._format_to_index[self._v4l2.current_format()]
     except KeyError:
       raise KeyError("Couldn't retrieve the current image format.")
 
@@ -1,7 +1,9 @@
 # coding: utf-8
 
 from typing import Tuple
+from array import array
 from .camera import Camera
+from ..tool.pixel_correction import Pixel_correction
 from .._global import OptionalModule
 import numpy as np
 import time
@@ -69,6 +71,16 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
     Camera.__init__(self)
     self.name = "seek_thermal_pro"
     self._calib = None
+    self._correction = Pixel_correction(
+      (Seek_thermal_pro_dimensions['Height'],
+       Seek_thermal_pro_dimensions['Width']))
+
+    # The buffers for reading the raw frames are allocated once
+    self._to_read = 2 * Seek_thermal_pro_dimensions['Raw width'] * \
+        Seek_thermal_pro_dimensions['Raw height']
+    self._raw = np.empty(self._to_read, dtype=np.uint8)
+    self._chunk = array('B', bytes(
+      int(self._to_read / (Seek_thermal_pro_dimensions['Raw height'] / 20))))
 
     devices = usb.core.find(find_all=True,
                             idVendor=Seek_thermal_pro_vendor,
@@ -123,11 +135,12 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
       elif i == 4:
         print("Could not get the dead pixels frame")
         self._dead_pixels = []
+    self._correction.set_dead_pixels(self._dead_pixels)
 
     for i in range(10):
       status, img = self._grab()
       if status == 1:
-        self._calib = self._crop(img) - 1600
+        self._set_calib(img)
         break
       elif i == 9:
         raise TimeoutError("Could not set the camera")
@@ -144,9 +157,9 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
       t = time.time()
       status, img = self._grab()
       if status == 1:
-        self._calib = self._crop(img) - 1600
+        self._set_calib(img)
       elif status == 3 and self._calib is not None:
-        return t, self._correct_dead_pixels(self._crop(img) - self._calib)
+        return t, self._correction.correct(self._crop(img))
       elif count == 5:
         raise TimeoutError("Unable to read image")
       count += 1
@@ -162,28 +175,30 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
   def _grab(self) -> [bytes, np.ndarray]:
     """Captures a raw image from the camera.
 
+    The USB chunks are read into a single preallocated buffer.
+
     Returns:
       The status information and the raw image
     """
 
     self._write_data(Seek_thermal_pro_commands['Start get image transfer'],
                      b'\x58\x5b\x01\x00')
-    to_read = 2 * \
-        Seek_thermal_pro_dimensions['Raw width'] * \
-        Seek_thermal_pro_dimensions['Raw height']
-    ret = bytearray()
-
-    while to_read - len(ret) > 512:
-      ret += self._dev.read(endpoint=Seek_therm_usb_req['Read_img'],
-                            size_or_buffer=int(
-                              to_read /
-                              (Seek_thermal_pro_dimensions['Raw height']
-                               / 20)),
-                            timeout=1000)
-
-    status = ret[4]
-    if len(ret) == to_read:
-      return status, np.frombuffer(ret, dtype=np.uint16).reshape(
+    read = 0
+
+    while self._to_read - read > 512:
+      n = self._dev.read(endpoint=Seek_therm_usb_req['Read_img'],
+                         size_or_buffer=self._chunk,
+                         timeout=1000)
+      # Too much data received, the frame is invalid
+      if read + n > self._to_read:
+        return self._raw[4], None
+      self._raw[read:read + n] = np.frombuffer(self._chunk, dtype=np.uint8,
+                                               count=n)
+      read += n
+
+    status = self._raw[4]
+    if read == self._to_read:
+      return status, self._raw.view(np.uint16).reshape(
         Seek_thermal_pro_dimensions['Raw height'],
         Seek_thermal_pro_dimensions['Raw width'])
     else:
@@ -199,10 +214,7 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
       The list of dead pixels
     """
 
-    img = self._crop(np.frombuffer(data, dtype=np.uint16).reshape(
-      Seek_thermal_pro_dimensions['Raw height'],
-      Seek_thermal_pro_dimensions['Raw width']))
-    return list(zip(*np.where(img < 100)))
+    return list(zip(*np.where(self._crop(data) < 100)))
 
   @staticmethod
   def _crop(raw_img: np.ndarray) -> np.ndarray:
@@ -211,21 +223,13 @@ MODE=\\"0777\\\"" | sudo tee seek_thermal.rules > /dev/null 2>&1
     return raw_img[4: 4 + Seek_thermal_pro_dimensions['Height'],
                    1: 1 + Seek_thermal_pro_dimensions['Width']]
 
-  def _correct_dead_pixels(self, img: np.ndarray) -> np.ndarray:
-    """Corrects the dead pixels values.
-
-    The new value is the average value of the surrounding pixels.
-
-    Args:
-      img: The image to correct
-
-    Returns:
-      The corrected image
-    """
+  def _set_calib(self, img: np.ndarray) -> None:
+    """Sets the offset subtracted from the following images, based on a
+    calibration frame."""
 
-    for i, j in self._dead_pixels:
-      img[i, j] = np.median(img[max(0, i - 1): i + 2, max(0, j - 1): j + 2])
-    return img
+    # Signed, as the calibration readings may be lower than 1600
+    self._calib = self._crop(img).astype(np.int32) - 1600
+    self._correction.set_offset(self._calib)
 
   def _write_data(self, request: int, data: bytes) -> int:
     """Wrapper for writing over USB."""
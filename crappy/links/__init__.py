@@ -1,3 +1,3 @@
 # coding: utf-8
 
-from .link import Link, link
+from .link import Link, Batch, link
@@ -1,15 +1,73 @@
 # coding: utf-8
 
 
-from multiprocessing import Pipe
+from multiprocessing import Pipe, Process, Event, RawValue
+from multiprocessing.connection import Connection
 from time import time
-from threading import Thread
+from threading import Thread, Condition
+from queue import Queue, Full
 from copy import copy
+from collections import deque
 from typing import Callable, Union, Any, Dict, NoReturn, Optional, Literal, \
   List
 
 from .._global import CrappyStop
 from ..modifier import Modifier
+from ..modifier.modifier import Batch, split_batch, evaluate_rows
+
+
+def apply_modifiers(modifiers: List[Union[Callable, Modifier]],
+                    value: Union[Dict[str, Any], Batch]) -> Optional[
+                      Union[Dict[str, Any], Batch]]:
+  """Calls the modifiers on a value in the given order, and returns the
+  modified value or :obj:`None` if there's nothing left to send."""
+
+  for mod in modifiers:
+    # Applying the modifiers on all the values of a batch at once
+    if isinstance(value, Batch):
+      if hasattr(mod, 'evaluate_batch'):
+        value = mod.evaluate_batch(dict(value))
+      else:
+        value = evaluate_rows(mod, dict(value))
+      if value is not None and not isinstance(value, Batch):
+        value = Batch(value)
+    # Case when the modifier is a class
+    elif hasattr(mod, 'evaluate'):
+      value = mod.evaluate(copy(value))
+    # Case when the modifier is a method
+    else:
+      value = mod(copy(value))
+    # Exiting the for loop if nothing left in the dict to send
+    if value is None:
+      return
+
+  # Not sending empty batches
+  if isinstance(value, Batch) and not value.rows:
+    return
+  return value
+
+
+def _modifier_worker(name: str,
+                     modifiers: List[Union[Callable, Modifier]],
+                     pipe_in: Connection,
+                     pipe_out: Connection) -> None:
+  """Runs in a separate process, applies the modifiers on the values received
+  from the sender and forwards them to the receiver."""
+
+  while True:
+    try:
+      value = pipe_in.recv()
+    except (EOFError, OSError, KeyboardInterrupt):
+      return
+    try:
+      if not isinstance(value, str):
+        value = apply_modifiers(modifiers, value)
+      if value is not None:
+        pipe_out.send(value)
+    except Exception as exc:
+      print(f"Exception in link {name} : {str(exc)}")
+      pipe_out.send('close')
+      raise
 
 
 class Link:
@@ -23,6 +81,11 @@ class Link:
     You can add one or multiple :ref:`Modifiers` to modify the transferred
     value. The modifiers should either be children of :ref:`Modifier` or
     callables taking a :obj:`dict` as argument and returning a :obj:`dict`.
+
+    By default the modifiers are run by the sending block, which can be an
+    issue if they are expensive and the sending block has to run fast, e.g. an
+    acquisition block. The ``modifiers_in`` argument allows running them
+    elsewhere.
   """
 
   count = 0
@@ -34,7 +97,12 @@ class Link:
                modifiers: List[Union[Callable, Modifier]] = None,
                timeout: float = 1,
                action: Literal['warn', 'kill', 'NoWarn'] = "warn",
-               name: Optional[str] = None) -> None:
+               name: Optional[str] = None,
+               modifiers_in: Literal['sender', 'receiver', 'thread',
+                                     'process'] = 'sender',
+               labels: Optional[List[str]] = None,
+               max_rate: Optional[float] = None,
+               conflate: bool = False) -> None:
     """Sets the instance attributes.
 
     Args:
@@ -55,8 +123,39 @@ class Link:
       name: Name of the link, to differentiate it from the others when
         debugging. If no specific name is given, the links are anyway numbered
         in the order in which they are instantiated in the code.
+      modifiers_in: Where the modifiers are run. Should be in:
+        ::
+
+          'sender', 'receiver', 'thread', 'process',
+
+        With `'sender'`, they are run by the sending block before sending the
+        data. With `'receiver'`, by the receiving block in the ``recv``
+        methods. With `'thread'`, by a thread of the sending process, so that
+        :meth:`send` returns immediately. With `'process'`, by a dedicated
+        process started with the link, the modifiers then have to be
+        picklable.
+      labels: If given, only these labels are sent through the link, the
+        other ones being dropped before the data is pickled. If the modifiers
+        are run by the sender, the labels are selected after them, otherwise
+        before. Unless the link has modifiers, the labels are checked against
+        the ones of the sending block when it is prepared.
+      max_rate: If given, the maximum number of messages per second sent
+        through the link. The messages sent too early after the previous one
+        are dropped by the sender, before being modified or pickled. Note that
+        a batch sent with :meth:`~crappy.blocks.Block.send_batch` is a single
+        message, so all its rows are either sent or dropped together. The rows
+        are counted in :attr:`dropped`.
+      conflate: If :obj:`True`, at most one message is waiting in the link.
+        The messages sent while the receiving block hasn't read the previous
+        one are kept aside, and only the newest of them is sent once the
+        previous one is read. Meant for displaying blocks, that only need the
+        latest data. Not possible if ``modifiers_in`` is `'process'`.
     """
 
+    if modifiers_in not in ('sender', 'receiver', 'thread', 'process'):
+      raise ValueError("modifiers_in should be in 'sender', 'receiver', "
+                       "'thread', 'process'")
+
     # For compatibility (condition is deprecated, use modifier)
     if conditions is not None:
       if modifiers is not None:
@@ -69,8 +168,40 @@ class Link:
     self.name = name if name is not None else f'link{count}'
     self._in, self._out = Pipe()
     self._modifiers = modifiers
+    self._modifiers_in = modifiers_in if modifiers else 'sender'
+    if conflate and self._modifiers_in == 'process':
+      raise ValueError("conflate cannot be used if the modifiers are run in a "
+                       "separate process")
+    self.labels = list(labels) if labels is not None else None
     self._action = action
     self._timeout = timeout
+    # The values of a received batch not returned yet by recv
+    self._pending = deque()
+    # The queue and thread running the modifiers, created on the first send
+    self._queue = None
+    self._worker = None
+    # The exception raised in the modifiers or conflating thread, re-raised by
+    # the next send
+    self._error = None
+
+    # The number of values dropped by the sender, readable from any process
+    self._dropped = RawValue('L', 0)
+    self._min_interval = 1 / max_rate if max_rate else 0
+    self._last_send = -float('inf')
+    # Set by the receiver every time it reads a value from the pipe
+    self._read_event = Event() if conflate else None
+    if conflate:
+      self._read_event.set()
+    # The newest value waiting to be sent, and the thread sending it
+    self._conflated = None
+    self._conflate_cond = None
+
+    # The sender writes to the worker process, that writes to the receiver
+    if self._modifiers_in == 'process':
+      worker_in, self._out_worker = Pipe(duplex=False)
+      Process(target=_modifier_worker,
+              args=(self.name, self._modifiers, worker_in, self._out),
+              daemon=True, name=f'{self.name}_modifiers').start()
 
     # Associating the link with the input and output blocks if they are given
     if input_block is not None and output_block is not None:
@@ -84,6 +215,38 @@ class Link:
     cls.count += 1
     return cls.count
 
+  @property
+  def sends_raw(self) -> bool:
+    """:obj:`True` if the values are written as is to the pipe by the sender,
+    i.e. if the sender doesn't run any modifier."""
+
+    return self._read_event is None and (
+        self._modifiers is None or
+        self._modifiers_in in ('receiver', 'process'))
+
+  @property
+  def dropped(self) -> int:
+    """The number of values dropped by the sender because of ``max_rate`` or
+    ``conflate``."""
+
+    return self._dropped.value
+
+  def skip(self, value: Union[Dict[str, Any], str]) -> bool:
+    """Returns :obj:`True` if the value should be dropped because of
+    ``max_rate``, and counts it as dropped.
+
+    Called by :meth:`send`, must be called before :meth:`send_bytes`.
+    """
+
+    if not self._min_interval or isinstance(value, str):
+      return False
+    t = time()
+    if t - self._last_send < self._min_interval:
+      self._dropped.value += self._rows(value)
+      return True
+    self._last_send = t
+    return False
+
   def send(self, value: Union[Dict[str, Any], str]) -> NoReturn:
     """Sends a value through the link.
 
@@ -91,9 +254,36 @@ class Link:
     any other exception caught.
     """
 
+    if self.skip(value):
+      return
+    if self._read_event is not None and not isinstance(value, str):
+      self._conflate(value)
+    elif self._modifiers_in == 'thread':
+      self._send_job(self._send_thread, value)
+    else:
+      self._send_job(self._send_timeout, value)
+
+  def send_bytes(self, buf: bytes) -> NoReturn:
+    """Sends a value already pickled with
+    :meth:`multiprocessing.reduction.ForkingPickler.dumps`.
+
+    It allows serializing only once a value sent through several links. Only
+    valid for links sending their values as is, see :attr:`sends_raw`. Unlike
+    :meth:`send`, doesn't check ``max_rate``, see :meth:`skip`.
+    """
+
+    self._send_job(self._send_bytes_timeout, buf)
+
+  def _send_job(self, target: Callable, value: Any) -> None:
+    """Sends a value with the given method, and handles the timeout."""
+
     # Trying to send a value through a link
     try:
-      send_job = Thread(target=self._send_timeout, args=(value,), daemon=True)
+      if target == self._send_thread:
+        target(value)
+        return
+
+      send_job = Thread(target=target, args=(value,), daemon=True)
       send_job.start()
 
       # Waits for the thread to return
@@ -127,23 +317,23 @@ class Link:
     """Method for sending data with a given timeout on the link."""
 
     try:
-      # Sending if the value is None or a string
-      if self._modifiers is None or isinstance(value, str):
-        self._out.send(value)
+      # Sending the raw value to the worker process
+      if self._modifiers_in == 'process':
+        value = self.project(value)
+        if value is not None:
+          self._out_worker.send(value)
+
+      # Sending if the value is None or a string, or if the modifiers are not
+      # run by the sender
+      elif self._modifiers is None or isinstance(value, str) or \
+          self._modifiers_in == 'receiver':
+        value = self.project(value)
+        if value is not None:
+          self._out.send(value)
 
       # Else, first applying the modifiers
       else:
-        for mod in self._modifiers:
-          # Case when the modifier is a class
-          if hasattr(mod, 'evaluate'):
-            value = mod.evaluate(copy(value))
-          # Case when the modifier is a method
-          else:
-            value = mod(copy(value))
-          # Exiting the for loop if nothing left in the dict to send
-          if value is None:
-            break
-
+        value = self.project(apply_modifiers(self._modifiers, value))
         # Finally, sending the dict to the link
         if value is not None:
           self._out.send(value)
@@ -156,6 +346,170 @@ class Link:
         self._out.close()
       raise
 
+  def project(self, value: Optional[Union[Dict[str, Any], Batch, str]]) -> \
+      Optional[Union[Dict[str, Any], Batch, str]]:
+    """Returns the value with only the labels of the link, or :obj:`None` if
+    none of them is in the value."""
+
+    if self.labels is None or value is None or isinstance(value, str):
+      return value
+    ret = {label: value[label] for label in self.labels if label in value}
+    if not ret:
+      return
+    return Batch(ret) if isinstance(value, Batch) else ret
+
+  def check_labels(self, labels: List[str]) -> None:
+    """Checks that the labels of the link are sent by the sending block,
+    whose labels are given.
+
+    Only possible if the link has no modifier, as they may add labels.
+
+    Raises:
+      :exc:`ValueError` if a label of the link is not sent by the block.
+    """
+
+    if self.labels is None or self._modifiers:
+      return
+    missing = [label for label in self.labels if label not in labels]
+    if missing:
+      raise ValueError(f"The labels {missing} of {self.name} are not sent by "
+                       f"the block, its labels are {list(labels)}")
+
+  def _send_bytes_timeout(self, buf: bytes) -> None:
+    """Method for sending pickled data with a given timeout on the link."""
+
+    try:
+      if self._modifiers_in == 'process':
+        self._out_worker.send_bytes(buf)
+      else:
+        self._out.send_bytes(buf)
+    except Exception as exc:
+      print(f"Exception in link {self.name} : {str(exc)}")
+      raise
+
+  @staticmethod
+  def _rows(value: Union[Dict[str, Any], Batch]) -> int:
+    """Returns the number of values in a message, for counting the dropped
+    ones."""
+
+    return value.rows if isinstance(value, Batch) else 1
+
+  def _modify(self, value: Union[Dict[str, Any], Batch]) -> Optional[
+      Union[Dict[str, Any], Batch]]:
+    """Applies the modifiers run by the sender and selects the labels of the
+    link, returns :obj:`None` if there's nothing left to send."""
+
+    if self._modifiers is not None and self._modifiers_in != 'receiver':
+      value = apply_modifiers(self._modifiers, value)
+    return self.project(value)
+
+  def _conflate(self, value: Union[Dict[str, Any], Batch]) -> None:
+    """Replaces the value waiting to be sent, and starts the thread sending it
+    on the first call.
+
+    Raises the exception that stopped the thread, if any.
+    """
+
+    if self._error is not None:
+      raise self._error
+    if self._conflate_cond is None:
+      self._conflate_cond = Condition()
+      Thread(target=self._run_conflate, daemon=True).start()
+    with self._conflate_cond:
+      if self._conflated is not None:
+        self._dropped.value += self._rows(self._conflated)
+      self._conflated = value
+      self._conflate_cond.notify()
+
+  def _run_conflate(self) -> None:
+    """Sends the newest value every time the receiver has read the previous
+    one, in a separate thread.
+
+    The modifiers are applied before waiting for the receiver, so that the
+    receiver is only waited for if there is something to send.
+    """
+
+    try:
+      while True:
+        with self._conflate_cond:
+          self._conflate_cond.wait_for(lambda: self._conflated is not None)
+          value, self._conflated = self._conflated, None
+        value = self._modify(value)
+        if value is None:
+          continue
+        self._read_event.wait()
+        with self._conflate_cond:
+          # A newer value was sent while waiting, sending it instead
+          if self._conflated is not None:
+            self._dropped.value += self._rows(value)
+            continue
+        # The receiver sets the event again once it has read the value
+        self._read_event.clear()
+        self._out.send(value)
+    except Exception as exc:
+      print(f"Exception in link {self.name} : {str(exc)}")
+      self._error = exc
+
+  def _send_thread(self, value: Union[Dict[str, Any], str]) -> None:
+    """Queues a value for the thread running the modifiers, and starts the
+    thread on the first call.
+
+    Raises the exception that stopped the thread, if any.
+    """
+
+    if self._error is not None:
+      raise self._error
+    if self._worker is None:
+      self._queue = Queue(maxsize=1000)
+      self._worker = Thread(target=self._run_thread, daemon=True)
+      self._worker.start()
+    try:
+      self._queue.put(value, timeout=self._timeout)
+    except Full:
+      raise TimeoutError
+
+  def _run_thread(self) -> None:
+    """Applies the modifiers on the queued values and sends them, in a
+    separate thread."""
+
+    while True:
+      value = self._queue.get()
+      try:
+        # After an error, the values are only discarded so that the sender
+        # doesn't block
+        if self._error is None:
+          if isinstance(value, str):
+            self._out.send(value)
+          else:
+            self._send_timeout(value)
+      except Exception as exc:
+        self._error = exc
+      finally:
+        self._queue.task_done()
+
+  def flush(self) -> None:
+    """Waits for the thread running the modifiers to send all the queued
+    values.
+
+    Gives up with a warning if no value could be sent during ``timeout``, e.g.
+    if the receiving block has stopped. Raises the exception that stopped the
+    thread running the modifiers or the one conflating the values, if any.
+    """
+
+    if self._queue is not None:
+      with self._queue.all_tasks_done:
+        left = self._queue.unfinished_tasks
+        while left:
+          self._queue.all_tasks_done.wait(self._timeout)
+          if self._queue.unfinished_tasks == left:
+            print(f"WARNING : {left} values could not be sent on link "
+                  f"{self.name}")
+            break
+          left = self._queue.unfinished_tasks
+
+    if self._error is not None:
+      raise self._error
+
   def recv(self, blocking: bool = True) -> Optional[Dict[str, Any]]:
     """Receives data from a link and returns it as a dict.
 
@@ -175,15 +529,17 @@ class Link:
     """
 
     try:
-      if blocking or self.poll():
-        # Simply collecting the data to receive
-        ret = self._in.recv()
-
-        # Raising a CrappyStop in case a string is received
-        if isinstance(ret, str):
-          raise CrappyStop
-
-        return ret
+      while blocking or self.poll():
+        # Returning the values of the last received batch first
+        if self._pending:
+          return self._pending.popleft()
+        ret = self._read()
+        # The value may have been dropped by the modifiers
+        if ret is None:
+          continue
+        if not isinstance(ret, Batch):
+          return ret
+        self._pending.extend(split_batch(ret))
 
     # If a timeout exception is raised, handling it according to the action
     except TimeoutError as exc:
@@ -209,16 +565,42 @@ class Link:
       print(f"Exception in link recv {self.name} : {str(exc)}")
       raise
 
+  def _read(self) -> Optional[Union[Dict[str, Any], Batch]]:
+    """Reads a message from the pipe, and raises :exc:`CrappyStop` if it is a
+    stop message.
+
+    If the modifiers are run by the receiver, applies them and returns
+    :obj:`None` if the value was dropped.
+    """
+
+    ret = self._in.recv()
+    if self._read_event is not None:
+      self._read_event.set()
+    # Raising a CrappyStop in case a string is received
+    if isinstance(ret, str):
+      raise CrappyStop
+    if self._modifiers_in == 'receiver':
+      return apply_modifiers(self._modifiers, ret)
+    return ret
+
   def poll(self) -> bool:
-    """Simple wrapper telling whether there's data in the link or not."""
+    """Simple wrapper telling whether there's data in the link or not.
+
+    Note:
+      If the modifiers are run by the receiver, the waiting data may still be
+      dropped by the modifiers.
+    """
 
-    return self._in.poll()
+    return bool(self._pending) or self._in.poll()
 
   def clear(self) -> NoReturn:
     """Flushes the link."""
 
-    while self.poll():
+    self._pending.clear()
+    while self._in.poll():
       self._in.recv_bytes()
+    if self._read_event is not None:
+      self._read_event.set()
 
   def recv_last(self, blocking: bool = False) -> Optional[Dict[str, Any]]:
     """Returns only the last value in the pipe, dropping all the others.
@@ -264,7 +646,21 @@ class Link:
 
     while True:
       try:
-        data = self.recv(blocking=False)
+        # The batches are added at once rather than value by value
+        if not self._pending and self._in.poll():
+          data = self._read()
+          # The value may have been dropped by the modifiers
+          if data is None:
+            continue
+          if isinstance(data, Batch):
+            for label in ret:
+              try:
+                ret[label].extend(data[label].tolist())
+              except KeyError:
+                raise IOError(f"{str(self)} Got data without label {label}")
+            continue
+        else:
+          data = self.recv(blocking=False)
 
       # Sending a stop message if a CrappyStop is raised
       except CrappyStop:
@@ -330,10 +726,17 @@ class Link:
     the final remaining data (possibly after a stop signal)."""
 
     # First, collecting all the remaining data
-    recv = []
-    while self.poll():
+    recv = list(self._pending)
+    self._pending.clear()
+    while self._in.poll():
       data = self._in.recv()
-      if isinstance(data, dict):
+      if self._read_event is not None:
+        self._read_event.set()
+      if self._modifiers_in == 'receiver' and isinstance(data, dict):
+        data = apply_modifiers(self._modifiers, data)
+      if isinstance(data, Batch):
+        recv.extend(split_batch(data))
+      elif isinstance(data, dict):
         recv.append(data)
 
     # Then, organizing it into a nice dict to return
@@ -356,7 +759,12 @@ def link(in_block,
                                   Union[Modifier, Callable]]] = None,
          timeout: float = 1,
          action: Literal['warn', 'kill', 'NoWarn'] = "warn",
-         name: Optional[str] = None) -> NoReturn:
+         name: Optional[str] = None,
+         modifiers_in: Literal['sender', 'receiver', 'thread',
+                               'process'] = 'sender',
+         labels: Optional[List[str]] = None,
+         max_rate: Optional[float] = None,
+         conflate: bool = False) -> NoReturn:
   """Function linking two blocks, allowing to send data from one to the other.
 
   The created link is unidirectional, from the input block to the output block.
@@ -381,6 +789,14 @@ def link(in_block,
     name: Name of the link, to differentiate it from the others when debugging.
       If no specific name is given, the links are anyway numbered in the order
       in which they are instantiated in the code.
+    modifiers_in: Where the modifiers are run, either `'sender'`, `'receiver'`,
+      `'thread'` or `'process'`. See :ref:`Link` for more information.
+    labels: If given, only these labels are sent through the link. See
+      :ref:`Link` for more information.
+    max_rate: If given, the maximum number of values per second sent through
+      the link, the other ones being dropped.
+    conflate: If :obj:`True`, only the newest value is sent once the receiving
+      block has read the previous one. See :ref:`Link` for more information.
   """
 
   # Forcing the conditions and modifiers into lists
@@ -396,4 +812,8 @@ def link(in_block,
        modifiers=modifier,
        timeout=timeout,
        action=action,
-       name=name)
+       name=name,
+       modifiers_in=modifiers_in,
+       labels=labels,
+       max_rate=max_rate,
+       conflate=conflate)
@@ -3,7 +3,7 @@
 import numpy as np
 from typing import Union
 
-from .modifier import Modifier
+from .modifier import Modifier, evaluate_rows
 
 
 class Demux(Modifier):
@@ -79,3 +79,22 @@ class Demux(Modifier):
     del data[self.stream]
     data[self.time] = np.mean(data[self.time])
     return data
+
+  def evaluate_batch(self, columns: dict) -> dict:
+    stream = columns[self.stream]
+    # The streams can only be processed at once if they all have the same shape
+    if stream.dtype == object or stream.ndim != 3 or 0 in stream.shape:
+      return evaluate_rows(self, columns)
+    if self.transpose:
+      stream = stream.transpose((0, 2, 1))
+    t = columns[self.time].reshape(len(stream), -1)
+    if self.mean:
+      values = stream.mean(axis=1)
+      columns[self.time] = t.mean(axis=1)
+    else:
+      values = stream[:, 0]
+      columns[self.time] = t[:, 0]
+    for i, n in enumerate(self.labels):
+      columns[n] = values[:, i]
+    del columns[self.stream]
+    return columns
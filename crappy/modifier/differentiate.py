@@ -1,5 +1,7 @@
 # coding: utf-8
 
+import numpy as np
+
 from .modifier import Modifier
 
 
@@ -34,3 +36,12 @@ class Diff(Modifier):
     self.last_t = t
     self.last_val = val
     return data
+
+  def evaluate_batch(self, columns: dict) -> dict:
+    t = columns[self.t]
+    val = columns[self.label]
+    columns[self.out_label] = (val - np.append(self.last_val, val[:-1])) / \
+        (t - np.append(self.last_t, t[:-1]))
+    self.last_t = t[-1]
+    self.last_val = val[-1]
+    return columns
@@ -1,5 +1,7 @@
 # coding: utf-8
 
+import numpy as np
+
 from .modifier import Modifier
 
 
@@ -32,3 +34,12 @@ class Integrate(Modifier):
     self.last_t = t
     data[self.out_label] = self.val
     return data
+
+  def evaluate_batch(self, columns: dict) -> dict:
+    t = columns[self.t]
+    values = self.val + np.cumsum(np.diff(t, prepend=self.last_t) *
+                                  columns[self.label])
+    self.last_t = t[-1]
+    self.val = values[-1]
+    columns[self.out_label] = values
+    return columns
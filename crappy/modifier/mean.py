@@ -1,11 +1,43 @@
 # coding: utf-8
 
 import numpy as np
-from typing import Union
+from typing import Callable, Union
 
 from .modifier import Modifier
 
 
+def reduce_batch(modifier: Modifier,
+                 columns: dict,
+                 func: Callable) -> Union[dict, None]:
+  """Vectorized equivalent of calling the ``evaluate`` method of :class:`Mean`
+  or :class:`Median` on each row, ``func`` being the reduction."""
+
+  ret = {}
+  # The first value ever received is returned as is
+  if not hasattr(modifier, "last"):
+    modifier.last = {k: [v[0]] for k, v in columns.items()}
+    ret = {k: v[:1] for k, v in columns.items()}
+    columns = {k: v[1:] for k, v in columns.items()}
+
+  # The buffers are filled up to npoints values, and emptied on the next one
+  n = modifier.npoints
+  for k, v in columns.items():
+    buffer = modifier.last[k]
+    values = np.concatenate((np.asarray(buffer, dtype=v.dtype), v))
+    starts = np.arange(0, len(values) - n + 1, n + 1)
+    starts = starts[starts + n > len(buffer)]
+    if len(starts):
+      windows = values[starts[:, np.newaxis] + np.arange(n)]
+      if v.dtype.kind in 'biufc':
+        reduced = func(windows, axis=1)
+      else:  # Non numeric data
+        reduced = windows[:, -1]
+      ret[k] = np.concatenate((ret[k], reduced)) if k in ret else reduced
+    modifier.last[k] = values[len(values) - len(values) % (n + 1):].tolist()
+  if ret:
+    return ret
+
+
 class Mean(Modifier):
   """Mean filter.
 
@@ -46,3 +78,6 @@ class Mean(Modifier):
         self.last[k] = []
     if r:
       return r
+
+  def evaluate_batch(self, columns: dict) -> Union[dict, None]:
+    return reduce_batch(self, columns, np.mean)
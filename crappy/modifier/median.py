@@ -4,6 +4,7 @@ import numpy as np
 from typing import Union
 
 from .modifier import Modifier
+from .mean import reduce_batch
 
 
 class Median(Modifier):
@@ -41,3 +42,6 @@ class Median(Modifier):
         self.last[k] = []
     if r:
       return r
+
+  def evaluate_batch(self, columns: dict) -> Union[dict, None]:
+    return reduce_batch(self, columns, np.median)
@@ -1,8 +1,84 @@
 # coding: utf-8
 
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
 from .._global import DefinitionError
 
 
+class Batch(dict):
+  """A :obj:`dict` holding several values per label, sent at once through a
+  :ref:`Link`.
+
+  Its values are :mod:`numpy` arrays of the same length, the n-th row of each
+  array being the n-th value of the label. The modifiers are applied to the
+  whole batch using their ``evaluate_batch`` method, and the receiving block
+  gets the values one by one from :meth:`Link.recv` as if they had been sent
+  separately, or all at once from :meth:`Link.recv_chunk`.
+  """
+
+  def __init__(self, columns: Dict[str, Any]) -> None:
+    super().__init__((label, np.asarray(value))
+                     for label, value in columns.items())
+    if len(set(len(value) for value in self.values())) > 1:
+      raise ValueError("All the labels of a batch must have the same number "
+                       "of values")
+
+  @property
+  def rows(self) -> int:
+    """The number of values per label."""
+
+    return len(next(iter(self.values()))) if self else 0
+
+
+def split_batch(columns: Dict[str, np.ndarray]) -> List[dict]:
+  """Turns a :obj:`dict` of columns into a :obj:`list` of :obj:`dict`, one
+  per row."""
+
+  if not columns:
+    return []
+  labels = list(columns)
+  return [dict(zip(labels, row)) for row in zip(*columns.values())]
+
+
+def merge_batch(rows: Iterable[Optional[dict]]) -> Optional[Dict[str,
+                                                                 np.ndarray]]:
+  """Turns an iterable of :obj:`dict` into a :obj:`dict` of columns, skipping
+  the :obj:`None` values.
+
+  Returns :obj:`None` if there is no row left.
+  """
+
+  rows = [row for row in rows if row is not None]
+  if not rows:
+    return None
+  try:
+    return {label: np.asarray([row[label] for row in rows])
+            for label in rows[0]}
+  except KeyError as exc:
+    raise IOError(f"Got data without label {exc}")
+
+
+def select_rows(columns: Dict[str, np.ndarray],
+                mask: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
+  """Returns the rows of the columns for which ``mask`` is :obj:`True`, or
+  :obj:`None` if there is none."""
+
+  if not np.any(mask):
+    return None
+  return {label: value[mask] for label, value in columns.items()}
+
+
+def evaluate_rows(
+    modifier: Callable,
+    columns: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+  """Calls a per-:obj:`dict` modifier on each row of the columns, and returns
+  the result as columns."""
+
+  evaluate = modifier.evaluate if hasattr(modifier, 'evaluate') else modifier
+  return merge_batch(evaluate(row) for row in split_batch(columns))
+
+
 class MetaModifier(type):
   """To keep track of all Modifiers (formerly Conditions)"""
 
@@ -29,4 +105,31 @@ class MetaModifier(type):
 
 
 class Modifier:
+  """Base class of the modifiers.
+
+  A modifier must define an :meth:`evaluate` method, taking a :obj:`dict` and
+  returning a :obj:`dict` or :obj:`None`. It may also define an
+  :meth:`evaluate_batch` method, called by the :ref:`Link` when several values
+  are sent at once using :meth:`Block.send_batch`.
+  """
+
   __metaclass__ = MetaModifier
+
+  def evaluate_batch(self,
+                     columns: Dict[str, np.ndarray]) -> Optional[Dict[
+                       str, np.ndarray]]:
+    """Modifies several values at once.
+
+    The default implementation calls :meth:`evaluate` on each row, so it only
+    needs to be overridden for speeding things up. It must give the same result
+    as calling :meth:`evaluate` on each row.
+
+    Args:
+      columns: A :obj:`dict` whose values are :mod:`numpy` arrays of the same
+        length, the n-th row of each array being the n-th value of the label.
+
+    Returns:
+      The modified columns, or :obj:`None` if there's no value left to send.
+    """
+
+    return evaluate_rows(self, columns)
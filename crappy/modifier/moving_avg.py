@@ -1,29 +1,110 @@
 # coding: utf-8
 
-"""More documentation coming soon !"""
-
 import numpy as np
+from numbers import Number
 
 from .modifier import Modifier
 
 
+class Running_mean:
+  """Mean of the last ``npoints`` values of a label, kept in a preallocated
+  ring buffer along with their running sum.
+
+  Adding a value costs the same whatever the size of the window. To avoid the
+  accumulation of rounding errors, the sum is computed again from the buffer
+  every time it wraps, i.e. once every ``npoints`` values.
+  """
+
+  def __init__(self, npoints: int) -> None:
+    self._buf = np.zeros(npoints)
+    self._size = npoints
+    self._index = 0
+    self._count = 0
+    self._sum = 0.
+
+  def add(self, value: float) -> float:
+    """Adds a value to the window and returns the new mean."""
+
+    if self._count == self._size:
+      self._sum -= self._buf[self._index]
+    else:
+      self._count += 1
+    self._buf[self._index] = value
+    self._sum += value
+    self._index += 1
+    if self._index == self._size:
+      self._index = 0
+      self._sum = float(self._buf.sum())
+    return self._sum / self._count
+
+  def add_batch(self, values: np.ndarray) -> np.ndarray:
+    """Adds several values to the window, and returns the mean after each one
+    of them."""
+
+    n, c, b = self._size, self._count, len(values)
+    # The window after the i-th value spans indexes [c + i + 1 - n, c + i + 1)
+    # of the sequence made of the current window followed by the new values
+    ends = np.arange(c + 1, c + b + 1)
+    begins = np.maximum(ends - n, 0)
+
+    # Only the oldest values of the current window may leave it
+    m = min(c, max(0, c + b - n))
+    old = self._buf[(self._index - c + np.arange(m)) % n]
+    low = np.concatenate(((0.,), np.cumsum(old)))
+    high = self._sum + np.cumsum(values, dtype=float)
+    sums = high - np.where(begins > c, high[np.maximum(begins - c - 1, 0)],
+                           low[np.minimum(begins, m)])
+    means = sums / (ends - begins)
+
+    # Writing the newest values to the buffer
+    kept = values[-n:]
+    self._buf[(self._index + b - len(kept) + np.arange(len(kept))) % n] = kept
+    wrapped = self._index + b >= n
+    self._index = (self._index + b) % n
+    self._count = min(n, c + b)
+    self._sum = float(self._buf.sum()) if wrapped else \
+        float(sums[-1]) if b else self._sum
+    return means
+
+
 class Moving_avg(Modifier):
+  """Moving average filter.
+
+  Returns the average of the last ``npoints`` values of each label, for every
+  received value. Non-numeric labels are returned unchanged.
+  """
+
   def __init__(self, npoints: int = 100) -> None:
+    """Sets the instance attributes.
+
+    Args:
+      npoints (:obj:`int`): The number of points to average.
+    """
+
     Modifier.__init__(self)
     self.npoints = npoints
+    self._windows = {}
+
+  def _window(self, label: str, numeric: bool) -> Running_mean:
+    """Returns the window of a label, creating it on the first value.
+
+    Returns :obj:`None` for non-numeric labels."""
+
+    if label not in self._windows:
+      self._windows[label] = Running_mean(self.npoints) if numeric else None
+    return self._windows[label]
 
   def evaluate(self, data: dict) -> dict:
-    if not hasattr(self, "last"):
-      self.last = dict(data)
-      for k in data:
-        self.last[k] = [self.last[k]]
     r = {}
-    for k in data:
-      self.last[k].append(data[k])
-      if len(self.last[k]) > self.npoints:
-        self.last[k] = self.last[k][-self.npoints:]
-      try:
-        r[k] = np.mean(self.last[k])
-      except TypeError:
-        r[k] = self.last[k][-1]
+    for k, v in data.items():
+      window = self._window(k, isinstance(v, Number) and
+                            not isinstance(v, complex))
+      r[k] = v if window is None else window.add(v)
+    return r
+
+  def evaluate_batch(self, columns: dict) -> dict:
+    r = {}
+    for k, v in columns.items():
+      window = self._window(k, v.ndim == 1 and v.dtype.kind in 'biuf')
+      r[k] = v if window is None else window.add_batch(v)
     return r
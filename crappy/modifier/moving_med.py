@@ -1,29 +1,136 @@
 # coding: utf-8
 
-"""More documentation coming soon !"""
-
 import numpy as np
+from heapq import heappush, heappop
+from numbers import Number
 
 from .modifier import Modifier
 
 
+class Running_median:
+  """Median of the last ``npoints`` values of a label.
+
+  The values are kept in a preallocated ring buffer, and split in two heaps:
+  the lower half in a max-heap and the upper half in a min-heap. The values
+  leaving the window are only removed from the heaps once they reach the top,
+  so adding a value costs O(log(npoints)).
+  """
+
+  def __init__(self, npoints: int) -> None:
+    self._buf = [0.] * npoints
+    self._size = npoints
+    self._index = 0
+    self._count = 0
+    # The lower half is stored with negated values to get a max-heap
+    self._low = []
+    self._high = []
+    self._low_size = 0
+    self._high_size = 0
+    # The values removed from the window but still in the heaps
+    self._delayed = {}
+
+  def _prune(self, heap: list, sign: int) -> None:
+    """Pops the values removed from the window off the top of a heap."""
+
+    while heap:
+      value = sign * heap[0]
+      count = self._delayed.get(value)
+      if not count:
+        return
+      if count == 1:
+        del self._delayed[value]
+      else:
+        self._delayed[value] = count - 1
+      heappop(heap)
+
+  def _balance(self) -> None:
+    """Makes the lower half hold as many values as the upper one, or one
+    more."""
+
+    if self._low_size > self._high_size + 1:
+      heappush(self._high, -heappop(self._low))
+      self._low_size -= 1
+      self._high_size += 1
+      self._prune(self._low, -1)
+    elif self._low_size < self._high_size:
+      heappush(self._low, -heappop(self._high))
+      self._low_size += 1
+      self._high_size -= 1
+      self._prune(self._high, 1)
+
+  def add(self, value: float) -> float:
+    """Adds a value to the window and returns the new median."""
+
+    # Removing the oldest value if the window is full
+    if self._count == self._size:
+      old = self._buf[self._index]
+      self._delayed[old] = self._delayed.get(old, 0) + 1
+      if old <= -self._low[0]:
+        self._low_size -= 1
+        if old == -self._low[0]:
+          self._prune(self._low, -1)
+      else:
+        self._high_size -= 1
+        if old == self._high[0]:
+          self._prune(self._high, 1)
+      self._balance()
+    else:
+      self._count += 1
+    self._buf[self._index] = value
+    self._index = (self._index + 1) % self._size
+
+    if not self._low or value <= -self._low[0]:
+      heappush(self._low, -value)
+      self._low_size += 1
+    else:
+      heappush(self._high, value)
+      self._high_size += 1
+    self._balance()
+
+    if self._low_size > self._high_size:
+      return -self._low[0]
+    return (self._high[0] - self._low[0]) / 2
+
+
 class Moving_med(Modifier):
+  """Moving median filter.
+
+  Returns the median of the last ``npoints`` values of each label, for every
+  received value. Non-numeric labels are returned unchanged.
+  """
+
   def __init__(self, npoints: int = 100) -> None:
+    """Sets the instance attributes.
+
+    Args:
+      npoints (:obj:`int`): The number of points to take the median of.
+    """
+
     Modifier.__init__(self)
     self.npoints = npoints
+    self._windows = {}
+
+  def _window(self, label: str, numeric: bool) -> Running_median:
+    """Returns the window of a label, creating it on the first value.
+
+    Returns :obj:`None` for non-numeric labels."""
+
+    if label not in self._windows:
+      self._windows[label] = Running_median(self.npoints) if numeric else None
+    return self._windows[label]
 
   def evaluate(self, data: dict) -> dict:
-    if not hasattr(self, "last"):
-      self.last = dict(data)
-      for k in data:
-        self.last[k] = [self.last[k]]
     r = {}
-    for k in data:
-      self.last[k].append(data[k])
-      if len(self.last[k]) > self.npoints:
-        self.last[k] = self.last[k][-self.npoints:]
-      try:
-        r[k] = np.median(self.last[k])
-      except TypeError:
-        r[k] = self.last[k][-1]
+    for k, v in data.items():
+      window = self._window(k, isinstance(v, Number) and
+                            not isinstance(v, complex))
+      r[k] = v if window is None else window.add(v)
+    return r
+
+  def evaluate_batch(self, columns: dict) -> dict:
+    r = {}
+    for k, v in columns.items():
+      window = self._window(k, v.ndim == 1 and v.dtype.kind in 'biuf')
+      r[k] = v if window is None else \
+          np.fromiter(map(window.add, v.tolist()), dtype=float, count=len(v))
     return r
@@ -0,0 +1,162 @@
+# coding: utf-8
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Optional, Sequence, Union
+
+from .modifier import Modifier, Batch
+from .._global import OptionalModule
+
+try:
+  from scipy.signal import lfilter, lfilter_zi
+except (ModuleNotFoundError, ImportError):
+  lfilter = lfilter_zi = OptionalModule("scipy")
+
+
+class Stream_filter(Modifier):
+  """Filters and decimates the stream arrays sent by a streaming
+  :ref:`IOBlock`.
+
+  Unlike :ref:`Demux`, that only keeps one row or the mean of each chunk, all
+  the points of the stream go through a FIR or IIR filter, whose state is
+  carried over from one chunk to the next just like
+  :func:`scipy.signal.lfilter` would. The filtered stream can then be
+  decimated, only the kept points being computed for FIR filters (polyphase
+  decimation).
+
+  The output is either the filtered stream, or if ``labels`` are given a batch
+  of scalars that downstream blocks receive one by one, e.g. for plotting a
+  200 Hz view of a 100 kHz stream.
+
+  Note:
+    The timestamps are the ones of the kept points, the group delay of the
+    filter is not compensated.
+  """
+
+  def __init__(self,
+               b: Optional[Sequence[float]] = None,
+               a: Optional[Sequence[float]] = None,
+               decimation: int = 1,
+               labels: Optional[Sequence[str]] = None,
+               stream: str = "stream",
+               time_label: str = "t(s)",
+               transpose: bool = False) -> None:
+    """Sets the instance attributes.
+
+    Args:
+      b: The numerator coefficients of the filter. If not given and
+        ``decimation`` is greater than `1`, a low-pass FIR filter with a
+        cutoff frequency at 80% of the Nyquist frequency of the decimated
+        stream is used.
+      a: The denominator coefficients of the filter, for IIR filters. Requires
+        :mod:`scipy`.
+      decimation: Only one point every ``decimation`` is kept after filtering.
+      labels: If given, the names of the labels to use for each column of the
+        stream, and a batch of scalars is returned. Otherwise, the filtered
+        stream is returned under the same label.
+      stream: The name of the label containing the stream.
+      time_label: The name of the label of the time table.
+      transpose: Set to :obj:`True` if each channel of the stream is a row
+        rather than a column.
+    """
+
+    Modifier.__init__(self)
+    self.decimation = int(decimation)
+    if self.decimation < 1:
+      raise ValueError("The decimation should be at least 1")
+    if b is None:
+      b = self._lowpass(self.decimation) if self.decimation > 1 else [1.]
+    a = [1.] if a is None else a
+    self.b = np.asarray(b, dtype=float) / a[0]
+    self.a = np.asarray(a, dtype=float) / a[0]
+    self.labels = labels
+    self.stream = stream
+    self.time = time_label
+    self.transpose = transpose
+
+    self._iir = len(self.a) > 1
+    # For FIR filters, the reversed coefficients applied to each window
+    self._kernel = self.b[::-1].copy()
+    # The last inputs of the previous chunk for FIR, the filter state for IIR
+    self._state = None
+    # The index of the next point to keep, relatively to the next chunk
+    self._phase = 0
+
+  @staticmethod
+  def _lowpass(decimation: int) -> np.ndarray:
+    """Returns a Hamming-windowed sinc low-pass filter suitable for the given
+    decimation factor."""
+
+    taps = 8 * decimation + 1
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(.8 * n / decimation) * np.hamming(taps)
+    return h / h.sum()
+
+  def _filter(self, x: np.ndarray) -> np.ndarray:
+    """Filters and decimates a chunk of shape (points, channels), and updates
+    the state of the filter."""
+
+    q = self.decimation
+    n = len(x)
+    if self._iir:
+      if self._state is None:
+        # Starting in steady state to avoid a transient on the first values
+        self._state = lfilter_zi(self.b, self.a)[:, np.newaxis] * x[0]
+      y, self._state = lfilter(self.b, self.a, x, axis=0, zi=self._state)
+      y = y[self._phase::q]
+    else:
+      taps = len(self._kernel)
+      if self._state is None:
+        self._state = np.repeat(x[:1], taps - 1, axis=0)
+      ext = np.concatenate((self._state, x))
+      # Only computing the points that are kept
+      windows = sliding_window_view(ext, taps, axis=0)[self._phase::q]
+      y = windows @ self._kernel
+      self._state = ext[len(ext) - taps + 1:]
+    self._phase = (self._phase - n) % q
+    return y
+
+  def evaluate(self, data: dict) -> Optional[Union[dict, Batch]]:
+    stream = np.asarray(data[self.stream], dtype=float)
+    if stream.size == 0:
+      return None
+    one_dim = stream.ndim == 1
+    if one_dim:
+      stream = stream[:, np.newaxis]
+    elif self.transpose:
+      stream = stream.T
+
+    t = np.ravel(data[self.time])
+    phase = self._phase
+    y = self._filter(stream)
+    t = t[phase::self.decimation]
+    if not len(y):
+      return None
+
+    if self.labels is not None:
+      ret = {self.time: t}
+      for i, label in enumerate(self.labels):
+        ret[label] = y[:, i]
+      return Batch(ret)
+
+    data[self.time] = t
+    if one_dim:
+      data[self.stream] = y[:, 0]
+    else:
+      data[self.stream] = y.T if self.transpose else y
+    return data
+
+  def evaluate_batch(self, columns: dict) -> Optional[Batch]:
+    """Filters the streams of the batch one after the other, and returns all
+    the filtered values as a single batch of scalars."""
+
+    if self.labels is None:
+      raise ValueError("Stream_filter can only process batches of streams if "
+                       "labels are given")
+    outputs = [self.evaluate({self.time: t, self.stream: s})
+               for t, s in zip(columns[self.time], columns[self.stream])]
+    outputs = [out for out in outputs if out is not None]
+    if not outputs:
+      return None
+    return Batch({label: np.concatenate([out[label] for out in outputs])
+                  for label in outputs[0]})
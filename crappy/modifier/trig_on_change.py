@@ -1,7 +1,8 @@
 # coding: utf-8
 
+import numpy as np
 from typing import Union
-from .modifier import Modifier
+from .modifier import Modifier, select_rows
 
 
 class Trig_on_change(Modifier):
@@ -24,3 +25,12 @@ class Trig_on_change(Modifier):
       return None
     self.last = data[self.name]
     return data
+
+  def evaluate_batch(self, columns: dict) -> Union[dict, None]:
+    values = columns[self.name]
+    if not hasattr(self, 'last'):
+      mask = np.append(True, values[1:] != values[:-1])
+    else:
+      mask = values != np.append(self.last, values[:-1])
+    self.last = values[-1]
+    return select_rows(columns, mask)
@@ -1,6 +1,7 @@
 # coding: utf-8
 
-from .modifier import Modifier
+import numpy as np
+from .modifier import Modifier, select_rows
 from typing import Union
 
 
@@ -27,3 +28,6 @@ class Trig_on_value(Modifier):
   def evaluate(self, data: dict) -> Union[dict, None]:
     if data[self.name] in self.values:
       return data
+
+  def evaluate_batch(self, columns: dict) -> Union[dict, None]:
+    return select_rows(columns, np.isin(columns[self.name], self.values))
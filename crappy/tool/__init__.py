@@ -4,8 +4,13 @@ from .cameraConfig import Camera_config
 from .cameraConfigBoxes import Camera_config_with_boxes
 from .videoextensoConfig import VE_config
 from .gpucorrel import GPUCorrel
+from .cpucorrel import CPUCorrel
 from .discorrel import DISCorrel
 from .discorrelConfig import DISConfig
 from .disve import DISVE
+from .batch import Batch_processor
+from .frame_ring import Frame_ring
+from .pixel_correction import Pixel_correction
 from .ft232h import ft232h, ft232h_server, i2c_msg_ft232h
 from .usb_server import Usb_server
+from .v4l2_query import V4L2_query
@@ -0,0 +1,239 @@
+# coding: utf-8
+
+"""Offline processing of saved image sequences with the DIS-based tools.
+
+Can be used from the command line, see ``python -m crappy.tool.batch -h``.
+"""
+
+import re
+from argparse import ArgumentParser
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from os import path, makedirs, cpu_count
+from time import time
+from typing import Optional, Union, List, Tuple
+import numpy as np
+from .._global import OptionalModule
+
+try:
+  import cv2
+except (ModuleNotFoundError, ImportError):
+  cv2 = OptionalModule("opencv-python")
+
+from .discorrel import DISCorrel
+from .disve import DISVE
+
+# The tool used by each worker process, created once by _init_worker
+_worker_tool = None
+
+
+def _read(image: str) -> np.ndarray:
+  img = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+  if img is None:
+    raise IOError(f"Could not read the image {image}")
+  return img
+
+
+def _make_tool(tool: str, img0: np.ndarray, kwargs: dict):
+  if tool == 'discorrel':
+    return DISCorrel(img0, **kwargs)
+  return DISVE(img0, **kwargs)
+
+
+def _compute(instance, tool: str, img: np.ndarray) -> list:
+  if tool == 'discorrel':
+    return list(instance.calc(img))
+  return list(instance.calculate_displacement(img))
+
+
+def _init_worker(tool: str, ref: str, kwargs: dict) -> None:
+  global _worker_tool
+  _worker_tool = _make_tool(tool, _read(ref), kwargs)
+
+
+def _process(args: Tuple[str, str]) -> list:
+  tool, image = args
+  return _compute(_worker_tool, tool, _read(image))
+
+
+class Batch_processor:
+  """Runs :class:`DISCorrel` or :class:`DISVE` on a folder of saved images,
+  and writes the results to a file in the same format as the :ref:`Recorder`
+  block.
+
+  The frames are processed in parallel by a pool of processes, each one
+  holding its own instance of the tool. The methods needing the result of the
+  previous frame, i.e. :class:`DISCorrel` with ``init=True`` and
+  :class:`DISVE` with ``follow=True``, are always run sequentially.
+  """
+
+  def __init__(self,
+               folder: str,
+               tool: str = 'discorrel',
+               ref: Union[int, str] = 0,
+               pattern: str = r'_(\d+\.\d+)\.\w+$',
+               workers: Optional[int] = None,
+               labels: Optional[List[str]] = None,
+               **kwargs) -> None:
+    """Sets the args and lists the images to process.
+
+    Args:
+      folder: The folder containing the images.
+      tool: Either `'discorrel'` or `'disve'`.
+      ref: The reference image, either as the index of an image of the folder
+        or as a path.
+      pattern: A regular expression searched in the name of the images, whose
+        first group is the timestamp of the image. The default matches the
+        names given by the :ref:`Camera` block. If it doesn't match, the index
+        of the image is used instead.
+      workers: The number of processes to use. Defaults to the number of CPU
+        cores.
+      labels: The labels of the output file. If not given, they are the same as
+        the ones of the :ref:`Discorrel` and :ref:`Disve` blocks.
+      **kwargs: The arguments to pass to the tool, e.g. ``fields``, ``bbox``
+        or ``init`` for :class:`DISCorrel` and ``patches`` or ``follow`` for
+        :class:`DISVE`.
+    """
+
+    assert tool in ('discorrel', 'disve'), \
+        "tool should be 'discorrel' or 'disve'"
+    self.tool = tool
+    self.kwargs = kwargs
+    self.workers = cpu_count() if workers is None else workers
+
+    regex = re.compile(pattern)
+    images = sorted(f for f in glob(path.join(folder, '*'))
+                    if path.splitext(f)[1].lower() in
+                    ('.tiff', '.tif', '.png', '.jpg', '.jpeg', '.bmp'))
+    assert images, f"No image found in {folder}"
+    matches = [regex.search(path.basename(f)) for f in images]
+    if all(matches):
+      frames = sorted(zip((float(m.group(1)) for m in matches), images))
+    else:
+      frames = list(zip(map(float, range(len(images))), images))
+    self.timestamps = [t for t, _ in frames]
+    self.images = [f for _, f in frames]
+    self.ref = self.images[ref] if isinstance(ref, int) else ref
+
+    if labels is not None:
+      self.labels = list(labels)
+    elif tool == 'discorrel':
+      fields = kwargs.get('fields')
+      self.labels = ['t(s)', 'x(pix)', 'y(pix)', 'Exx(%)', 'Eyy(%)'] \
+          if fields is None else ['t(s)'] + [str(f) for f in fields]
+    else:
+      self.labels = ['t(s)'] + [elt for i, _ in enumerate(kwargs['patches'])
+                                for elt in [f'p{i}x', f'p{i}y']]
+
+  @property
+  def sequential(self) -> bool:
+    """:obj:`True` if each frame depends on the result of the previous one."""
+
+    if self.tool == 'discorrel':
+      return self.kwargs.get('init', True)
+    return self.kwargs.get('follow', True)
+
+  def run(self) -> List[list]:
+    """Processes all the images and returns the results, one :obj:`list`
+    starting with the timestamp per image."""
+
+    t0 = time()
+    if self.sequential or self.workers <= 1:
+      instance = _make_tool(self.tool, _read(self.ref), self.kwargs)
+      results = [_compute(instance, self.tool, _read(image))
+                 for image in self.images]
+    else:
+      chunk = max(1, len(self.images) // (4 * self.workers))
+      with ProcessPoolExecutor(max_workers=self.workers,
+                               initializer=_init_worker,
+                               initargs=(self.tool, self.ref,
+                                         self.kwargs)) as pool:
+        results = list(pool.map(_process,
+                                [(self.tool, image)
+                                 for image in self.images],
+                                chunksize=chunk))
+    duration = time() - t0
+    print(f"[Batch processor] Processed {len(self.images)} images in "
+          f"{duration:.2f}s ({len(self.images) / duration:.1f} fps, "
+          f"{'sequential' if self.sequential else f'{self.workers} workers'})")
+    return [[t] + r for t, r in zip(self.timestamps, results)]
+
+  def save(self, filename: str, results: Optional[List[list]] = None) -> str:
+    """Writes the results to a file in the :ref:`Recorder` format, and returns
+    the name of the file.
+
+    If the file already exists, a trailing number is added to the name like
+    the :ref:`Recorder` does. If no results are given, :meth:`run` is called.
+    """
+
+    if results is None:
+      results = self.run()
+    folder = path.dirname(filename)
+    if folder and not path.exists(folder):
+      makedirs(folder)
+    if path.exists(filename):
+      name, ext = path.splitext(filename)
+      i = 1
+      while path.exists(name + "_%05d" % i + ext):
+        i += 1
+      filename = name + "_%05d" % i + ext
+    with open(filename, 'w') as f:
+      f.write(", ".join(self.labels) + "\n")
+      for line in results:
+        f.write(", ".join(str(value) for value in line) + "\n")
+    return filename
+
+
+def main(args: Optional[List[str]] = None) -> None:
+  """Command-line interface of :class:`Batch_processor`."""
+
+  parser = ArgumentParser(description="Runs DISCorrel or DISVE on a folder "
+                                      "of saved images")
+  parser.add_argument('folder', help="Folder containing the images")
+  parser.add_argument('output', help="The file to write the results to")
+  parser.add_argument('-t', '--tool', choices=('discorrel', 'disve'),
+                      default='discorrel')
+  parser.add_argument('-r', '--ref', default='0',
+                      help="Index or path of the reference image")
+  parser.add_argument('-w', '--workers', type=int, default=None,
+                      help="Number of processes, defaults to the number of "
+                           "CPU cores")
+  parser.add_argument('--pattern', default=r'_(\d+\.\d+)\.\w+$',
+                      help="Regular expression capturing the timestamp in "
+                           "the name of the images")
+  parser.add_argument('--fields', nargs='+', help="Fields for DISCorrel")
+  parser.add_argument('--bbox', nargs=4, type=int,
+                      help="Bounding box for DISCorrel: ymin xmin ymax xmax")
+  parser.add_argument('--patch', nargs=4, type=int, action='append',
+                      dest='patches', help="Patch for DISVE: ymin xmin "
+                                           "height width, can be repeated")
+  parser.add_argument('-o', '--option', action='append', default=[],
+                      metavar='KEY=VALUE',
+                      help="Any other argument of the tool, e.g. alpha=3 or "
+                           "init=False, can be repeated")
+  args = parser.parse_args(args)
+
+  kwargs = {}
+  if args.fields:
+    kwargs['fields'] = args.fields
+  if args.bbox:
+    kwargs['bbox'] = tuple(args.bbox)
+  if args.patches:
+    kwargs['patches'] = [tuple(p) for p in args.patches]
+  for option in args.option:
+    key, value = option.split('=', 1)
+    try:
+      kwargs[key] = literal_eval(value)
+    except (ValueError, SyntaxError):
+      kwargs[key] = value
+
+  ref = int(args.ref) if args.ref.lstrip('-').isdigit() else args.ref
+  processor = Batch_processor(args.folder, tool=args.tool, ref=ref,
+                              pattern=args.pattern, workers=args.workers,
+                              **kwargs)
+  print("[Batch processor] Results written to", processor.save(args.output))
+
+
+if __name__ == '__main__':
+  main()
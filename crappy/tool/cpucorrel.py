@@ -0,0 +1,465 @@
+# coding:utf-8
+
+import warnings
+from functools import lru_cache
+import numpy as np
+from typing import Any, Tuple
+
+from .fields import get_field
+from .gpucorrel import interp_nearest
+from .._global import OptionalModule
+
+try:
+  import cv2
+except (ModuleNotFoundError, ImportError):
+  cv2 = OptionalModule("opencv-python")
+
+
+@lru_cache(maxsize=32)
+def _resampling_maps(h: int, w: int,
+                     new_h: int, new_w: int) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns the maps for resampling a `(h, w)` image to `(new_h, new_w)`.
+
+  The sampling points are the same as the ones of the `resample` kernels of
+  :class:`GPUCorrel`, with normalized texture coordinates.
+  """
+
+  map_x = np.arange(new_w, dtype=np.float32) * w / new_w - .5
+  map_y = np.arange(new_h, dtype=np.float32) * h / new_h - .5
+  map_x, map_y = np.meshgrid(map_x, map_y)
+  map_x.setflags(write=False)
+  map_y.setflags(write=False)
+  return map_x, map_y
+
+
+def resample(img: np.ndarray, new_h: int, new_w: int) -> np.ndarray:
+  """Resamples an image with bilinear interpolation, the pixels outside the
+  image being considered as `0`."""
+
+  return cv2.remap(img, *_resampling_maps(*img.shape, new_h, new_w),
+                   cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT,
+                   borderValue=0)
+
+
+class CPUCorrelStage:
+  """Run a correlation routine on an image, at a given resolution, on the CPU.
+
+  This is the counterpart of :class:`CorrelStage` using NumPy and OpenCV
+  instead of CUDA. The gradients of the original image and the Hessian are
+  computed once per original image, and each iteration only involves a
+  :func:`cv2.remap` and two matrix products.
+
+  Note:
+    Multiple instances of this class are used for the pyramidal correlation in
+    :class:`CPUCorrel`.
+
+    Can but is not meant to be used as is.
+  """
+
+  num = 0  # To count the instances so they get a unique number (self.num)
+
+  def __init__(self, img_size: tuple, **kwargs) -> None:
+    self.num = CPUCorrelStage.num
+    CPUCorrelStage.num += 1
+    self.verbose = kwargs.get("verbose", 0)
+    self.debug(2, "Initializing with resolution", img_size)
+    self.h, self.w = img_size
+    self._ready = False
+    self.nbIter = kwargs.get("iterations", 5)
+    self.showDiff = kwargs.get("show_diff", False)
+    if self.showDiff:
+      cv2.namedWindow("Residual", cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
+    self.mul = kwargs.get("mul", 3)
+    self.loop = 0
+
+    self.Nfields = kwargs.get("Nfields")
+    if self.Nfields is None:
+      self.Nfields = len(kwargs.get("fields")[0])
+
+    # The coordinates of the pixels, and the buffers for the remapping
+    self._x, self._y = np.meshgrid(np.arange(self.w, dtype=np.float32),
+                                   np.arange(self.h, dtype=np.float32))
+    self._disp = np.empty((2, self.h * self.w), np.float32)
+    self._map_x = np.empty((self.h, self.w), np.float32)
+    self._map_y = np.empty((self.h, self.w), np.float32)
+    self.out = np.empty((self.h, self.w), np.float32)
+    self.X = np.zeros(self.Nfields, np.float32)
+    self.res = np.inf
+
+    if kwargs.get("img") is not None:
+      self.set_orig(kwargs.get("img"))
+    if kwargs.get("fields") is not None:
+      self.set_fields(*kwargs.get("fields"))
+    if kwargs.get("mask") is not None:
+      self.set_mask(kwargs.get("mask"))
+
+  def debug(self, n: int, *s: Any) -> None:
+    """To print debug messages, see :meth:`CorrelStage.debug`."""
+
+    if n <= self.verbose:
+      s2 = ()
+      for i in range(len(s)):
+        s2 += (str(s[i]).replace("\n", "\n" + (10 + n) * " "),)
+      print("  " * (n - 1) + "[Stage " + str(self.num) + "]", *s2)
+
+  def set_orig(self, img: np.ndarray) -> None:
+    """To set the original image."""
+
+    assert img.shape == (self.h, self.w), \
+        "Got a {} image in a {} correlation routine!".format(
+        img.shape, (self.h, self.w))
+    self.debug(3, "Setting original image from ndarray")
+    self.orig = np.ascontiguousarray(img, dtype=np.float32)
+    self.update_orig()
+
+  def update_orig(self) -> None:
+    """Computes the gradients of the original image."""
+
+    self.debug(3, "Updating original image")
+    self._compute_gradients()
+    self._ready = False
+
+  def _compute_gradients(self) -> None:
+    """Sobel gradients of the original image, scaled like the ones of the
+    `gradient` kernel."""
+
+    self.gradX = cv2.Sobel(self.orig, cv2.CV_32F, 1, 0, ksize=3, scale=.5,
+                           borderType=cv2.BORDER_CONSTANT)
+    self.gradY = cv2.Sobel(self.orig, cv2.CV_32F, 0, 1, ksize=3, scale=.5,
+                           borderType=cv2.BORDER_CONSTANT)
+
+  def prepare(self) -> None:
+    """Computes all necessary tables to perform correlation.
+
+    Note:
+      This method must be called everytime the original image or fields are
+      set.
+
+      If not done by the user, it will be done automatically when needed.
+    """
+
+    if not hasattr(self, 'mask'):
+      self.debug(2, "No mask set when preparing, using a basic one, "
+                    "with a border of 5% the dimension")
+      mask = np.zeros((self.h, self.w), np.float32)
+      mask[self.h // 20:-self.h // 20, self.w // 20:-self.w // 20] = 1
+      self.set_mask(mask)
+    if not self._ready:
+      if not hasattr(self, 'orig'):
+        self.debug(1, "Tried to prepare but original image is not set !")
+      elif not hasattr(self, 'fields'):
+        self.debug(1, "Tried to prepare but fields are not set !")
+      else:
+        self._make_g()
+        self._make_h()
+        self._ready = True
+        self.debug(3, "Ready!")
+    else:
+      self.debug(1, "Tried to prepare when unnecessary, doing nothing...")
+
+  def _make_g(self) -> None:
+    # One flattened G table per field, to compute the research direction
+    self.G = (self.gradX * self.fieldsX +
+              self.gradY * self.fieldsY).reshape(self.Nfields, -1)
+
+  def _make_h(self) -> None:
+    self.H = np.dot(self.G, self.G.T)
+    self.debug(3, "Hessian:\n", self.H)
+    self.Hi = np.linalg.inv(self.H.astype(np.float64)).astype(np.float32)
+    self.debug(3, "Inverted Hessian:\n", self.Hi)
+
+  def resample_orig(self, new_y: int, new_x: int) -> np.ndarray:
+    """Returns the original image resampled to `(new_y, new_x)`."""
+
+    return resample(self.orig, new_y, new_x)
+
+  def resample_d(self, new_y: int, new_x: int) -> np.ndarray:
+    """Returns the second image resampled to `(new_y, new_x)`."""
+
+    return resample(self.img_d, new_y, new_x)
+
+  def set_fields(self, fields_x: np.ndarray, fields_y: np.ndarray) -> None:
+    """Sets the fields to identify, as two arrays of shape
+    `(Nfields, h, w)`."""
+
+    self.debug(2, "Setting fields")
+    self.fieldsX = np.ascontiguousarray(fields_x, dtype=np.float32)
+    self.fieldsY = np.ascontiguousarray(fields_y, dtype=np.float32)
+    self._fields = np.stack((self.fieldsX.reshape(self.Nfields, -1),
+                             self.fieldsY.reshape(self.Nfields, -1)))
+    self.fields = True
+    self._ready = False
+
+  def set_image(self, img_d: np.ndarray) -> None:
+    """Set the image to compare with the original."""
+
+    assert img_d.shape == (self.h, self.w), \
+        "Got a {} image in a {} correlation routine!".format(
+        img_d.shape, (self.h, self.w))
+    self.img_d = np.ascontiguousarray(img_d, dtype=np.float32)
+    self.X[:] = 0
+
+  def set_mask(self, mask: np.ndarray) -> None:
+    self.debug(3, "Setting the mask")
+    assert mask.shape == (self.h, self.w), \
+        "Got a {} mask in a {} routine.".format(mask.shape, (self.h, self.w))
+    self.mask = np.asarray(mask, dtype=np.float32)
+
+  def set_disp(self, x: np.ndarray) -> None:
+    assert x.shape == (self.Nfields,), \
+      "Incorrect initialization of the parameters"
+    self.X[:] = x
+
+  def _make_diff(self) -> None:
+    """Writes the difference between the original image and the second image
+    displaced by the current fields, weighted by the mask."""
+
+    np.dot(self.X, self._fields, out=self._disp)
+    np.add(self._x, self._disp[0].reshape(self.h, self.w), out=self._map_x)
+    np.add(self._y, self._disp[1].reshape(self.h, self.w), out=self._map_y)
+    cv2.remap(self.img_d, self._map_x, self._map_y, cv2.INTER_LINEAR,
+              dst=self.out, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+    np.subtract(self.orig, self.out, out=self.out)
+    np.multiply(self.out, self.mask, out=self.out)
+
+  def write_diff_file(self) -> None:
+    self._make_diff()
+    diff = (self.out + 128).astype(np.uint8)
+    cv2.imwrite("diff{}-{}.png".format(self.num, self.loop), diff)
+
+  def get_disp(self, img_d: np.ndarray = None) -> np.ndarray:
+    """The method that actually computes the weight of the fields."""
+
+    self.debug(3, "Calling main routine")
+    self.loop += 1
+    if not self._ready:
+      self.debug(2, "Wasn't ready ! Preparing...")
+      self.prepare()
+    if img_d is not None:
+      self.set_image(img_d)
+    assert hasattr(self, 'img_d'), \
+        "Did not set the image, use set_image() before calling get_disp or " \
+        "give the image as parameter."
+    self.debug(3, "Computing first diff table")
+    self._make_diff()
+    flat = self.out.reshape(-1)
+    self.res = float(np.dot(flat, flat))
+    self.debug(3, "res:", self.res / 1e6)
+
+    for i in range(self.nbIter):
+      self.debug(3, "Iteration", i)
+      # Newton method: the gradient of each parameter multiplied by the
+      # pre-inverted Hessian gives the research direction
+      vec = np.dot(self.Hi, np.dot(self.G, flat))
+      self.X += self.mul * vec
+      self.debug(3, "Direction:", vec)
+      self.debug(3, "New X:", self.X)
+
+      self._make_diff()
+      oldres = self.res
+      self.res = float(np.dot(flat, flat))
+      # If we moved away, revert changes and stop iterating
+      if self.res >= oldres:
+        self.debug(3, "Diverting from the solution new res={} >= {}!"
+                   .format(self.res / 1e6, oldres / 1e6))
+        self.X -= self.mul * vec
+        self.res = oldres
+        self.debug(3, "Undone: X=", self.X)
+        break
+
+      self.debug(3, "res:", self.res / 1e6)
+    if self.showDiff:
+      cv2.imshow("Residual", (self.out + 128).astype(np.uint8))
+      cv2.waitKey(1)
+    return self.X.copy()
+
+
+class CPUCorrel:
+  """Identify the displacement between two images, on the CPU.
+
+  This class implements the same pyramidal Gauss-Newton algorithm as
+  :class:`GPUCorrel`, with the same API and arguments, but relies on NumPy and
+  OpenCV instead of CUDA. It is meant for computers without a Nvidia video
+  card, and is used automatically by the :ref:`GPUCorrel` and :ref:`GPUve`
+  blocks when CUDA is not available.
+
+  Note:
+    The ``kernel_file`` and ``context`` arguments are accepted for
+    compatibility, but ignored.
+  """
+
+  def __init__(self, img_size: tuple, **kwargs) -> None:
+    kwargs.pop('context', None)
+    unknown = []
+    for k in kwargs.keys():
+      if k not in ['verbose', 'levels', 'resampling_factor', 'kernel_file',
+                   'iterations', 'show_diff', 'Nfields', 'img',
+                   'fields', 'mask', 'mul']:
+        unknown.append(k)
+    if len(unknown) != 0:
+      warnings.warn("Unrecognized parameter" + (
+        's: ' + str(unknown) if len(unknown) > 1 else ': ' + unknown[0]),
+        SyntaxWarning)
+    self.verbose = kwargs.get("verbose", 0)
+    self.levels = kwargs.get("levels", 5)
+    self.loop = 0
+    self.resamplingFactor = kwargs.get("resampling_factor", 2)
+    h, w = img_size
+    self.nbIter = kwargs.get("iterations", 4)
+    self.debug(1, "Initializing... Master resolution:", img_size,
+               "levels:", self.levels, "verbosity:", self.verbose)
+
+    # Computing dimensions of the different levels #
+    self.h, self.w = [], []
+    for i in range(self.levels):
+      self.h.append(int(round(h / (self.resamplingFactor ** i))))
+      self.w.append(int(round(w / (self.resamplingFactor ** i))))
+
+    if kwargs.get("Nfields") is not None:
+      self.Nfields = kwargs.get("Nfields")
+    else:
+      try:
+        self.Nfields = len(kwargs["fields"])
+      except KeyError:
+        self.debug(0, "Error! You must provide the number of fields at init. \
+Add Nfields=x or directly set fields with fields=list/tuple")
+        raise ValueError
+
+    # Creating a new instance of CPUCorrelStage for each stage #
+    self.correl = []
+    for i in range(self.levels):
+      self.correl.append(CPUCorrelStage((self.h[i], self.w[i]),
+                                        verbose=self.verbose,
+                                        Nfields=self.Nfields,
+                                        iterations=self.nbIter,
+                                        show_diff=(i == 0 and kwargs.get(
+                                            "show_diff", False)),
+                                        mul=kwargs.get("mul", 3)))
+
+    if kwargs.get("img") is not None:
+      self.set_orig(kwargs.get("img"))
+    if kwargs.get("fields") is not None:
+      self.set_fields(kwargs.get("fields"))
+    if kwargs.get("mask") is not None:
+      self.set_mask(kwargs.get("mask"))
+
+  def debug(self, n: int, *s: Any) -> None:
+    """To print debug info, see :meth:`GPUCorrel.debug`."""
+
+    if n <= self.verbose:
+      print("  " * (n - 1) + "[Correl]", *s)
+
+  def get_fields(self, y: int = None, x: int = None) -> tuple:
+    """Returns the fields, resampled to size `(y,x)`."""
+
+    if x is None or y is None:
+      y = self.h[0]
+      x = self.w[0]
+    out_x = np.empty((self.Nfields, y, x), np.float32)
+    out_y = np.empty((self.Nfields, y, x), np.float32)
+    for i, (field_x, field_y) in enumerate(self._fields):
+      out_x[i] = resample(field_x, y, x)
+      out_y[i] = resample(field_y, y, x)
+    return out_x, out_y
+
+  def set_orig(self, img: np.ndarray) -> None:
+    """To set the original image.
+
+    This is the reference with which the second image will be compared.
+    """
+
+    self.debug(2, "updating original image")
+    assert isinstance(img, np.ndarray), "Image must be a numpy array"
+    assert len(img.shape) == 2, "Image must have 2 dimensions (got {})" \
+        .format(len(img.shape))
+    assert img.shape == (self.h[0], self.w[0]), "Wrong size!"
+    if img.dtype != np.float32:
+      warnings.warn("Correl() takes arrays with dtype np.float32 (got {}). "
+                    "Converting to float32.".format(img.dtype),
+                    RuntimeWarning)
+      img = img.astype(np.float32)
+
+    self.correl[0].set_orig(img)
+    for i in range(1, self.levels):
+      self.correl[i].set_orig(self.correl[i - 1].resample_orig(self.h[i],
+                                                               self.w[i]))
+
+  def set_fields(self, fields: list) -> None:
+    assert self.Nfields == len(fields), \
+      "Cannot change the number of fields on the go!"
+    self._fields = []
+    for field in fields:
+      if isinstance(field, str):
+        field = get_field(field.lower(), self.h[0], self.w[0])
+      self._fields.append(tuple(np.asarray(f, dtype=np.float32)
+                                for f in field))
+    for i in range(self.levels):
+      self.correl[i].set_fields(*self.get_fields(self.h[i], self.w[i]))
+
+  def prepare(self) -> None:
+    for c in self.correl:
+      c.prepare()
+    self.debug(2, "Ready!")
+
+  def save_all_images(self, name: str = "out") -> None:
+    self.debug(1, "Saving all images with the name", name + "X.png")
+    for i in range(self.levels):
+      cv2.imwrite(name + str(i) + ".png",
+                  self.correl[i].orig.astype(np.uint8))
+
+  def set_image(self, img_d: np.ndarray) -> None:
+    if img_d.dtype != np.float32:
+      warnings.warn("Correl() takes arrays with dtype np.float32 (got {}). "
+                    "Converting to float32.".format(img_d.dtype),
+                    RuntimeWarning)
+      img_d = img_d.astype(np.float32)
+    self.correl[0].set_image(img_d)
+    for i in range(1, self.levels):
+      self.correl[i].set_image(
+        self.correl[i - 1].resample_d(self.correl[i].h, self.correl[i].w))
+
+  def set_mask(self, mask: np.ndarray) -> None:
+    for i in range(self.levels):
+      self.correl[i].set_mask(interp_nearest(mask, self.h[i], self.w[i]))
+
+  def get_disp(self, img_d: np.ndarray = None) -> np.ndarray:
+    """To get the displacement.
+
+    This will perform the correlation routine on each stage, initializing with
+    the previous values every time it will return the computed parameters
+    as a list.
+    """
+
+    self.loop += 1
+    if img_d is not None:
+      self.set_image(img_d)
+    try:
+      disp = self.last / (self.resamplingFactor ** self.levels)
+    except AttributeError:
+      disp = np.array([0] * self.Nfields, dtype=np.float32)
+    for i in reversed(range(self.levels)):
+      disp *= self.resamplingFactor
+      self.correl[i].set_disp(disp)
+      disp = self.correl[i].get_disp()
+      self.last = disp
+    if self.loop % 10 == 0:
+      self.debug(2, "Loop", self.loop, ", values:", self.correl[0].X,
+                 ", res:", self.correl[0].res / 1e6)
+    return disp
+
+  def get_res(self, lvl: int = 0) -> float:
+    """Returns the last residual of the specified level (`0` by default)."""
+
+    return self.correl[lvl].res
+
+  def write_diff_file(self, level: int = 0) -> None:
+    """To see the difference between the two images with the computed
+    parameters, see :meth:`GPUCorrel.write_diff_file`."""
+
+    self.correl[level].write_diff_file()
+
+  @staticmethod
+  def clean() -> None:
+    """Does nothing, only for compatibility with :class:`GPUCorrel`."""
+
+    pass
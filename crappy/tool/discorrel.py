@@ -9,8 +9,11 @@ try:
 except (ModuleNotFoundError, ImportError):
   cv2 = OptionalModule("opencv-python")
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from typing import Tuple, Optional
 
-from .fields import get_fields, Projector, get_res
+from .fields import FlatProjector, get_res
 
 
 class DISCorrel:
@@ -27,7 +30,11 @@ class DISCorrel:
                iterations: int = 1,
                gditerations: int = 10,
                patch_size: int = 8,
-               patch_stride: int = 3) -> None:
+               patch_stride: int = 3,
+               tiles: Tuple[int, int] = (1, 1),
+               tile_overlap: int = 32,
+               workers: Optional[int] = None,
+               lstsq: bool = False) -> None:
     """Sets the discorrel parameters.
 
         Args:
@@ -43,6 +50,16 @@ class DISCorrel:
           gditerations: Gradient descent iterations
           patch_size: DIS patch size
           patch_stride: DIS patch stride
+          tiles: Number of tiles along y and x. If more than one tile, the
+            flow is only computed on the bbox, split in overlapping tiles
+            processed in parallel and blended together
+          tile_overlap: Number of pixels shared by neighbouring tiles
+          workers: Number of threads computing the tiles, defaults to the
+            number of tiles or of CPU cores if lower
+          lstsq: If :obj:`True`, the flow is decomposed on the fields in the
+            least-squares sense. Otherwise it is projected on each field
+            independently, which gives different values if the fields are not
+            orthogonal
         """
 
     self.img0 = img0
@@ -61,18 +78,82 @@ class DISCorrel:
     if self.bbox is None:
       self.bbox = (0, 0, self.h, self.w)
     self.bh, self.bw = self.bbox[2] - self.bbox[0], self.bbox[3] - self.bbox[1]
-    self.fields = get_fields(self.fields, self.bh, self.bw)
-    self.p = Projector(self.fields)
-    self.dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
-    self.dis.setVariationalRefinementAlpha(self.alpha)
-    self.dis.setVariationalRefinementDelta(self.delta)
-    self.dis.setVariationalRefinementGamma(self.gamma)
-    self.dis.setFinestScale(self.finest_scale)
-    self.dis.setVariationalRefinementIterations(self.iterations)
-    self.dis.setGradientDescentIterations(self.gditerations)
-    self.dis.setPatchSize(self.patch_size)
-    self.dis.setPatchStride(self.patch_stride)
-    self.dis_flow = np.zeros((self.h, self.w, 2))
+    self.p = FlatProjector(self.fields, self.bh, self.bw, lstsq)
+    self.dis = self._create_dis()
+    self.dis_flow = np.zeros((self.h, self.w, 2), dtype=np.float32)
+
+    self.tiles = tuple(tiles)
+    self.tile_overlap = tile_overlap
+    self._pool = None
+    if self.tiles != (1, 1):
+      self._make_tiles()
+      if workers is None:
+        workers = min(len(self._tiles), cpu_count() or 1)
+      self._pool = ThreadPoolExecutor(max_workers=workers)
+
+  def _create_dis(self):
+    """Returns a Disflow instance with the settings of the correlation."""
+
+    dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
+    dis.setVariationalRefinementAlpha(self.alpha)
+    dis.setVariationalRefinementDelta(self.delta)
+    dis.setVariationalRefinementGamma(self.gamma)
+    dis.setFinestScale(self.finest_scale)
+    dis.setVariationalRefinementIterations(self.iterations)
+    dis.setGradientDescentIterations(self.gditerations)
+    dis.setPatchSize(self.patch_size)
+    dis.setPatchStride(self.patch_stride)
+    return dis
+
+  def _make_tiles(self) -> None:
+    """Splits the bbox, enlarged by the overlap, into overlapping tiles and
+    computes the weights for blending them.
+
+    The weights decrease linearly in the overlapping areas, where the flow of
+    a tile is the least reliable as it is close to its border.
+    """
+
+    ymin, xmin, ymax, xmax = self.bbox
+    ov = self.tile_overlap
+    # The region on which the flow is computed
+    self._region = (slice(max(0, ymin - ov), min(self.h, ymax + ov)),
+                    slice(max(0, xmin - ov), min(self.w, xmax + ov)))
+
+    def split(start: int, stop: int, n: int) -> list:
+      edges = np.linspace(start, stop, n + 1).astype(int)
+      return [slice(max(start, low - ov), min(stop, high + ov))
+              for low, high in zip(edges[:-1], edges[1:])]
+
+    rows = split(self._region[0].start, self._region[0].stop, self.tiles[0])
+    cols = split(self._region[1].start, self._region[1].stop, self.tiles[1])
+
+    def ramp(length: int) -> np.ndarray:
+      dist = np.minimum(np.arange(1, length + 1), np.arange(length, 0, -1))
+      return np.minimum(1, dist / (ov + 1)).astype(np.float32)
+
+    self._tiles = [(row, col) for row in rows for col in cols]
+    weights = [np.outer(ramp(row.stop - row.start), ramp(col.stop - col.start))
+               for row, col in self._tiles]
+    total = np.zeros((self.h, self.w), dtype=np.float32)
+    for (row, col), weight in zip(self._tiles, weights):
+      total[row, col] += weight
+    self._weights = [(weight / total[row, col])[:, :, np.newaxis]
+                     for (row, col), weight in zip(self._tiles, weights)]
+
+    # Disflow instances cannot be shared between threads
+    self._tile_dis = [self._create_dis() for _ in self._tiles]
+    self._tile_flows = [None for _ in self._tiles]
+
+  def _calc_tile(self, i: int, img: np.ndarray) -> np.ndarray:
+    """Computes the flow on the i-th tile."""
+
+    row, col = self._tiles[i]
+    # Disflow only accepts contiguous images
+    flow = self._tile_dis[i].calc(np.ascontiguousarray(self.img0[row, col]),
+                                  np.ascontiguousarray(img[row, col]),
+                                  self._tile_flows[i] if self.init else None)
+    self._tile_flows[i] = flow
+    return flow
 
   def crop(self, img: np.ndarray) -> np.ndarray:
     ymin, xmin, ymax, xmax = self.bbox
@@ -80,7 +161,14 @@ class DISCorrel:
 
   def calc(self, img: np.ndarray) -> list:
     self.img = img
-    if self.init:
+    if self._pool is not None:
+      flows = list(self._pool.map(lambda i: self._calc_tile(i, img),
+                                  range(len(self._tiles))))
+      # Blending the tiles
+      self.dis_flow[self._region] = 0
+      for (row, col), weight, flow in zip(self._tiles, self._weights, flows):
+        self.dis_flow[row, col] += weight * flow
+    elif self.init:
       self.dis_flow = self.dis.calc(self.img0, img, self.dis_flow)
     else:
       self.dis_flow = self.dis.calc(self.img0, img, None)
@@ -94,4 +182,8 @@ class DISCorrel:
     return np.average(np.abs(get_res(self.img0, self.img, self.dis_flow)))
 
   def proj_flow(self) -> list:
-    return self.p.get_full(self.dis_flow)
+    return self.p.get_full(self.crop(self.dis_flow))
+
+  def close(self) -> None:
+    if self._pool is not None:
+      self._pool.shutdown()
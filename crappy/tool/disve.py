@@ -2,6 +2,7 @@
 
 import numpy as np
 from typing import NoReturn, Literal, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from .._global import OptionalModule
 
 try:
@@ -18,6 +19,10 @@ class DISVE:
   Different algorithms are available depending on the needs.
   This tool is mainly used to perform video-extensometry on speckled surfaces,
   although it can as well be of use for other applications.
+
+  As the reference image only changes when a new instance is created, all the
+  data depending only on it (reference patches, and their spectra for the
+  Fourier-based methods) is computed once at instantiation.
   """
 
   def __init__(self,
@@ -38,7 +43,8 @@ class DISVE:
                border: float = 0.2,
                safe: bool = True,
                follow: bool = True,
-               show_image: bool = False) -> None:
+               show_image: bool = False,
+               threads: int = 1) -> None:
     """Sets a few attributes and initializes Disflow if this method was
     selected.
 
@@ -72,6 +78,9 @@ class DISVE:
         of the image.
       show_image: If :obj:`True`, displays the real-time position of the
         patches on the image. This feature is mainly meant for debugging.
+      threads: If greater than `1`, the patches are processed in parallel by
+        this number of threads. OpenCV releases the GIL, so this speeds up the
+        computation when there are several patches.
     """
 
     self._img0 = img0
@@ -85,17 +94,47 @@ class DISVE:
 
     # Initialize Disflow if it is the selected method
     if self._method == 'Disflow':
-      self._dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
-      self._dis.setVariationalRefinementIterations(iterations)
-      self._dis.setVariationalRefinementAlpha(alpha)
-      self._dis.setVariationalRefinementDelta(delta)
-      self._dis.setVariationalRefinementGamma(gamma)
-      self._dis.setFinestScale(finest_scale)
-      self._dis.setGradientDescentIterations(gradient_iterations)
-      self._dis.setPatchSize(patch_size)
-      self._dis.setPatchStride(patch_stride)
+      self._dis_kw = {'alpha': alpha,
+                      'delta': delta,
+                      'gamma': gamma,
+                      'finest_scale': finest_scale,
+                      'iterations': iterations,
+                      'gradient_iterations': gradient_iterations,
+                      'patch_size': patch_size,
+                      'patch_stride': patch_stride}
+      self._dis = self._create_dis(**self._dis_kw)
+      # A Disflow instance cannot be shared between threads
+      self._dis_list = [self._dis if threads <= 1 else
+                        self._create_dis(**self._dis_kw)
+                        for _ in self._patches]
     else:
       self._dis = None
+      self._dis_list = None
+
+    # The reference patches only depend on img0
+    self._ref_patches = [np.ascontiguousarray(self._get_patch(img0, patch))
+                         for patch in self._patches]
+    # Disflow only accepts contiguous images, the current patches are copied
+    # into these preallocated buffers
+    self._patch_buffers = [np.empty_like(ref) for ref in self._ref_patches]
+
+    # For the Fourier-based methods, also caching the reference spectra
+    self._crops = []
+    self._buffers = []
+    self._ref_spectra = []
+    if self._method in ('Pixel precision', 'Parabola'):
+      for ref in self._ref_patches:
+        crop = self._power_of_2_crop(*ref.shape)
+        buffer = np.empty((crop[0].stop - crop[0].start,
+                           crop[1].stop - crop[1].start), dtype=np.float32)
+        np.copyto(buffer, ref[crop], casting='unsafe')
+        self._crops.append(crop)
+        self._buffers.append(buffer)
+        self._ref_spectra.append(cv2.dft(buffer,
+                                         flags=cv2.DFT_COMPLEX_OUTPUT))
+
+    self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 \
+        else None
 
     self._offsets = [(0, 0) for _ in self._patches]
     if self._safe:
@@ -113,24 +152,24 @@ class DISVE:
     following the patches if any.
     """
 
-    # first, compute the displacement for each patch
-    displacements = []
-    for patch, offset in zip(self._patches, self._offsets):
-
-      if self._method == 'Disflow':
-        displacements.append(self._calc_disflow(patch, img, offset))
-
-      elif self._method == 'Pixel precision':
-        displacements.append(self._calc_pixel_precision(patch, img, offset))
-
-      elif self._method == 'Parabola':
-        displacements.append(self._calc_parabola(patch, img, offset))
-
-      elif self._method == 'Lucas Kanade':
-        displacements.append(self._calc_lucas_kanade(patch, img, offset))
+    if self._method == 'Disflow':
+      calc = self._calc_disflow
+    elif self._method == 'Pixel precision':
+      calc = self._calc_pixel_precision
+    elif self._method == 'Parabola':
+      calc = self._calc_parabola
+    elif self._method == 'Lucas Kanade':
+      calc = self._calc_lucas_kanade
+    else:
+      raise ValueError("Wrong method specified !")
 
-      else:
-        raise ValueError("Wrong method specified !")
+    # first, compute the displacement for each patch
+    if self._pool is not None:
+      displacements = list(self._pool.map(
+        lambda i: calc(i, img, self._offsets[i]), range(len(self._patches))))
+    else:
+      displacements = [calc(i, img, offset)
+                       for i, offset in enumerate(self._offsets)]
 
     # If required, updates the patch offsets
     if self._follow:
@@ -152,46 +191,81 @@ class DISVE:
     displacements = [coord for disp in displacements for coord in disp]
     return displacements
 
+  def get_boxes(self) -> List[Tuple[int, int, int, int]]:
+    """Returns the current position of the patches on the image, as a list of
+    ``(y min, x min, y max, x max)`` tuples."""
+
+    return [(y_min + y_offset, x_min + x_offset,
+             y_min + y_offset + height, x_min + x_offset + width)
+            for (y_min, x_min, height, width), (y_offset, x_offset)
+            in zip(self._patches, self._offsets)]
+
   def close(self) -> NoReturn:
-    """Closes the window for following the patches."""
+    """Closes the window for following the patches, and stops the threads if
+    any."""
 
     if self._show_image:
       cv2.destroyWindow("DISVE")
+    if self._pool is not None:
+      self._pool.shutdown()
+
+  @staticmethod
+  def _create_dis(alpha: float,
+                  delta: float,
+                  gamma: float,
+                  finest_scale: int,
+                  iterations: int,
+                  gradient_iterations: int,
+                  patch_size: int,
+                  patch_stride: int):
+    """Returns a Disflow instance with the given settings."""
+
+    dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_FAST)
+    dis.setVariationalRefinementIterations(iterations)
+    dis.setVariationalRefinementAlpha(alpha)
+    dis.setVariationalRefinementDelta(delta)
+    dis.setVariationalRefinementGamma(gamma)
+    dis.setFinestScale(finest_scale)
+    dis.setGradientDescentIterations(gradient_iterations)
+    dis.setPatchSize(patch_size)
+    dis.setPatchStride(patch_stride)
+    return dis
 
   def _calc_disflow(self,
-                    patch: Tuple[int, int, int, int],
+                    index: int,
                     img: np.ndarray,
                     offset: Tuple[int, int]) -> List[float]:
     """Returns the displacement between the original and the current image with
     a sub-pixel precision, using Disflow."""
 
-    disp_img = self._dis.calc(self._get_patch(self._img0, patch),
-                              self._get_patch(img, patch, offset),
-                              None)
+    patch = self._patch_buffers[index]
+    np.copyto(patch, self._get_patch(img, self._patches[index], offset))
+    disp_img = self._dis_list[index].calc(self._ref_patches[index], patch,
+                                          None)
     return np.average(self._trim_patch(disp_img), axis=(0, 1)).tolist()
 
   def _calc_pixel_precision(self,
-                            patch: Tuple[int, int, int, int],
+                            index: int,
                             img: np.ndarray,
                             offset: Tuple[int, int]) -> List[float]:
     """Returns the displacement between the original and the current image with
     a precision limited to 1 pixel."""
 
     cross_correl, max_width, max_height = self._cross_correlation(
-      self._get_patch(self._img0, patch), self._get_patch(img, patch, offset))
+      index, self._get_patch(img, self._patches[index], offset))
 
     height, width = cross_correl.shape[0], cross_correl.shape[1]
     return [-(max_width - width / 2), -(max_height - height / 2)]
 
   def _calc_parabola(self,
-                     patch: Tuple[int, int, int, int],
+                     index: int,
                      img: np.ndarray,
                      offset: Tuple[int, int]) -> List[float]:
     """Returns the displacement between the original and the current image with
     a sub-pixel precision, using two parabola fits (one in x and one in y)."""
 
     cross_correl, max_width, max_height = self._cross_correlation(
-      self._get_patch(self._img0, patch), self._get_patch(img, patch, offset))
+      index, self._get_patch(img, self._patches[index], offset))
 
     height, width = cross_correl.shape[0], cross_correl.shape[1]
     y_disp = -(max_height - height / 2)
@@ -205,17 +279,18 @@ class DISVE:
     return [x_disp, y_disp]
 
   def _calc_lucas_kanade(self,
-                         patch: Tuple[int, int, int, int],
+                         index: int,
                          img: np.ndarray,
                          offset: Tuple[int, int]) -> List[float]:
     """Returns the displacement between the original and the current image with
     a sub-pixel precision, using the Lucas Kanade algorithm."""
 
     # Getting the center of the patch
+    patch = self._patches[index]
     center_y, center_x = patch[2] // 2, patch[3] // 2
 
     next_, _, _ = cv2.calcOpticalFlowPyrLK(
-      self._get_patch(self._img0, patch), self._get_patch(img, patch, offset),
+      self._ref_patches[index], self._get_patch(img, patch, offset),
       np.array([[center_x, center_y]]).astype('float32'), None)
     new_x, new_y = np.squeeze(next_)
 
@@ -233,37 +308,40 @@ class DISVE:
     return (arr[0] - arr[2]) / (2 * (arr[0] - 2 * arr[1] + arr[2]))
 
   @staticmethod
-  def _cross_correlation(img0: np.ndarray,
+  def _power_of_2_crop(height: int, width: int) -> Tuple[slice, slice]:
+    """Returns the slices cropping a patch to the closest power of 2 size,
+    around its center."""
+
+    # Find the closest power of 2 length from the image
+    height_log2 = 2 ** int(np.log2(height + 0.5))
+    width_log2 = 2 ** int(np.log2(width + 0.5))
+
+    return (slice((height - height_log2) // 2, (height + height_log2) // 2),
+            slice((width - width_log2) // 2, (width + width_log2) // 2))
+
+  def _cross_correlation(self,
+                         index: int,
                          img1: np.ndarray) -> Tuple[np.ndarray, int, int]:
     """Performs a cross-correlation operation on two patches in the Fourier
     domain.
 
+    The spectrum of the reference patch is cached, only the one of the current
+    patch is computed, in a preallocated buffer.
+
     Returns:
       The result of the correlation in the real domain as an image, as well as
       the position of the maximum of this image.
     """
 
-    # Getting the size of the image
-    height, width = img0.shape[0], img0.shape[1]
-
-    # Find the closest power of 2 length from the image
-    height_log2 = 2 ** int(np.log2(height + 0.5))
-    width_log2 = 2 ** int(np.log2(width + 0.5))
-
     # Cropping the image to a power of 2
-    img0 = img0[(height - height_log2) // 2: (height + height_log2) // 2,
-                (width - width_log2) // 2: (width + width_log2) // 2]
-    img1 = img1[(height - height_log2) // 2: (height + height_log2) // 2,
-                (width - width_log2) // 2: (width + width_log2) // 2]
+    buffer = self._buffers[index]
+    np.copyto(buffer, img1[self._crops[index]], casting='unsafe')
 
     # Convert to Fourier for fast cross-correlation
-    img0_fourier = cv2.dft(img0.astype(np.float32),
-                           flags=cv2.DFT_COMPLEX_OUTPUT)
-    img1_fourier = cv2.dft(img1.astype(np.float32),
-                           flags=cv2.DFT_COMPLEX_OUTPUT)
+    img1_fourier = cv2.dft(buffer, flags=cv2.DFT_COMPLEX_OUTPUT)
 
     # Compute cross-correlation by convolution
-    cross_fourier = cv2.mulSpectrums(img0_fourier, img1_fourier,
+    cross_fourier = cv2.mulSpectrums(self._ref_spectra[index], img1_fourier,
                                      flags=0, conjB=True)
 
     # Convert back to physical space
@@ -282,12 +360,12 @@ class DISVE:
   def _get_patch(img: np.ndarray,
                  patch: Tuple[int, int, int, int],
                  offset: Tuple[int, int] = (0, 0)) -> np.ndarray:
-    """Returns the part of the image corresponding to the given patch at the
-    given offset."""
+    """Returns a view on the part of the image corresponding to the given patch
+    at the given offset."""
 
     (y_min, x_min, height, width), (y_offset, x_offset) = patch, offset
-    return np.array(img[y_min + y_offset:y_min + height + y_offset,
-                        x_min + x_offset:x_min + width + x_offset])
+    return img[y_min + y_offset:y_min + height + y_offset,
+               x_min + x_offset:x_min + width + x_offset]
 
   def _trim_patch(self, patch: np.ndarray) -> np.ndarray:
     """Trims the border of a patch according to the value set by the user, and
@@ -3,7 +3,8 @@
 """More documentation coming soon !"""
 
 import numpy as np
-from typing import Union
+from functools import lru_cache
+from typing import Union, Tuple
 from .._global import OptionalModule
 
 try:
@@ -144,19 +145,109 @@ class OrthoProjector(Projector):
     Projector.__init__(self, new_base)
 
 
+@lru_cache(maxsize=8)
+def _flat_base(fields: tuple,
+               h: int,
+               w: int,
+               lstsq: bool) -> Tuple[np.ndarray, np.ndarray, bool]:
+  """Returns the flattened base of the given fields, the matrix projecting a
+  flattened flow on it, and whether the base is orthogonal.
+
+  The result is cached, as it only depends on the fields and on the shape.
+  """
+
+  return _make_flat_base(get_fields(list(fields), h, w), lstsq)
+
+
+def _make_flat_base(fields: np.ndarray,
+                    lstsq: bool) -> Tuple[np.ndarray, np.ndarray, bool]:
+  """Flattens a base as returned by :func:`get_fields` to an array of shape
+  (n fields, 2 * h * w), and computes the matrix projecting a flow on it.
+
+  By default, each field is projected independently like :class:`Projector`
+  does. If ``lstsq`` is :obj:`True`, the pseudo-inverse of the base is used
+  instead.
+  """
+
+  base = np.ascontiguousarray(fields.reshape(-1, fields.shape[3]).T)
+  gram = np.dot(base, base.T).astype(np.float64)
+  off_diag = np.abs(gram - np.diag(np.diag(gram)))
+  orthogonal = off_diag.max(initial=0) / base.shape[1] <= 1e-4
+  if lstsq:
+    # The pseudo-inverse of the Gram matrix orthonormalizes the base, and also
+    # handles the bases that are not linearly independent
+    proj = np.dot(np.linalg.pinv(gram, 1e-6, hermitian=True).astype(
+      np.float32), base)
+  else:
+    proj = base / np.diag(gram).astype(np.float32)[:, np.newaxis]
+  base.setflags(write=False)
+  proj.setflags(write=False)
+  return base, proj, orthogonal
+
+
+class FlatProjector:
+  """Decomposes a flow on a base of fields.
+
+  The base is flattened and the projection matrix is computed once, and cached
+  for all the instances sharing the same fields and shape. Projecting a flow
+  is then a single matrix-vector product, performed in preallocated buffers.
+
+  By default, the values are the same as with :class:`Projector`, i.e. the
+  flow is projected on each field independently. If ``lstsq`` is :obj:`True`,
+  the flow is decomposed on the base in the least-squares sense instead, which
+  only gives different values if the base is not orthogonal.
+  """
+
+  def __init__(self,
+               fields: list,
+               h: int,
+               w: int,
+               lstsq: bool = False) -> None:
+    self.h = h
+    self.w = w
+    if all(isinstance(field, str) for field in fields):
+      self.base, self.proj, orthogonal = _flat_base(tuple(fields), h, w,
+                                                    lstsq)
+    else:
+      self.base, self.proj, orthogonal = _make_flat_base(
+        get_fields(fields, h, w), lstsq)
+    if not orthogonal and not lstsq:
+      print("WARNING, base does not seem orthogonal!")
+    self._flow = np.empty(2 * h * w, dtype=np.float32)
+    self._scal = np.empty(len(fields), dtype=np.float32)
+
+  def get_scal(self, flow: np.ndarray) -> list:
+    np.copyto(self._flow.reshape(self.h, self.w, 2), flow, casting='unsafe')
+    np.dot(self.proj, self._flow, out=self._scal)
+    return self._scal.tolist()
+
+  def get_full(self, flow: np.ndarray) -> np.ndarray:
+    return np.dot(self.get_scal(flow), self.base).reshape(self.h, self.w, 2)
+
+
 def avg_ampl(f: np.ndarray) -> float:
   return (np.sum(f[:, :, 0] ** 2 + f[:, :, 1] ** 2) / f.size * 2) ** .5
 
 
+@lru_cache(maxsize=4)
+def _meshgrid(h: int, w: int) -> Tuple[np.ndarray, np.ndarray]:
+  """Returns the cached pixel coordinates of an image of the given shape."""
+
+  x, y = np.meshgrid(np.arange(w, dtype=np.float32),
+                     np.arange(h, dtype=np.float32))
+  x.setflags(write=False)
+  y.setflags(write=False)
+  return x, y
+
+
 def remap(a: np.ndarray, r: np.ndarray) -> np.ndarray:
   """Remaps `a` using given `r` the displacement as a result from
   correlation."""
 
-  imy, imx = a.shape
-  x, y = np.meshgrid(range(imx), range(imy))
+  x, y = _meshgrid(*a.shape)
   return cv2.remap(a.astype(np.float32),
-                   (x + r[:, :, 0]).astype(np.float32),
-                   (y + r[:, :, 1]).astype(np.float32), 1)
+                   np.add(x, r[:, :, 0], dtype=np.float32),
+                   np.add(y, r[:, :, 1], dtype=np.float32), 1)
 
 
 def get_res(a: np.ndarray, b: np.ndarray, r: np.ndarray) -> np.ndarray:
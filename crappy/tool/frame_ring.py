@@ -0,0 +1,112 @@
+# coding: utf-8
+
+from typing import Optional, List, Tuple
+import numpy as np
+
+
+class Frame_ring:
+  """A preallocated in-memory ring buffer holding the latest frames acquired by
+  a camera, along with their timestamps.
+
+  It is meant for keeping the frames preceding an event (e.g. the failure of a
+  sample) without having to save every single frame to the disk. The memory
+  used by the buffer is capped, and all the memory is allocated once when the
+  first frame is received.
+  """
+
+  def __init__(self,
+               max_memory: float = 512,
+               max_frames: Optional[int] = None) -> None:
+    """Sets the args.
+
+    Args:
+      max_memory: The maximum memory the buffer can use, in MB.
+      max_frames: If given, the buffer won't hold more than this number of
+        frames even if the memory cap allows it.
+    """
+
+    self._max_memory = max_memory * 2 ** 20
+    self._max_frames = max_frames
+    self._frames = None
+    self._times = None
+    self._index = 0
+    self._count = 0
+
+  @property
+  def allocated(self) -> bool:
+    """:obj:`True` once the memory of the buffer has been allocated."""
+
+    return self._frames is not None
+
+  @property
+  def capacity(self) -> int:
+    """The number of frames the buffer can hold."""
+
+    return 0 if self._frames is None else self._frames.shape[0]
+
+  @property
+  def memory(self) -> int:
+    """The memory currently allocated for the frames, in bytes."""
+
+    return 0 if self._frames is None else self._frames.nbytes
+
+  def __len__(self) -> int:
+    return self._count
+
+  def allocate(self, img: np.ndarray) -> None:
+    """Allocates the memory of the buffer according to the shape and type of
+    the given frame."""
+
+    capacity = int(self._max_memory // img.nbytes)
+    if self._max_frames is not None:
+      capacity = min(capacity, self._max_frames)
+    if capacity < 1:
+      raise MemoryError(f"Cannot fit a single frame of {img.nbytes} bytes in "
+                        f"the {self._max_memory} bytes allowed for the ring "
+                        f"buffer")
+    self._frames = np.empty((capacity, *img.shape), dtype=img.dtype)
+    self._times = np.full(capacity, np.nan)
+    self._index = 0
+    self._count = 0
+
+  def put(self, t: float, img: np.ndarray) -> None:
+    """Copies a frame into the buffer, overwriting the oldest one if the buffer
+    is full."""
+
+    if self._frames is None:
+      self.allocate(img)
+    np.copyto(self._frames[self._index], img)
+    self._times[self._index] = t
+    self._index = (self._index + 1) % self.capacity
+    self._count = min(self._count + 1, self.capacity)
+
+  def clear(self) -> None:
+    """Forgets all the frames, without freeing the memory."""
+
+    if self._times is not None:
+      self._times[:] = np.nan
+    self._index = 0
+    self._count = 0
+
+  def oldest(self) -> float:
+    """Returns the timestamp of the oldest frame in the buffer."""
+
+    if not self._count:
+      return np.nan
+    return self._times[(self._index - self._count) % self.capacity]
+
+  def get_window(self,
+                 t_min: float = -np.inf,
+                 t_max: float = np.inf) -> List[Tuple[float, np.ndarray]]:
+    """Returns the frames whose timestamps lie between ``t_min`` and ``t_max``,
+    in chronological order.
+
+    Note:
+      The returned arrays are views on the buffer, they are only valid until
+      the corresponding slots are overwritten.
+    """
+
+    indexes = (np.arange(self._index - self._count, self._index) %
+               self.capacity) if self._count else []
+    return [(self._times[i], self._frames[i]) for i in indexes
+            if t_min <= self._times[i] <= t_max]
@@ -41,13 +41,22 @@ def interp_nearest(ary: np.ndarray, ny: int, nx: int) -> np.ndarray:
   if ary.shape == (ny, nx):
     return ary
   y, x = ary.shape
-  rx = x / nx
-  ry = y / ny
-  out = np.empty((ny, nx), dtype=np.float32)
-  for j in range(ny):
-    for i in range(nx):
-      out[j, i] = ary[int(ry * j + .5), int(rx * i + .5)]
-  return out
+  rows = (y / ny * np.arange(ny) + .5).astype(int)
+  cols = (x / nx * np.arange(nx) + .5).astype(int)
+  return ary[np.ix_(rows, cols)].astype(np.float32)
+
+
+def cuda_available() -> bool:
+  """Returns :obj:`True` if PyCUDA is installed and a CUDA device is
+  available."""
+
+  if isinstance(cuda, OptionalModule):
+    return False
+  try:
+    cuda.init()
+    return cuda.Device.count() > 0
+  except Exception:
+    return False
 
 
 # =======================================================================#
@@ -0,0 +1,159 @@
+# coding: utf-8
+
+from typing import Optional, Tuple, Union, List
+import numpy as np
+
+
+class Pixel_correction:
+  """Corrects the raw frames of a camera, typically a thermal one.
+
+  The offset and flat-field (gain) corrections are applied first, then the
+  dead pixels are replaced by the median of their valid neighbours.
+
+  All the indexes needed for the dead pixels replacement are computed once
+  when the dead pixels are set, and the intermediate buffers are preallocated,
+  so that correcting a frame only involves a few vectorized operations.
+  """
+
+  def __init__(self,
+               shape: Tuple[int, int],
+               dead_pixels: Optional[Union[np.ndarray, List[tuple]]] = None,
+               offset: Optional[np.ndarray] = None,
+               gain: Optional[np.ndarray] = None) -> None:
+    """Sets the args.
+
+    Args:
+      shape: The shape of the frames to correct, as ``(height, width)``.
+      dead_pixels: The dead pixels, either as a boolean mask of the same shape
+        as the frames or as a :obj:`list` of ``(y, x)`` coordinates.
+      offset: An array subtracted from every frame, e.g. a dark frame.
+      gain: An array every frame is multiplied with after subtracting the
+        offset, for flat-field correction.
+    """
+
+    self._shape = tuple(shape)
+    self._dead = None
+    self._neighbours = None
+    self._offset = None
+    self._gain = None
+    self._padded = np.full(self._shape[0] * self._shape[1] + 1, np.nan,
+                           dtype=np.float32)
+    self._float = np.empty(self._shape, dtype=np.float32)
+
+    self.set_dead_pixels(dead_pixels)
+    self.set_offset(offset)
+    self.set_gain(gain)
+
+  def set_dead_pixels(self,
+                      dead_pixels: Optional[Union[np.ndarray,
+                                                  List[tuple]]]) -> None:
+    """Sets the dead pixels and precomputes the indexes of their neighbours.
+
+    For each dead pixel, the flat indexes of its 8 neighbours are stored. The
+    neighbours lying outside the frame or being dead themselves point to a
+    sentinel `NaN` value, so that they are ignored when computing the median.
+    """
+
+    if dead_pixels is None or not len(dead_pixels):
+      self._dead = None
+      self._neighbours = None
+      return
+
+    height, width = self._shape
+    mask = np.zeros(self._shape, dtype=bool)
+    if isinstance(dead_pixels, np.ndarray) and dead_pixels.dtype == bool:
+      mask[:] = dead_pixels
+    else:
+      y, x = np.asarray(dead_pixels, dtype=np.intp).reshape(-1, 2).T
+      mask[y, x] = True
+
+    y, x = np.nonzero(mask)
+    self._dead = y * width + x
+    self._dead_yx = y, x
+
+    # The offsets of the 8 neighbours of a pixel
+    dy, dx = np.meshgrid([-1, 0, 1], [-1, 0, 1], indexing='ij')
+    dy, dx = dy.ravel(), dx.ravel()
+    keep = (dy != 0) | (dx != 0)
+    dy, dx = dy[keep], dx[keep]
+
+    ny, nx = y[:, np.newaxis] + dy, x[:, np.newaxis] + dx
+    valid = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+    ny, nx = np.clip(ny, 0, height - 1), np.clip(nx, 0, width - 1)
+    valid &= ~mask[ny, nx]
+
+    # Invalid neighbours point to the NaN sentinel at the end of the buffer
+    self._neighbours = np.where(valid, ny * width + nx, height * width)
+    self._gathered = np.empty(self._neighbours.shape, dtype=np.float32)
+
+    # Index of the median among the valid values once sorted
+    count = valid.sum(axis=1)
+    self._rows = np.arange(len(self._dead))
+    self._low = np.maximum(count - 1, 0) // 2
+    self._high = count // 2
+    self._isolated = count == 0
+
+  def set_offset(self, offset: Optional[np.ndarray]) -> None:
+    """Sets the array to subtract from every frame."""
+
+    self._offset = None if offset is None else np.asarray(offset)
+
+  def set_gain(self, gain: Optional[np.ndarray]) -> None:
+    """Sets the flat-field array every frame is multiplied with."""
+
+    self._gain = None if gain is None else np.asarray(gain, dtype=np.float32)
+
+  def _copy_float(self, out: np.ndarray) -> None:
+    """Copies the float buffer to the output frame, rounded and clipped to the
+    range of its type if it is an integer one."""
+
+    if np.issubdtype(out.dtype, np.integer):
+      info = np.iinfo(out.dtype)
+      np.clip(self._float, info.min, info.max, out=self._float)
+      np.rint(self._float, out=self._float)
+    np.copyto(out, self._float, casting='unsafe')
+
+  def correct(self,
+              img: np.ndarray,
+              out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Returns the corrected frame.
+
+    Args:
+      img: The frame to correct, it is not modified.
+      out: If given, the corrected frame is written in this array. Otherwise,
+        a new array with the same type as ``img`` is returned.
+    """
+
+    if out is None:
+      out = np.empty(self._shape, dtype=img.dtype)
+
+    # Offset correction, keeping the type of the input
+    if self._offset is not None:
+      if np.issubdtype(out.dtype, np.integer):
+        # Computed as floats to saturate instead of wrapping around
+        np.subtract(img, self._offset, out=self._float, casting='unsafe')
+        self._copy_float(out)
+      else:
+        np.subtract(img, self._offset, out=out, casting='unsafe')
+    elif out is not img:
+      np.copyto(out, img)
+
+    # Flat-field correction
+    if self._gain is not None:
+      np.multiply(out, self._gain, out=self._float, casting='unsafe')
+      self._copy_float(out)
+
+    # Dead pixels replacement
+    if self._dead is not None:
+      self._padded[:-1] = out.ravel()
+      np.take(self._padded, self._neighbours, out=self._gathered)
+      # The NaN values are sorted last
+      self._gathered.sort(axis=1)
+      median = (self._gathered[self._rows, self._low] +
+                self._gathered[self._rows, self._high]) / 2
+      median[self._isolated] = self._padded[self._dead[self._isolated]]
+      if np.issubdtype(out.dtype, np.integer):
+        median = np.rint(median)
+      out[self._dead_yx] = median
+
+    return out
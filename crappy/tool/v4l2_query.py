@@ -0,0 +1,117 @@
+# coding: utf-8
+
+from subprocess import run
+from re import findall, search, split, MULTILINE
+from typing import Callable, Optional, Union, Dict, List, Any
+
+
+class V4L2_query:
+  """Queries the settings of a video device using `v4l2-ctl`, and caches the
+  result.
+
+  All the information needed by the cameras (available formats, current format
+  and controls) is retrieved in a single call to `v4l2-ctl`, instead of one
+  call per getter. The result is kept until :meth:`invalidate` is called,
+  which should be done every time a setting is modified on the device.
+
+  Note:
+    Only works on Linux, with `v4l-utils` installed.
+  """
+
+  def __init__(self,
+               device: Optional[Union[int, str]] = None,
+               runner: Callable = run) -> None:
+    """Sets the args.
+
+    Args:
+      device: The video device to query, either as an index or as a path like
+        `/dev/video0`. If :obj:`None`, the default device is queried.
+      runner: The function used for running the command, with the same
+        signature as :func:`subprocess.run`. Mostly meant for testing.
+    """
+
+    self._device = device
+    self._runner = runner
+    self._output = None
+    self.available = True
+
+  def invalidate(self) -> None:
+    """Discards the cached information, it will be queried again on the next
+    call to one of the getters."""
+
+    self._output = None
+
+  def query(self) -> str:
+    """Returns the output of `v4l2-ctl --all --list-formats-ext`, running the
+    command only if no valid cached value exists."""
+
+    if self._output is None:
+      command = ['v4l2-ctl'] if self._device is None else \
+          ['v4l2-ctl', '-d', str(self._device)]
+      command += ['--all', '--list-formats-ext']
+      try:
+        self._output = self._runner(command, capture_output=True,
+                                    text=True).stdout
+      except FileNotFoundError:
+        self.available = False
+        self._output = ''
+    return self._output
+
+  def formats(self) -> List[str]:
+    """Returns the available formats, as strings containing the name of the
+    encoding and the image size, e.g. `'MJPG 640x480'`."""
+
+    check = self.query()
+    if 'VIDIOC_ENUM_FMT' in check:
+      check = check.split('VIDIOC_ENUM_FMT', 1)[1]
+
+    # Splitting the returned string to isolate each encoding
+    if findall(r'\[\d+]', check):
+      check = split(r'\[\d+]', check)[1:]
+    elif findall(r'Pixel\sFormat', check):
+      check = split(r'Pixel\sFormat', check)[1:]
+    else:
+      check = []
+
+    formats = []
+    for img_format in check:
+      names = findall(r"'\w+'", img_format)
+      if not names:
+        continue
+      # For each encoding, finding its name and the available sizes
+      name = names[0].replace("'", '')
+      formats.extend(f'{name} {size}' for size in
+                     findall(r'Size:\s+\w+\s+(\d+x\d+)', img_format))
+    return formats
+
+  def current_format(self) -> Optional[str]:
+    """Returns the current format as a string containing the name of the
+    encoding and the image size, or :obj:`None` if it cannot be read."""
+
+    match = search(r"Width/Height\s*:\s*(\d+)/(\d+)\s*\n"
+                   r"\s*Pixel Format\s*:\s*'(\w+)'", self.query())
+    if match is None:
+      return
+    width, height, name = match.groups()
+    return f'{name} {width}x{height}'
+
+  def controls(self) -> Dict[str, Dict[str, Any]]:
+    """Returns the controls of the device.
+
+    Each control is a :obj:`dict` containing its type, and the integer values
+    given by `v4l2-ctl` (e.g. `'min'`, `'max'`, `'default'`, `'value'`).
+    """
+
+    controls = {}
+    for name, type_, values in findall(
+        r'^\s*(\w+)\s+0x[0-9A-Fa-f]+\s+\((\w+)\)\s*:(.*)$', self.query(),
+        MULTILINE):
+      controls[name] = {'type': type_}
+      controls[name].update({key: int(val) for key, val in
+                             findall(r'(\w+)=(-?\d+)', values)})
+    return controls
+
+  def control(self, name: str) -> Optional[Dict[str, Any]]:
+    """Returns the given control, or :obj:`None` if it doesn't exist."""
+
+    return self.controls().get(name)
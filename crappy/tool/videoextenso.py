@@ -1,8 +1,7 @@
 # coding: utf-8
 
-from multiprocessing import Process, Pipe
-from multiprocessing.connection import Connection
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Sequence
 import numpy as np
 from .._global import OptionalModule
 
@@ -12,36 +11,46 @@ except (ModuleNotFoundError, ImportError):
   cv2 = OptionalModule("opencv-python")
 try:
   from skimage.filters import threshold_otsu
-  from skimage.morphology import label
-  from skimage.measure import regionprops
 except (ModuleNotFoundError, ImportError):
-  label = OptionalModule("skimage", "Please install scikit-image to use"
-                         "Video-extenso")
-  threshold_otsu = regionprops = label
+  threshold_otsu = OptionalModule("skimage", "Please install scikit-image to "
+                                  "use Video-extenso")
 
 
 class LostSpotError(Exception):
   pass
 
 
-def overlapping(box1: np.ndarray, box2: np.ndarray) -> bool:
-  """Returns :obj:`True` if `box1` and `box2` are overlapping or included in
-  each other"""
+def overlapping(box1: Sequence[int],
+                boxes: Sequence) -> Union[bool, np.ndarray]:
+  """Returns :obj:`True` if `box1` and `boxes` are overlapping or included in
+  each other.
+
+  `boxes` can either be a single box, or a sequence of boxes in which case an
+  array containing the result for each box is returned.
+  """
+
+  b1 = np.asarray(box1)
+  b2 = np.atleast_2d(np.asarray(boxes))
+  if not b2.size:
+    return np.zeros(0, dtype=bool)
+  y_min, x_min, y_max, x_max = b2.T
+
+  # A horizontal or vertical edge of box1 crosses box2
+  y_in = ((y_min[:, np.newaxis] < b1[[0, 2]]) &
+          (b1[[0, 2]] < y_max[:, np.newaxis])).any(axis=1)
+  x_in = ((x_min[:, np.newaxis] < b1[[1, 3]]) &
+          (b1[[1, 3]] < x_max[:, np.newaxis])).any(axis=1)
+  y_apart = (b1[2] <= y_min) | (y_max <= b1[0])
+  x_apart = (b1[3] <= x_min) | (x_max <= b1[1])
 
-  for i in box1[::2]:
-    if box2[0] < i < box2[2]:
-      if not (box1[3] <= box2[1] or box2[3] <= box1[1]):
-        return True
-  for i in box1[1::2]:
-    if box2[1] < i < box2[3]:
-      if not (box1[2] <= box2[0] or box2[2] <= box1[0]):
-        return True
   # Inclusion
-  for b1, b2 in ((box1, box2), (box2, box1)):
-    if (b1[0] <= b2[0] <= b2[2] <= b1[2]) and \
-         (b1[1] <= b2[1] <= b2[3] <= b1[3]):
-      return True
-  return False
+  in_1 = ((b1[0] <= y_min) & (y_min <= y_max) & (y_max <= b1[2]) &
+          (b1[1] <= x_min) & (x_min <= x_max) & (x_max <= b1[3]))
+  in_2 = ((y_min <= b1[0]) & (b1[0] <= b1[2]) & (b1[2] <= y_max) &
+          (x_min <= b1[1]) & (b1[1] <= b1[3]) & (b1[3] <= x_max))
+
+  ret = (y_in & ~x_apart) | (x_in & ~y_apart) | in_1 | in_2
+  return bool(ret[0]) if np.ndim(boxes) == 1 else ret
 
 
 class Video_extenso:
@@ -126,48 +135,54 @@ class Video_extenso:
       bw = img <= self.thresh
     # bw = dilation(bw,np.ones((3, 3), dtype=img.dtype))
     # bw = erosion(bw,np.ones((3, 3), dtype=img.dtype))
-    bw = label(bw)
-    # Is it really useful?
-    # bw[0, :] = bw[-1, :] = bw[:, 0] = bw[:, -1] = -1
-    reg_prop = regionprops(bw)
-    # Remove the regions that are clearly not spots
-    reg_prop = [r for r in reg_prop if r.solidity > .8]
-    # Remove the too small regions (150 is reeally tiny)
-    reg_prop = [r for r in reg_prop if r.area > self.min_area]
-    reg_prop = sorted(reg_prop, key=lambda r: r.area, reverse=True)
+    n, labels, stats, centroids = cv2.connectedComponentsWithStats(
+      bw.astype(np.uint8), connectivity=8)
+    # The label 0 is the background
+    regions = []
+    for i in range(1, n):
+      x, y, w, h, area = stats[i]
+      # Remove the too small regions (150 is reeally tiny)
+      if area <= self.min_area:
+        continue
+      # Remove the regions that are clearly not spots
+      if area / self._convex_area(labels[y:y + h, x:x + w] == i) <= .8:
+        continue
+      regions.append({'area': area,
+                      'centroid': (centroids[i][1], centroids[i][0]),
+                      'bbox': (y, x, y + h, x + w)})
+    regions = sorted(regions, key=lambda r: r['area'], reverse=True)
     i = 0
-    while i < len(reg_prop) - 1:
-      r1 = reg_prop[i]
-      for j in range(i + 1, len(reg_prop)):
-        r2 = reg_prop[j]
-        if overlapping(r1['bbox'], r2['bbox']):
-          print("Overlap")
-          if r1.area > r2.area:
-            del reg_prop[j]
-          else:
-            del reg_prop[i]
-          i -= 1
-          break
+    while i < len(regions) - 1:
+      r1 = regions[i]
+      overlaps = overlapping(r1['bbox'], [r['bbox'] for r in regions[i + 1:]])
+      if overlaps.any():
+        print("Overlap")
+        j = i + 1 + int(np.argmax(overlaps))
+        if r1['area'] > regions[j]['area']:
+          del regions[j]
+        else:
+          del regions[i]
+        i -= 1
       i += 1
     if self.num_spots == 'auto':
       # Remove the smallest region until we have a valid number
       # and all of them are larger than "min_area" pix
-      while len(reg_prop) not in [0, 2, 3, 4]:
-        del reg_prop[-1]
-      if len(reg_prop) == 0:
+      while len(regions) not in [0, 2, 3, 4]:
+        del regions[-1]
+      if len(regions) == 0:
         print("Not spots found!")
         return
     else:
-      if len(reg_prop) < self.num_spots:
-        print("Found only", len(reg_prop),
+      if len(regions) < self.num_spots:
+        print("Found only", len(regions),
               "spots when expecting", self.num_spots)
         return
-      reg_prop = reg_prop[:self.num_spots]  # Keep the largest ones
-    print("Detected", len(reg_prop), "spots")
+      regions = regions[:self.num_spots]  # Keep the largest ones
+    print("Detected", len(regions), "spots")
     self.spot_list = []
-    for r in reg_prop:
+    for r in regions:
       d = {}
-      y, x = r.centroid
+      y, x = r['centroid']
       d['y'] = oy + y
       d['x'] = ox + x
       # l1 = r.major_axis_length
@@ -178,10 +193,22 @@ class Video_extenso:
       # d['bbox'] = d['y'] - ly,d['x'] - lx,d['y'] + ly,d['x'] + lx
       # d['bbox'] = d['min_col'], d['min_row'], d['max_col'], d['max_row']
       # d['bbox'] = tuple([int(i + .5) for i in d['bbox']])
-      d['bbox'] = tuple([r['bbox'][i] + (oy, ox)[i % 2] for i in range(4)])
+      d['bbox'] = tuple([int(r['bbox'][i]) + (oy, ox)[i % 2]
+                         for i in range(4)])
       self.spot_list.append(d)
     print(self.spot_list)
 
+  @staticmethod
+  def _convex_area(mask: np.ndarray) -> int:
+    """Returns the number of pixels in the convex hull of a binary mask."""
+
+    contours, _ = cv2.findContours(mask.astype(np.uint8), cv2.RETR_EXTERNAL,
+                                   cv2.CHAIN_APPROX_SIMPLE)
+    hull = cv2.convexHull(np.concatenate(contours))
+    convex = np.zeros(mask.shape, dtype=np.uint8)
+    cv2.fillConvexPoly(convex, hull, 1)
+    return max(int(np.count_nonzero(convex)), 1)
+
   def save_length(self) -> None:
     if not hasattr(self, "spot_list"):
       print("You must select the spots first!")
@@ -204,19 +231,19 @@ class Video_extenso:
     return s1, s2
 
   def start_tracking(self) -> None:
-    """Will spawn a process per spot, which goal is to track the spot and
-    send the new coordinate after each update."""
-
-    self.tracker = []
-    self.pipe = []
-    for _ in self.spot_list:
-      i, o = Pipe()
-      self.pipe.append(i)
-      self.tracker.append(Tracker(o, white_spots=self.white_spots,
-                                  thresh='auto' if self.update_thresh
-                                  else self.thresh,
-                                  safe_mode=self.safe_mode, blur=self.blur))
-      self.tracker[-1].start()
+    """Creates a tracker per spot, and a pool of threads for running them in
+    parallel.
+
+    The trackers read their window directly in the acquired image, so no copy
+    of the image is made.
+    """
+
+    self.tracker = [Tracker(white_spots=self.white_spots,
+                            thresh='auto' if self.update_thresh
+                            else self.thresh,
+                            safe_mode=self.safe_mode, blur=self.blur)
+                    for _ in self.spot_list]
+    self.pool = ThreadPoolExecutor(max_workers=len(self.tracker))
 
   def get_def(self, img: np.ndarray) -> list:
     """The "heart" of the videoextenso.
@@ -227,22 +254,20 @@ class Video_extenso:
     if not hasattr(self, "l0x"):
       print("L0 not saved, saving it now.")
       self.save_length()
-    for p, s in zip(self.pipe, self.spot_list):
+    futures = []
+    for tracker, s in zip(self.tracker, self.spot_list):
       win = self.enlarged_window(s['bbox'], img.shape)
-      # print("DEBUG: win is", s['bbox'], "sending", win)
-      p.send(((win[0].start, win[1].start), img[win]))
+      futures.append(self.pool.submit(tracker.track,
+                                      (win[0].start, win[1].start), img[win]))
+    try:
+      results = [future.result() for future in futures]
+    except LostSpotError as err:
+      self.stop_tracking()
+      raise LostSpotError("Tracker returned " + str(err))
     ol = False
-    for p, s in zip(self.pipe, self.spot_list):
-      r = p.recv()
-      if isinstance(r, str):
-        self.stop_tracking()
-        raise LostSpotError("Tracker returned"+r)
-      lst = list(self.spot_list)
-      lst.remove(s)
-      # Please excuse me for the following line,
-      # understand: "if this box overlaps any existing box"
-      if any([overlapping(a_b[0], a_b[1]['bbox'])
-             for a_b in zip([r['bbox']] * len(lst), lst)]):
+    for i, (r, s) in enumerate(zip(results, self.spot_list)):
+      others = [o['bbox'] for j, o in enumerate(self.spot_list) if j != i]
+      if overlapping(r['bbox'], others).any():
         if self.safe_mode:
           print("Overlapping!")
           self.stop_tracking()
@@ -255,7 +280,6 @@ class Video_extenso:
                      max(s['bbox'][3] - 1, int(s['x']) + 2))
         continue
       s.update(r)
-      # print("DEBUG updating spot to", s)
     if ol:
       self.consecutive_overlaps += 1
       if self.consecutive_overlaps >= 10:
@@ -269,22 +293,24 @@ class Video_extenso:
     exx = (max(x) - min(x)) / self.l0x - 1
     return [100 * eyy, 100 * exx]
 
-  def stop_tracking(self):
-    for p in self.pipe:
-      p.send(("", "stop"))
+  def stop_tracking(self) -> None:
+    if getattr(self, "pool", None) is not None:
+      self.pool.shutdown()
+      self.pool = None
+
 
+class Tracker:
+  """Tracks a spot for videoextensometry.
 
-class Tracker(Process):
-  """Process tracking a spot for videoextensometry."""
+  Each tracker is called from a thread of the pool of :class:`Video_extenso`,
+  with a view on the window of the image around its spot.
+  """
 
   def __init__(self,
-               pipe: Connection,
                white_spots: bool = False,
                thresh: str = 'auto',
                safe_mode: bool = True,
-               blur: float = 0):
-    Process.__init__(self)
-    self.pipe = pipe
+               blur: float = 0) -> None:
     self.white_spots = white_spots
     self.safe_mode = safe_mode
     self.blur = blur
@@ -295,34 +321,32 @@ class Tracker(Process):
       self.auto_thresh = False
       self.thresh = thresh
 
-  def run(self) -> None:
-    # print("DEBUG: process starting, thresh=", self.thresh)
-    while True:
-      try:
-        offset, img = self.pipe.recv()
-      except KeyboardInterrupt:
-        break
-      if type(img) != np.ndarray:
-        break
-      oy, ox = offset
-      try:
-        r = self.evaluate(img)
-      except Exception:
-        raise LostSpotError
+  def track(self, offset: tuple, img: np.ndarray) -> dict:
+    """Returns the new position and bounding box of the spot in the full image,
+    given the window around the spot and its offset.
+
+    Raises:
+      LostSpotError: If the spot could not be found.
+    """
+
+    oy, ox = offset
+    try:
+      r = self.evaluate(img)
+    except LostSpotError:
+      raise
+    except Exception as exc:
+      raise LostSpotError("Could not evaluate the spot") from exc
+    if not isinstance(r, dict):
+      r = self.fallback(img)
       if not isinstance(r, dict):
-        r = self.fallback(img)
-        if not isinstance(r, dict):
-          raise LostSpotError
-      else:
-        self.fallback_mode = False
-      r['y'] += oy
-      r['x'] += ox
-      miny, minx, maxy, maxx = r['bbox']
-      # print("DEBUG: bbox=", r['bbox'])
-      r['bbox'] = miny + oy, minx + ox, maxy + oy, maxx + ox
-      # print("DEBUG: new bbox=", r['bbox'])
-      self.pipe.send(r)
-    # print("DEBUG: Process terminating")
+        raise LostSpotError("Fallback failed")
+    else:
+      self.fallback_mode = False
+    r['y'] += oy
+    r['x'] += ox
+    miny, minx, maxy, maxx = r['bbox']
+    r['bbox'] = miny + oy, minx + ox, maxy + oy, maxx + ox
+    return r
 
   def evaluate(self, img: np.ndarray) -> Union[dict, int]:
     if self.blur and self.blur > 1:
@@ -358,12 +382,10 @@ class Tracker(Process):
     """Called when the spots are lost."""
 
     if self.safe_mode or self.fallback_mode:
-      if self.fallback_mode:
-        self.pipe.send("Fallback failed")
-      else:
-        self.pipe.send("[safe mode] Could not compute barycenter")
-      self.fallback_mode = False
-      return -1
+      fallback_mode, self.fallback_mode = self.fallback_mode, False
+      if fallback_mode:
+        raise LostSpotError("Fallback failed")
+      raise LostSpotError("[safe mode] Could not compute barycenter")
     self.fallback_mode = True
     print("Loosing spot! Trying to reevaluate threshold...")
     self.thresh = threshold_otsu(img)
@@ -147,7 +147,8 @@ setup(
                             'Pillow>=8.0.0',
                             'matplotlib>=3.3.0',
                             'SimpleITK>=2.0.0',
-                            'scikit-image>=0.18.0'],
+                            'scikit-image>=0.18.0',
+                            'threadpoolctl>=2.0'],
                   'hardware': ['pyusb>=1.1.0',
                                'pyserial>=3.4',
                                'pyyaml>=5.3'],
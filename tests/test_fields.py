@@ -0,0 +1,49 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+from crappy.tool.fields import FlatProjector, Projector, get_fields
+
+# Not an orthogonal base, z is a combination of exx and eyy
+FIELDS = ['x', 'y', 'exx', 'eyy', 'r', 'z']
+H, W = 60, 80
+# The values returned by Projector for the flow below
+EXPECTED = [0.39375, -0.169936, 0.1975, 0.098333, 0.013758, 0.161609]
+
+
+@pytest.fixture
+def flow() -> np.ndarray:
+  y, x = np.mgrid[0:H, 0:W].astype(np.float32)
+  return np.stack([.3 + .002 * x + .0005 * y,
+                   -.2 + .001 * y + .01 * np.sin(x / 7)],
+                  axis=2).astype(np.float32)
+
+
+def test_projector_values(flow: np.ndarray) -> None:
+  scal = Projector(get_fields(FIELDS, H, W),
+                   check_orthogonality=False).get_scal(flow)
+  assert np.allclose(scal, EXPECTED, atol=1e-5)
+
+
+def test_flat_projector_keeps_projector_values(flow: np.ndarray) -> None:
+  assert np.allclose(FlatProjector(FIELDS, H, W).get_scal(flow), EXPECTED,
+                     atol=1e-5)
+
+
+def test_flat_projector_lstsq(flow: np.ndarray) -> None:
+  projector = FlatProjector(FIELDS, H, W, lstsq=True)
+  scal = projector.get_scal(flow)
+  # The least-squares decomposition differs on the non-orthogonal fields
+  assert not np.allclose(scal, EXPECTED, atol=1e-3)
+  # But the flow is still best reconstructed
+  residual = flow - projector.get_full(flow)
+  base = projector.base.reshape(len(FIELDS), -1)
+  assert np.allclose(base @ residual.ravel(), 0, atol=1e-2)
+
+
+def test_flat_projector_orthogonal(flow: np.ndarray) -> None:
+  fields = ['x', 'y', 'exx', 'eyy']
+  assert np.allclose(FlatProjector(fields, H, W).get_scal(flow),
+                     FlatProjector(fields, H, W, lstsq=True).get_scal(flow),
+                     atol=1e-5)
@@ -0,0 +1,56 @@
+# coding: utf-8
+
+import pytest
+
+gi = pytest.importorskip('gi')
+try:
+  gi.require_version('Gst', '1.0')
+  gi.require_version('GstApp', '1.0')
+  from gi.repository import Gst
+except ValueError:
+  pytest.skip("GStreamer is not installed", allow_module_level=True)
+if not Gst.init_check(None) or \
+    Gst.ElementFactory.find('videotestsrc') is None:
+  pytest.skip("videotestsrc is not available", allow_module_level=True)
+
+from crappy.camera.gstreamer import Camera_gstreamer
+
+# A source that needs no hardware
+PIPELINE = ('gst-launch-1.0 videotestsrc ! videoconvert ! '
+            'video/x-raw,format=BGR,width=160,height=120,framerate=100/1 ! '
+            'autovideosink')
+
+
+def open_camera(**kwargs) -> Camera_gstreamer:
+  camera = Camera_gstreamer()
+  camera.open(user_pipeline=PIPELINE, nb_channels=3, img_depth=8, **kwargs)
+  return camera
+
+
+def test_latest_frame() -> None:
+  camera = open_camera()
+  try:
+    t, img = camera.get_image()
+    assert img.shape == (120, 160, 3)
+    t_next, _ = camera.get_image()
+    assert t_next > t
+  finally:
+    camera.close()
+
+
+@pytest.mark.parametrize('zero_copy', [False, True])
+def test_frame_queue(zero_copy: bool) -> None:
+  camera = open_camera(frame_queue=4, max_buffers=2, zero_copy=zero_copy)
+  try:
+    times = [camera.get_image()[0] for _ in range(10)]
+    # The frames are returned in order, without duplicates
+    assert times == sorted(times)
+    assert len(set(times)) == len(times)
+    assert camera.dropped >= 0
+  finally:
+    camera.close()
+
+
+def test_invalid_frame_queue() -> None:
+  with pytest.raises(ValueError):
+    open_camera(frame_queue=0)
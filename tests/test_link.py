@@ -0,0 +1,122 @@
+# coding: utf-8
+
+from threading import Thread
+from time import sleep, time
+from typing import Optional
+import pytest
+
+from crappy.links import Batch, Link
+
+
+def slow(data: dict) -> dict:
+  sleep(0.001)
+  return data
+
+
+def test_thread_flush() -> None:
+  link = Link(modifiers=[slow], modifiers_in='thread')
+  received = []
+
+  def read() -> None:
+    while len(received) < 200:
+      received.append(link.recv()['i'])
+
+  reader = Thread(target=read, daemon=True)
+  reader.start()
+  for i in range(200):
+    link.send({'i': i})
+  # All the queued values are sent before flush returns
+  link.flush()
+  reader.join(5)
+  assert received == list(range(200))
+
+
+def test_thread_error() -> None:
+  def fail(data: dict) -> dict:
+    if data['i'] == 5:
+      raise ValueError("Modifier failure")
+    return data
+
+  link = Link(modifiers=[fail], modifiers_in='thread')
+  for i in range(10):
+    link.send({'i': i})
+  with pytest.raises(ValueError):
+    link.flush()
+  # The next values are not silently queued
+  with pytest.raises(ValueError):
+    link.send({'i': 10})
+
+
+def read_all(link: Link, delay: float = 0.2) -> list:
+  """Reads the values reaching the link during the given delay."""
+
+  received = []
+  t0 = time()
+  while time() - t0 < delay:
+    value = link.recv(blocking=False)
+    if value is not None:
+      received.append(value)
+    sleep(0.005)
+  return received
+
+
+def test_max_rate() -> None:
+  link = Link(max_rate=2)
+  for i in range(5):
+    link.send({'i': i})
+  # A batch is a single message, but all its rows are counted as dropped
+  link.send(Batch({'i': [5, 6, 7]}))
+  # Only the first value is sent, the others come too early
+  assert read_all(link) == [{'i': 0}]
+  assert link.dropped == 7
+  sleep(0.4)
+  link.send({'i': 8})
+  assert read_all(link) == [{'i': 8}]
+
+
+def test_conflate() -> None:
+  link = Link(conflate=True)
+  for i in range(5):
+    link.send({'i': i})
+  sleep(0.1)
+  received = read_all(link)
+  # The newest value is always delivered
+  assert received[-1] == {'i': 4}
+  assert len(received) + link.dropped == 5
+
+
+def test_conflate_filtered() -> None:
+  def drop_even(data: dict) -> Optional[dict]:
+    return data if data['i'] % 2 else None
+
+  link = Link(modifiers=[drop_even], conflate=True)
+  for i in range(6):
+    link.send({'i': i})
+    sleep(0.02)
+  received = read_all(link)
+  # The values dropped by the modifier do not block the link
+  assert received and all(value['i'] % 2 for value in received)
+  assert received[-1] == {'i': 5}
+  link.send({'i': 7})
+  assert read_all(link) == [{'i': 7}]
+
+
+def test_conflate_labels() -> None:
+  link = Link(labels=['y'], conflate=True)
+  link.send({'x': 1})
+  sleep(0.05)
+  link.send({'y': 2})
+  assert read_all(link) == [{'y': 2}]
+
+
+def test_conflate_error() -> None:
+  def fail(_: dict) -> dict:
+    raise ValueError("Modifier failure")
+
+  link = Link(modifiers=[fail], conflate=True)
+  link.send({'i': 0})
+  sleep(0.1)
+  with pytest.raises(ValueError):
+    link.send({'i': 1})
+  with pytest.raises(ValueError):
+    link.flush()
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+import numpy as np
+import pytest
+
+from crappy.blocks import Mean_block
+
+
+class FakeLink:
+  """Returns the given messages one by one, like a link."""
+
+  def __init__(self, messages: list) -> None:
+    self._messages = list(messages)
+
+  def recv(self, blocking: bool = True):
+    return self._messages.pop(0) if self._messages else None
+
+
+def run(block: Mean_block, messages: list) -> list:
+  sent = []
+  block.inputs = [FakeLink(messages)]
+  block.send = sent.append
+  block.prepare()
+  block.loop()
+  return sent
+
+
+def test_mixed_labels() -> None:
+  messages = [{'t(s)': 0., 'a': 1.},
+              {'t(s)': .1, 'a': 3., 'b': 10.},
+              {'t(s)': .3, 'b': 20., 'c': 'x'}]
+  sent = run(Mean_block(.2, stats=['mean', 'max']), messages)
+  assert len(sent) == 1
+  assert sent[0].pop('t(s)') == pytest.approx(.05)
+  assert sent[0] == {'a_mean': 2., 'a_max': 3., 'b_mean': 15., 'b_max': 20.,
+                     'c_mean': 'x', 'c_max': 'x'}
+
+
+def test_stats() -> None:
+  values = 1e6 + np.random.default_rng(0).normal(size=100)
+  messages = [{'t(s)': i / 100, 'v': v} for i, v in enumerate(values)]
+  sent = run(Mean_block(.5, stats=['mean', 'std', 'min', 'max', 'rms']),
+             messages)
+  assert len(sent) == 1
+  assert np.isclose(sent[0]['v_mean'], values.mean())
+  assert np.isclose(sent[0]['v_std'], values.std(), rtol=1e-6)
+  assert sent[0]['v_min'] == values.min()
+  assert sent[0]['v_max'] == values.max()
+  assert np.isclose(sent[0]['v_rms'], np.sqrt(np.mean(values ** 2)))
@@ -0,0 +1,52 @@
+# coding: utf-8
+
+import numpy as np
+
+from crappy.tool.pixel_correction import Pixel_correction
+
+
+def test_offset_saturates_unsigned() -> None:
+  img = np.array([[5, 10, 200]], dtype=np.uint8)
+  correction = Pixel_correction(img.shape, offset=np.full(img.shape, 10))
+  assert correction.correct(img).tolist() == [[0, 0, 190]]
+  # Also when correcting in place
+  correction.correct(img, out=img)
+  assert img.tolist() == [[0, 0, 190]]
+
+
+def test_offset_and_gain() -> None:
+  img = np.array([[5, 100, 250]], dtype=np.uint8)
+  correction = Pixel_correction(img.shape, offset=np.full(img.shape, -10),
+                                gain=np.full(img.shape, 1.5))
+  assert correction.correct(img).tolist() == [[22, 165, 255]]
+
+
+def test_offset_float() -> None:
+  img = np.array([[5., 10.]], dtype=np.float32)
+  correction = Pixel_correction(img.shape, offset=np.full(img.shape, 10))
+  assert correction.correct(img).tolist() == [[-5., 0.]]
+
+
+def test_dead_pixels() -> None:
+  img = np.arange(25, dtype=np.uint16).reshape(5, 5) * 10
+  # Two neighbouring dead pixels, plus one on an edge and one in a corner
+  dead = [(1, 1), (1, 2), (4, 2), (0, 4)]
+  correction = Pixel_correction(img.shape, dead_pixels=dead)
+  out = correction.correct(img)
+  # Median of the valid neighbours, the other dead pixel being excluded
+  assert out[1, 1] == np.median([0, 10, 20, 50, 100, 110, 120])
+  assert out[1, 2] == np.median([10, 20, 30, 80, 110, 120, 130])
+  assert out[4, 2] == np.median([160, 170, 180, 210, 230])
+  assert out[0, 4] == np.median([30, 80, 90])
+  # The other pixels are left untouched
+  mask = np.ones(img.shape, dtype=bool)
+  mask[tuple(zip(*dead))] = False
+  assert (out[mask] == img[mask]).all()
+
+
+def test_isolated_dead_pixel() -> None:
+  img = np.array([[1., 2.], [3., 4.]], dtype=np.float32)
+  # A dead pixel with only dead neighbours keeps its value
+  mask = np.ones(img.shape, dtype=bool)
+  correction = Pixel_correction(img.shape, dead_pixels=mask)
+  assert correction.correct(img).tolist() == img.tolist()